@@ -2,6 +2,7 @@ import os
 from flask import Flask, send_from_directory, make_response
 from dotenv import load_dotenv
 from utils.db import init_app
+from utils import signature_store, counters, outbox, scheduler, export_jobs, search, archive
 from utils.middleware import PrefixMiddleware
 from utils.auth import enforce_password_change_logic
 from flask_mail import Mail
@@ -22,6 +23,55 @@ def create_app():
     if '://' not in db_url and not os.path.isabs(db_url):
         db_url = os.path.join(app.root_path, db_url)
     app.config['DATABASE'] = db_url
+    # Perfil de performance do SQLite (legacy, concurrent, durable) + overrides pontuais
+    app.config['DATABASE_PROFILE'] = os.environ.get('DATABASE_PROFILE', 'concurrent')
+    app.config['SQLITE_PRAGMAS'] = os.environ.get('SQLITE_PRAGMAS', '')
+    # Diretório das assinaturas (PNG endereçado por hash; precisa entrar no backup junto com o banco)
+    app.config['SIGNATURE_STORE_DIR'] = os.environ.get('SIGNATURE_STORE_DIR', 'signatures')
+    # Captura da assinatura na entrega: 'vector' (traços compactos) ou 'raster' (PNG)
+    app.config['SIGNATURE_CAPTURE_MODE'] = os.environ.get('SIGNATURE_CAPTURE_MODE', 'vector')
+    # Pool de conexões (por processo/worker do gunicorn)
+    app.config['DB_POOL_ENABLED'] = os.environ.get('DB_POOL_ENABLED', 'True').lower() == 'true'
+    app.config['DB_POOL_MIN_SIZE'] = int(os.environ.get('DB_POOL_MIN_SIZE', 0))
+    app.config['DB_POOL_MAX_SIZE'] = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE_USES'] = int(os.environ.get('DB_POOL_RECYCLE_USES', 1000))
+    app.config['DB_POOL_IDLE_TIMEOUT'] = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))
+    # Segundos que o índice de destinatários (typeahead) fica em memória antes de recarregar
+    app.config['RECIPIENT_INDEX_TTL'] = float(os.environ.get('RECIPIENT_INDEX_TTL', 60))
+    # Worker da fila de e-mails (flask notifications-worker)
+    app.config['NOTIFICATIONS_CONCURRENCY'] = int(os.environ.get('NOTIFICATIONS_CONCURRENCY', 4))
+    app.config['NOTIFICATIONS_BATCH_SIZE'] = int(os.environ.get('NOTIFICATIONS_BATCH_SIZE', 50))
+    app.config['NOTIFICATIONS_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFICATIONS_MAX_ATTEMPTS', 6))
+    app.config['NOTIFICATIONS_BACKOFF_BASE'] = float(os.environ.get('NOTIFICATIONS_BACKOFF_BASE', 30))
+    app.config['NOTIFICATIONS_BACKOFF_MAX'] = float(os.environ.get('NOTIFICATIONS_BACKOFF_MAX', 3600))
+    app.config['NOTIFICATIONS_LEASE_SECONDS'] = float(os.environ.get('NOTIFICATIONS_LEASE_SECONDS', 300))
+    app.config['NOTIFICATIONS_POLL_INTERVAL'] = float(os.environ.get('NOTIFICATIONS_POLL_INTERVAL', 5))
+    # Lembretes de retirada (flask scheduler run). Políticas por unidade: "1=48,2=off,3=24:single"
+    app.config['REMINDER_INTERVAL_HOURS'] = float(os.environ.get('REMINDER_INTERVAL_HOURS', 72))
+    app.config['REMINDER_POLICIES'] = os.environ.get('REMINDER_POLICIES', '')
+    app.config['SCHEDULER_LEASE_SECONDS'] = float(os.environ.get('SCHEDULER_LEASE_SECONDS', 120))
+    app.config['SCHEDULER_MAX_SLEEP'] = float(os.environ.get('SCHEDULER_MAX_SLEEP', 300))
+    # Exportações em segundo plano (flask exports-worker): spool, jobs simultâneos e retenção dos arquivos
+    app.config['EXPORT_SPOOL_DIR'] = os.environ.get('EXPORT_SPOOL_DIR', 'exports')
+    app.config['EXPORT_MAX_RUNNING'] = int(os.environ.get('EXPORT_MAX_RUNNING', 2))
+    app.config['EXPORT_MAX_PER_USER'] = int(os.environ.get('EXPORT_MAX_PER_USER', 3))
+    app.config['EXPORT_LEASE_SECONDS'] = float(os.environ.get('EXPORT_LEASE_SECONDS', 300))
+    app.config['EXPORT_RETENTION_HOURS'] = float(os.environ.get('EXPORT_RETENTION_HOURS', 24))
+    app.config['EXPORT_POLL_INTERVAL'] = float(os.environ.get('EXPORT_POLL_INTERVAL', 2))
+    # Linhas por página nas listas paginadas (histórico, usuários, painel); o resto vem pelo "Carregar mais"
+    app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 50))
+    # Fuso das unidades sem fuso próprio (settings_companies.timezone); define o "dia" dos filtros por data
+    app.config['DEFAULT_TIMEZONE'] = os.environ.get('DEFAULT_TIMEZONE', 'UTC')
+    # Arquivamento (flask archive-items): idade mínima dos itens finalizados e itens por lote/commit
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    # Feed ao vivo dos painéis (SSE): intervalo de leitura de movements, keep-alive e duração de cada conexão
+    app.config['LIVE_POLL_INTERVAL'] = float(os.environ.get('LIVE_POLL_INTERVAL', 1))
+    app.config['LIVE_HEARTBEAT_SECONDS'] = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+    app.config['LIVE_STREAM_SECONDS'] = float(os.environ.get('LIVE_STREAM_SECONDS', 300))
+    # Cache das tabelas renderizadas dos painéis (por worker); 0 desativa
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
     # Versão do Sistema
     base_version = 'v4.4.9'
     app_suffix = os.environ.get('APP_SUFFIX', '') # Ex: '-demo' ou '-Kran'
@@ -42,13 +92,13 @@ def create_app():
         import datetime
         from flask import session
         from utils.db import get_db
+        from utils.reference_data import active_companies
         
-        # Garante que as unidades estejam disponíveis para o seletor no navbar
+        # Garante que as unidades estejam disponíveis para o seletor no navbar (cache de referência)
         units = []
         active_unit = None
         if 'user_id' in session:
-            db = get_db()
-            units = db.execute("SELECT id, name FROM settings_companies WHERE is_active = 1").fetchall()
+            units = active_companies(get_db())
             
             # Encontra o nome da unidade ativa
             role = session.get('role')
@@ -70,6 +120,13 @@ def create_app():
     
     # Inicializa o Banco de Dados
     init_app(app)
+    signature_store.init_app(app)
+    counters.init_app(app)
+    outbox.init_app(app)
+    scheduler.init_app(app)
+    export_jobs.init_app(app)
+    search.init_app(app)
+    archive.init_app(app)
     
     # Middleware para subdiretórios
     app.wsgi_app = PrefixMiddleware(app.wsgi_app)
@@ -0,0 +1,458 @@
+import sqlite3
+import os
+
+# Índices dos caminhos quentes (mesmos nomes declarados no schema.sql)
+HOT_PATH_INDEXES = [
+    ("idx_items_unit_status", "items (unit_id, status, updated_at)"),
+    ("idx_items_unit_created", "items (unit_id, created_at)"),
+    ("idx_items_unit_status_created", "items (unit_id, status, created_at)"),
+    ("idx_items_recipient_email", "items (recipient_email, unit_id)"),
+    ("idx_items_recipient_manual", "items (recipient_name_manual, unit_id)"),
+    ("idx_items_status_notified", "items (status, last_notified_at)"),
+    ("idx_movements_item", "movements (item_id, timestamp)"),
+    ("idx_proofs_delivered_at", "proofs (delivered_at)"),
+    ("idx_users_active_created", "users (is_active, created_at)"),
+    ("idx_email_group_members_group", "email_group_members (group_id)"),
+]
+
+def create_hot_path_indexes(cursor):
+    print("Creating hot-path indexes...")
+    for name, target in HOT_PATH_INDEXES:
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+        ).fetchone()
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        print(f"- {name} {'already exists' if exists else 'created'}")
+
+STATUS_COUNTS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS item_status_counts (
+        unit_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (unit_id, status)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_count_insert AFTER INSERT ON items
+    BEGIN
+        INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+        ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_count_delete AFTER DELETE ON items
+    BEGIN
+        UPDATE item_status_counts SET count = count - 1
+        WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_count_update AFTER UPDATE OF status, unit_id ON items
+    WHEN OLD.status IS NOT NEW.status OR OLD.unit_id IS NOT NEW.unit_id
+    BEGIN
+        UPDATE item_status_counts SET count = count - 1
+        WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+        INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+        ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+]
+
+def create_status_counters(cursor):
+    print("Creating materialized status counters...")
+    for ddl in STATUS_COUNTS_DDL:
+        cursor.execute(ddl)
+    # Recalcula sempre: a migração pode rodar de novo sem duplicar contagens.
+    # Numa nova execução o arquivo já existe e os itens arquivados continuam contados (utils/counters.py)
+    source = "items"
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_archive'").fetchone():
+        source = "(SELECT unit_id, status FROM items UNION ALL SELECT unit_id, status FROM items_archive)"
+    cursor.execute("DELETE FROM item_status_counts")
+    cursor.execute(
+        "INSERT INTO item_status_counts (unit_id, status, count) "
+        f"SELECT COALESCE(unit_id, 0), status, COUNT(*) FROM {source} GROUP BY 1, 2"
+    )
+    print("- item_status_counts rebuilt from items and items_archive")
+
+OUTBOX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        reply_to TEXT,
+        item_internal_id TEXT,
+        status TEXT NOT NULL DEFAULT 'PENDING',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        locked_by TEXT,
+        locked_at TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_outbox_status_due ON notification_outbox (status, next_attempt_at)",
+    "CREATE INDEX IF NOT EXISTS idx_outbox_locked_by ON notification_outbox (locked_by)",
+]
+
+def create_notification_outbox(cursor):
+    print("Creating notification outbox...")
+    for ddl in OUTBOX_DDL:
+        cursor.execute(ddl)
+    print("- notification_outbox ready")
+
+SCHEDULER_DDL = [
+    "CREATE INDEX IF NOT EXISTS idx_items_status_reminder ON items (status, next_reminder_at)",
+    """
+    CREATE TABLE IF NOT EXISTS scheduler_leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at TIMESTAMP NOT NULL
+    )
+    """,
+]
+
+def add_reminder_schedule(cursor):
+    print("Adding reminder schedule...")
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(items)").fetchall()]
+    if 'next_reminder_at' not in columns:
+        cursor.execute("ALTER TABLE items ADD COLUMN next_reminder_at TIMESTAMP")
+        print("- items.next_reminder_at added")
+    for ddl in SCHEDULER_DDL:
+        cursor.execute(ddl)
+
+    # Itens já disponíveis entram na agenda a partir do último aviso
+    hours = float(os.environ.get('REMINDER_INTERVAL_HOURS', 72))
+    updated = cursor.execute(
+        "UPDATE items SET next_reminder_at = datetime(COALESCE(last_notified_at, updated_at, CURRENT_TIMESTAMP), ?) "
+        "WHERE status = 'DISPONIVEL_PARA_RETIRADA' AND next_reminder_at IS NULL",
+        (f"+{hours} hours",)
+    ).rowcount
+    print(f"- {updated} item(s) scheduled")
+
+EXPORT_JOBS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS export_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        format TEXT NOT NULL,
+        filters TEXT,
+        unit_id INTEGER NOT NULL,
+        requested_by INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'PENDING',
+        total_rows INTEGER,
+        rows_written INTEGER NOT NULL DEFAULT 0,
+        file_name TEXT,
+        error TEXT,
+        locked_by TEXT,
+        locked_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        FOREIGN KEY (requested_by) REFERENCES users (id),
+        FOREIGN KEY (unit_id) REFERENCES settings_companies (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_user ON export_jobs (requested_by, id)",
+]
+
+def create_export_jobs(cursor):
+    print("Creating export jobs...")
+    for ddl in EXPORT_JOBS_DDL:
+        cursor.execute(ddl)
+    print("- export_jobs ready")
+
+SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        internal_id, tracking_code, sender, recipient, received_by_name, unit_key,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_insert AFTER INSERT ON items
+    BEGIN
+        INSERT INTO items_fts (rowid, internal_id, tracking_code, sender, recipient, received_by_name, unit_key)
+        VALUES (NEW.id, NEW.internal_id, NEW.tracking_code, NEW.sender,
+                COALESCE(NEW.recipient_email, '') || ' ' || COALESCE(NEW.recipient_name_manual, ''),
+                NULL, 'u' || COALESCE(NEW.unit_id, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_update
+    AFTER UPDATE OF internal_id, tracking_code, sender, recipient_email, recipient_name_manual, unit_id ON items
+    BEGIN
+        UPDATE items_fts SET internal_id = NEW.internal_id, tracking_code = NEW.tracking_code, sender = NEW.sender,
+            recipient = COALESCE(NEW.recipient_email, '') || ' ' || COALESCE(NEW.recipient_name_manual, ''),
+            unit_key = 'u' || COALESCE(NEW.unit_id, 0)
+        WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_fts_delete AFTER DELETE ON items
+    BEGIN
+        DELETE FROM items_fts WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_proofs_fts_insert AFTER INSERT ON proofs
+    BEGIN
+        UPDATE items_fts SET received_by_name = NEW.received_by_name WHERE rowid = NEW.item_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_proofs_fts_update AFTER UPDATE OF received_by_name ON proofs
+    BEGIN
+        UPDATE items_fts SET received_by_name = NEW.received_by_name WHERE rowid = NEW.item_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_proofs_fts_delete AFTER DELETE ON proofs
+    BEGIN
+        UPDATE items_fts SET received_by_name = NULL WHERE rowid = OLD.item_id;
+    END
+    """,
+]
+
+def create_search_index(cursor):
+    print("Creating full-text search index...")
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+    for ddl in SEARCH_DDL:
+        cursor.execute(ddl)
+    if exists:
+        print("- items_fts already exists")
+        return
+    cursor.execute(
+        "INSERT INTO items_fts (rowid, internal_id, tracking_code, sender, recipient, received_by_name, unit_key) "
+        "SELECT i.id, i.internal_id, i.tracking_code, i.sender, "
+        "       COALESCE(i.recipient_email, '') || ' ' || COALESCE(i.recipient_name_manual, ''), "
+        "       p.received_by_name, 'u' || COALESCE(i.unit_id, 0) "
+        "FROM items i LEFT JOIN proofs p ON p.item_id = i.id"
+    )
+    print(f"- items_fts created ({cursor.rowcount} items indexed)")
+
+ARCHIVE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS items_archive (
+        id INTEGER PRIMARY KEY, -- mesmo id de items (AUTOINCREMENT lá: nunca é reutilizado)
+        internal_id TEXT NOT NULL,
+        tracking_code TEXT,
+        type TEXT NOT NULL,
+        sender TEXT,
+        recipient_email TEXT,
+        recipient_name_manual TEXT,
+        recipient_floor TEXT,
+        location TEXT,
+        status TEXT NOT NULL,
+        observation TEXT,
+        unit_id INTEGER,
+        last_notified_at TIMESTAMP,
+        next_reminder_at TIMESTAMP,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS movements_archive (
+        id INTEGER PRIMARY KEY,
+        item_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        unit_id INTEGER,
+        timestamp TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS proofs_archive (
+        item_id INTEGER PRIMARY KEY,
+        signature_data TEXT NOT NULL,
+        delivered_by INTEGER NOT NULL,
+        received_by_name TEXT NOT NULL,
+        delivered_at TIMESTAMP,
+        occurrence_note TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_items_archive_internal ON items_archive (internal_id, unit_id)",
+    "CREATE INDEX IF NOT EXISTS idx_items_archive_unit_created ON items_archive (unit_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_items_archive_recipient_email ON items_archive (recipient_email, unit_id)",
+    "CREATE INDEX IF NOT EXISTS idx_items_archive_recipient_manual ON items_archive (recipient_name_manual, unit_id)",
+    "CREATE INDEX IF NOT EXISTS idx_movements_archive_item ON movements_archive (item_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_proofs_archive_delivered_at ON proofs_archive (delivered_at)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_archive_count_insert AFTER INSERT ON items_archive
+    BEGIN
+        INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+        ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_archive_count_delete AFTER DELETE ON items_archive
+    BEGIN
+        UPDATE item_status_counts SET count = count - 1
+        WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+    END
+    """,
+]
+
+def create_archive_tables(cursor):
+    print("Creating archive tables...")
+    for ddl in ARCHIVE_DDL:
+        cursor.execute(ddl)
+
+def create_cache_versions(cursor):
+    print("Creating cache versions...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+UNIT_VERSIONS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS unit_versions (
+        unit_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_version_insert AFTER INSERT ON items
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    # Recriado sempre: versões anteriores disparavam em qualquer UPDATE (inclusive dos lembretes)
+    "DROP TRIGGER IF EXISTS trg_items_version_update",
+    """
+    CREATE TRIGGER trg_items_version_update AFTER UPDATE OF
+        internal_id, tracking_code, type, sender, recipient_email, recipient_name_manual, recipient_floor,
+        location, status, observation, unit_id, created_at, updated_at
+    ON items
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+        INSERT INTO unit_versions (unit_id, version)
+        SELECT COALESCE(OLD.unit_id, 0), 1 WHERE COALESCE(OLD.unit_id, 0) != COALESCE(NEW.unit_id, 0)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_items_version_delete AFTER DELETE ON items
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_movements_version_insert AFTER INSERT ON movements
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_proofs_version_insert AFTER INSERT ON proofs
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE((SELECT unit_id FROM items WHERE id = NEW.item_id), 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_proofs_version_update AFTER UPDATE ON proofs
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE((SELECT unit_id FROM items WHERE id = NEW.item_id), 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_locations_version_insert AFTER INSERT ON settings_locations
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_locations_version_update AFTER UPDATE ON settings_locations
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_locations_version_delete AFTER DELETE ON settings_locations
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_companies_version_update AFTER UPDATE ON settings_companies
+    BEGIN
+        INSERT INTO unit_versions (unit_id, version) VALUES (NEW.id, 1)
+        ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+]
+
+def create_unit_versions(cursor):
+    print("Creating unit data versions...")
+    for ddl in UNIT_VERSIONS_DDL:
+        cursor.execute(ddl)
+
+def add_unit_timezone(cursor):
+    print("Adding unit timezone...")
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(settings_companies)").fetchall()]
+    if 'timezone' in columns:
+        print("- settings_companies.timezone already exists")
+        return
+    # NULL = DEFAULT_TIMEZONE da aplicação
+    cursor.execute("ALTER TABLE settings_companies ADD COLUMN timezone TEXT")
+    print("- settings_companies.timezone added")
+
+def migrate():
+    # Tenta ler do .env ou usa o padrão
+    db_path = os.environ.get('DATABASE_URL', 'aeropost.db')
+    if not os.path.exists(db_path):
+        print(f"Error: {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    print("Starting migration v4.5.0 (Performance)...")
+
+    try:
+        create_hot_path_indexes(cursor)
+        create_status_counters(cursor)
+        create_notification_outbox(cursor)
+        add_reminder_schedule(cursor)
+        create_export_jobs(cursor)
+        create_search_index(cursor)
+        add_unit_timezone(cursor)
+        create_archive_tables(cursor)
+        create_cache_versions(cursor)
+        create_unit_versions(cursor)
+        conn.commit()
+
+        # Atualiza as estatísticas usadas pelo planejador de queries
+        cursor.execute("ANALYZE")
+        conn.commit()
+        print("Migration v4.5.0 completed successfully.")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -3,6 +3,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from werkzeug.security import generate_password_hash
 from utils.db import get_db
 from utils.auth import login_required, role_required
+from utils import reference_data
+from utils.pagination import keyset_page
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -11,10 +13,35 @@ admin_bp = Blueprint('admin', __name__)
 @role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
 def users_list():
     db = get_db()
-    active_users = db.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY created_at DESC').fetchall()
-    blocked_users = db.execute('SELECT * FROM users WHERE is_active = 0 ORDER BY created_at DESC').fetchall()
-    units = db.execute("SELECT * FROM settings_companies WHERE is_active = 1").fetchall()
-    return render_template('users.html', active_users=active_users, blocked_users=blocked_users, units=units)
+    active = _users_page(db, 'active')
+    blocked = _users_page(db, 'blocked')
+    totals = dict(db.execute("SELECT is_active, COUNT(*) FROM users GROUP BY is_active").fetchall())
+    units = reference_data.active_companies(db)
+    return render_template('users.html', active_users=active.items, blocked_users=blocked.items,
+                           active_cursor=active.next_cursor, blocked_cursor=blocked.next_cursor,
+                           active_total=totals.get(1, 0), blocked_total=totals.get(0, 0), units=units)
+
+@admin_bp.route('/users/more')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def users_more():
+    """Próxima página de usuários ativos (?list=active) ou bloqueados (?list=blocked)"""
+    name = request.args.get('list')
+    if name not in USER_LISTS:
+        return {"error": "Lista inválida"}, 400
+    try:
+        page = _users_page(get_db(), name, request.args.get('cursor'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    html = render_template('includes/page_rows.html', macros='macros/user_rows.html', row=f'{name}_user_row', items=page.items)
+    return {"html": html, "next_cursor": page.next_cursor}
+
+# lista -> valor de is_active
+USER_LISTS = {'active': 1, 'blocked': 0}
+
+def _users_page(db, name, cursor=None):
+    return keyset_page(db, "SELECT * FROM users WHERE is_active = ?", [USER_LISTS[name]], ['created_at', 'id'],
+                       descending=True, cursor=cursor)
 
 @admin_bp.route('/users/create_portaria', methods=['POST'])
 @login_required
@@ -84,6 +111,8 @@ def user_toggle_block(user_id):
     new_status = 0 if user['is_active'] else 1
     
     db.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
+    # Bloqueados saem da busca de destinatários em todos os workers
+    reference_data.bump_version(db)
     db.commit()
     
     msg = 'Usuário bloqueado.' if new_status == 0 else 'Usuário desbloqueado.'
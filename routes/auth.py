@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from werkzeug.security import check_password_hash, generate_password_hash
 from utils.db import get_db
 from utils.auth import login_required
+from utils import reference_data
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -56,7 +57,7 @@ def login():
 @auth_bp.route('/register', methods=('GET', 'POST'))
 def register():
     db = get_db()
-    companies = db.execute("SELECT * FROM settings_companies WHERE is_active = 1").fetchall()
+    companies = reference_data.active_companies(db)
 
     if request.method == 'POST':
         full_name = request.form['full_name']
@@ -65,8 +66,7 @@ def register():
         floor = request.form['floor']
         password = request.form['password']
         
-        allowed_domains_rows = db.execute("SELECT domain FROM settings_allowed_domains WHERE is_active = 1").fetchall()
-        allowed_domains = [row['domain'] for row in allowed_domains_rows]
+        allowed_domains = [row['domain'] for row in reference_data.allowed_domains(db)]
         
         domain_valid = False
         if not allowed_domains:
@@ -94,6 +94,7 @@ def register():
                 'INSERT INTO users (email, password_hash, role, full_name, floor, company, default_unit_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
                 (email, generate_password_hash(password), 'USER', full_name, floor, company, unit_id)
             )
+            reference_data.bump_version(db)
             db.commit()
             flash('Cadastro realizado! Faça login.', 'success')
             return redirect(url_for('auth.login'))
@@ -256,6 +257,7 @@ def profile(user_id=None):
             'UPDATE users SET full_name = ?, floor = ?, company = ?, default_unit_id = ? WHERE id = ?',
             (full_name, floor, company_name, unit_id, target_user_id)
         )
+        reference_data.bump_version(db)
         db.commit()
         
         # Sincroniza a sessão apenas se estiver editando o próprio perfil
@@ -269,7 +271,7 @@ def profile(user_id=None):
             return redirect(url_for('admin.users_list'))
 
     # Carrega lista de empresas para o dropdown
-    companies = db.execute("SELECT * FROM settings_companies WHERE is_active = 1").fetchall()
+    companies = reference_data.active_companies(db)
     
     return render_template('profile.html', user=user, companies=companies, editing_other=(target_user_id != current_user_id))
 
@@ -1,46 +1,125 @@
 import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from markupsafe import Markup
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, get_flashed_messages
 from utils.db import get_db
-from utils.auth import login_required, role_required
-from utils.notifications import send_collection_alert
+from utils.auth import login_required, role_required, wants_json
+from utils.notifications import send_collection_alerts, send_collection_digest, resolve_recipients
+from utils.signature_store import store_signature
+from utils import signature_vector
+from utils.counters import get_dashboard_stats, get_status_counts
+from utils.recipients import search_recipients, DEFAULT_LIMIT
+from utils.search import search_items, SEARCH_LIMIT
+from utils.pagination import keyset_page, keyset_merge
+from utils.timezones import unit_timezone, parse_day, day_start
+from utils.archive import tier_queries, find_in_tiers, restore_item, COLD
+from utils.versions import conditional_page
+from utils.fragment_cache import cached_fragment
+from utils import reference_data, live
 
 facilities_bp = Blueprint('facilities', __name__)
 
 @facilities_bp.route('/facilities')
 @login_required
 @role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+@conditional_page
 def dashboard():
     db = get_db()
     unit_id = session.get('unit_id')
-    stats = {
-        'in_portaria': db.execute("SELECT COUNT(*) FROM items WHERE status = 'RECEBIDO_PORTARIA' AND unit_id = ?", (unit_id,)).fetchone()[0],
-        'in_facilities': db.execute("SELECT COUNT(*) FROM items WHERE status = 'EM_FACILITIES' AND unit_id = ?", (unit_id,)).fetchone()[0],
-        'ready': db.execute("SELECT COUNT(*) FROM items WHERE status = 'DISPONIVEL_PARA_RETIRADA' AND unit_id = ?", (unit_id,)).fetchone()[0]
-    }
+    stats = get_dashboard_stats(db, unit_id)
     
-    query_base = """
-        SELECT i.*, u.floor as user_floor, u.company as user_company,
-               (CASE WHEN u.id IS NOT NULL THEN 1 ELSE 0 END) as is_registered
-        FROM items i 
-        LEFT JOIN users u ON i.recipient_email = u.email
-    """
-    
-    items_portaria = db.execute(query_base + " WHERE i.status = 'RECEBIDO_PORTARIA' AND i.unit_id = ? ORDER BY i.created_at ASC", (unit_id,)).fetchall()
-    items_facilities = db.execute(query_base + " WHERE i.status = 'EM_FACILITIES' AND i.unit_id = ? ORDER BY i.updated_at ASC", (unit_id,)).fetchall()
-    items_ready = db.execute(query_base + " WHERE i.status = 'DISPONIVEL_PARA_RETIRADA' AND i.unit_id = ? ORDER BY i.updated_at DESC", (unit_id,)).fetchall()
+    lists = {name: _list_fragment(db, unit_id, name) for name in DASHBOARD_LISTS}
 
-    corp_users = db.execute("SELECT email, full_name FROM users WHERE is_active = 1 AND role != 'ADMIN' AND default_unit_id = ? ORDER BY full_name ASC", (unit_id,)).fetchall()
-    locations = db.execute("SELECT * FROM settings_locations WHERE is_active = 1 AND unit_id = ? ORDER BY name ASC", (unit_id,)).fetchall()
-    email_groups = db.execute("SELECT * FROM email_groups WHERE unit_id = ? ORDER BY name ASC", (unit_id,)).fetchall()
+    # Destinatários não vão mais na página: o formulário de alocação usa /api/recipients/search
+    locations = reference_data.locations(db, unit_id)
 
     return render_template('facilities/dashboard.html', 
                            stats=stats, 
-                           items_portaria=items_portaria, 
-                           items_facilities=items_facilities, 
-                           items_ready=items_ready, 
-                           corp_users=corp_users,
+                           lists=lists,
                            locations=locations,
-                           email_groups=email_groups)
+                           live_since=live.latest_event_id(db))
+
+@facilities_bp.route('/facilities/more')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def dashboard_more():
+    """Próxima página de uma das listas do painel (?list=portaria|triagem|entrega)"""
+    name = request.args.get('list')
+    if name not in DASHBOARD_LISTS:
+        return {"error": "Lista inválida"}, 400
+    db = get_db()
+    try:
+        page = _dashboard_page(db, session.get('unit_id'), name, request.args.get('cursor'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {"html": _rows_html(name, page.items), "next_cursor": page.next_cursor}
+
+def _rows_html(name, items):
+    return render_template('includes/page_rows.html', macros='macros/facilities_rows.html', row=f'{name}_row', items=items)
+
+def _list_fragment(db, unit_id, name):
+    """Primeira página de uma lista do painel já renderizada (cache de fragmentos pela versão da unidade)"""
+    def render():
+        page = _dashboard_page(db, unit_id, name)
+        return {"html": Markup(_rows_html(name, page.items)), "count": len(page.items), "next_cursor": page.next_cursor}
+    return cached_fragment(db, unit_id, f'facilities:{name}', render)
+
+DASHBOARD_SELECT = """
+    SELECT i.*, u.floor as user_floor, u.company as user_company,
+           (CASE WHEN u.id IS NOT NULL THEN 1 ELSE 0 END) as is_registered
+    FROM items i 
+    LEFT JOIN users u ON i.recipient_email = u.email
+"""
+DASHBOARD_QUERY = DASHBOARD_SELECT + "WHERE i.status = ? AND i.unit_id = ?"
+
+# lista -> (status, coluna de ordenação, decrescente); todas servidas por índices (unit_id, status, coluna)
+DASHBOARD_LISTS = {
+    'portaria': ('RECEBIDO_PORTARIA', 'i.created_at', False),
+    'triagem': ('EM_FACILITIES', 'i.updated_at', False),
+    'entrega': ('DISPONIVEL_PARA_RETIRADA', 'i.updated_at', True),
+}
+
+def _dashboard_page(db, unit_id, name, cursor=None):
+    status, column, descending = DASHBOARD_LISTS[name]
+    return keyset_page(db, DASHBOARD_QUERY, [status, unit_id], [column, 'i.id'], descending=descending, cursor=cursor)
+
+@facilities_bp.route('/facilities/row/<int:item_id>')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def dashboard_row(item_id):
+    """Linha atual do item no painel (feed ao vivo); list=None quando ele saiu das três listas"""
+    return _row_payload(get_db(), session.get('unit_id'), item_id)
+
+def _row_payload(db, unit_id, item_id):
+    item = db.execute(DASHBOARD_SELECT + "WHERE i.id = ? AND i.unit_id = ?", (item_id, unit_id)).fetchone()
+    return _item_row(item)
+
+def _item_row(item):
+    name = next((name for name, (status, _, _) in DASHBOARD_LISTS.items() if item and item['status'] == status), None)
+    if name is None:
+        return {"list": None}
+    html = _rows_html(name, [item])
+    # Listas decrescentes recebem o item no topo; as crescentes, no fim
+    return {"list": name, "table": f"table-{name}", "html": html,
+            "position": 'top' if DASHBOARD_LISTS[name][2] else 'bottom'}
+
+def _action_response(item_id, tab=None, fallback=None):
+    """Fim de uma ação sobre o item: redirect para o formulário, ou JSON com a linha atual,
+    os contadores e as mensagens para o painel aplicar no lugar (sem montar o painel de novo)"""
+    if not wants_json():
+        return redirect(fallback or url_for('facilities.dashboard', tab=tab))
+    db = get_db()
+    unit_id = session.get('unit_id')
+    return _action_json(db, unit_id, item_id=item_id, row=_row_payload(db, unit_id, item_id))
+
+def _action_json(db, unit_id, **payload):
+    messages = get_flashed_messages(with_categories=True)
+    ok = not any(category == 'danger' for category, _ in messages)
+    return dict(
+        payload,
+        ok=ok,
+        messages=[{"category": category, "text": text} for category, text in messages],
+        stats=get_dashboard_stats(db, unit_id),
+    ), 200 if ok else 400
 
 @facilities_bp.route('/facilities/collect/<int:item_id>', methods=['POST'])
 @login_required
@@ -52,23 +131,31 @@ def collect(item_id):
     db.execute("INSERT INTO movements (item_id, user_id, action, unit_id) VALUES (?, ?, ?, ?)", (item_id, session['user_id'], 'COLLECT_FROM_PORTARIA', unit_id))
     db.commit()
     flash('Item coletado com sucesso.', 'success')
-    return redirect(url_for('facilities.dashboard', tab='portaria'))
+    return _action_response(item_id, 'portaria')
 
-@facilities_bp.route('/facilities/allocate/<int:item_id>', methods=['POST'])
-@login_required
-@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
-def allocate(item_id):
-    location = request.form['location']
+def _flash_failed_recipients(results):
+    failed = [email for email, ok in results.items() if not ok]
+    if failed:
+        flash(f'Não foi possível notificar: {", ".join(failed)}', 'warning')
+
+def _allocation_form():
+    """(local, e-mail ou grupo, nome manual, andar, observação) do formulário de alocação"""
     rec_email = request.form.get('recipient_email')
     rec_manual = request.form.get('recipient_name_manual')
-    rec_floor = request.form.get('recipient_floor')
-    observation = request.form.get('observation')
 
     if rec_email == '__NEW__':
         rec_email = None
 
     if not rec_email and rec_manual and '@' in rec_manual:
         rec_email = rec_manual
+    return (request.form['location'], rec_email, rec_manual,
+            request.form.get('recipient_floor'), request.form.get('observation'))
+
+@facilities_bp.route('/facilities/allocate/<int:item_id>', methods=['POST'])
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def allocate(item_id):
+    location, rec_email, rec_manual, rec_floor, observation = _allocation_form()
     
     db = get_db()
     unit_id = session.get('unit_id')
@@ -77,33 +164,30 @@ def allocate(item_id):
         (location, rec_email, rec_manual, rec_floor, observation, item_id)
     )
     db.execute("INSERT INTO movements (item_id, user_id, action, unit_id) VALUES (?, ?, ?, ?)", (item_id, session['user_id'], f'ALLOCATED: {location} AND ID_RECIPIENT | {observation or ""}', unit_id))
-    db.commit()
 
-    # Envio de Notificação por E-mail
+    # Notificação por E-mail: entra na outbox na mesma transação da alocação
     if rec_email:
         # Busca o tipo do item para o e-mail
         item = db.execute("SELECT type, internal_id FROM items WHERE id = ?", (item_id,)).fetchone()
         
-        # Verifica se o rec_email é um GRUPO (identificado pelo prefixo [G] ou similar, ou busca direta)
-        group = db.execute("SELECT id FROM email_groups WHERE name = ?", (rec_email,)).fetchone()
+        # Verifica se o rec_email é um GRUPO (busca direta pelo nome) e envia para todos em lote
+        is_group, recipients = resolve_recipients(db, rec_email)
+        results = send_collection_alerts(recipients, item['internal_id'], item['type'], commit=False, unit_id=unit_id)
         
-        if group:
-            members = db.execute("SELECT email FROM email_group_members WHERE group_id = ?", (group['id'],)).fetchall()
-            emails_sent = 0
-            for member in members:
-                if send_collection_alert(member['email'], item['internal_id'], item['type']):
-                    emails_sent += 1
-            
+        if is_group:
+            emails_sent = sum(results.values())
             flash(f'Item alocado para o grupo "{rec_email}". {emails_sent} notificações enviadas!', 'success')
+            _flash_failed_recipients(results)
         else:
-            if send_collection_alert(rec_email, item['internal_id'], item['type']):
+            if results.get(rec_email.strip()):
                 flash(f'Item alocado em {location} para {rec_email or rec_manual}. Notificação enviada!', 'success')
             else:
                 flash(f'Item alocado em {location}, mas houve um erro ao enviar o e-mail.', 'warning')
     else:
         flash(f'Item alocado em {location} para {rec_manual}. (Sem e-mail para notificar)', 'success')
-        
-    return redirect(url_for('facilities.dashboard', tab='triagem'))
+
+    db.commit()
+    return _action_response(item_id, 'triagem')
 
 @facilities_bp.route('/facilities/update_location/<int:item_id>', methods=['POST'])
 @login_required
@@ -126,7 +210,7 @@ def update_location(item_id):
     
     db.commit()
     flash('Local atualizado com sucesso.', 'success')
-    return redirect(url_for('facilities.dashboard', tab='entregar'))
+    return _action_response(item_id, 'entregar')
 
 @facilities_bp.route('/delivery/password/<int:item_id>')
 @login_required
@@ -162,7 +246,7 @@ def delivery_password_confirm(item_id):
     
     if user is None or not check_password_hash(user['password_hash'], password):
         flash('Senha incorreta para o destinatário informado.', 'danger')
-        return redirect(url_for('facilities.delivery_password_page', item_id=item_id))
+        return _action_response(item_id, fallback=url_for('facilities.delivery_password_page', item_id=item_id))
     
     unit_id = session.get('unit_id')
     db.execute("UPDATE items SET status = 'ENTREGUE', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (item_id,))
@@ -177,7 +261,7 @@ def delivery_password_confirm(item_id):
     db.commit()
     
     flash(f'Item entregue com sucesso para {user["full_name"]} via autenticação!', 'success')
-    return redirect(url_for('facilities.dashboard', tab='entregar'))
+    return _action_response(item_id, 'entregar')
 
 @facilities_bp.route('/delivery/<int:item_id>')
 @login_required
@@ -185,14 +269,28 @@ def delivery_password_confirm(item_id):
 def delivery_page(item_id):
     db = get_db()
     item = db.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
-    return render_template('delivery.html', item=item)
+    capture_mode = current_app.config.get('SIGNATURE_CAPTURE_MODE', 'vector')
+    return render_template('delivery.html', item=item, capture_mode=capture_mode)
+
+def _form_signature():
+    """Assinatura do formulário de entrega, no formato gravado em proofs.signature_data"""
+    if request.form.get('signature_format') == 'vector':
+        # Traços compactos (VEC1:...) gravados inline; renderizados em SVG sob demanda
+        return signature_vector.normalize_payload(request.form.get('signature_vector'))
+    # A imagem vai para o store em disco; o banco guarda só a referência (BLOB:<sha256>)
+    return store_signature(request.form['signature_data'])
 
 @facilities_bp.route('/delivery/confirm/<int:item_id>', methods=['POST'])
 @login_required
 @role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
 def delivery_confirm(item_id):
     received_by = request.form['received_by_name']
-    signature = request.form['signature_data']
+
+    try:
+        signature = _form_signature()
+    except signature_vector.InvalidSignature as e:
+        flash(f'Assinatura inválida: {e} Colete novamente.', 'danger')
+        return _action_response(item_id, fallback=url_for('facilities.delivery_page', item_id=item_id))
     
     db = get_db()
     unit_id = session.get('unit_id')
@@ -207,7 +305,7 @@ def delivery_confirm(item_id):
     db.commit()
     
     flash(f'Item entregue com sucesso para {received_by}!', 'success')
-    return redirect(url_for('facilities.dashboard', tab='entregar'))
+    return _action_response(item_id, 'entregar')
 
 @facilities_bp.route('/facilities/resend_alert/<int:item_id>', methods=['POST'])
 @login_required
@@ -218,7 +316,7 @@ def resend_alert(item_id):
     
     if not item:
         flash('Item não encontrado.', 'danger')
-        return redirect(url_for('facilities.dashboard', tab='entregar'))
+        return _action_response(item_id, 'entregar')
 
     rec_email = item['recipient_email']
     if not rec_email and item['recipient_name_manual'] and '@' in item['recipient_name_manual']:
@@ -226,24 +324,179 @@ def resend_alert(item_id):
 
     if rec_email:
         # Verifica se é um grupo
-        group = db.execute("SELECT id FROM email_groups WHERE name = ?", (rec_email,)).fetchone()
+        is_group, recipients = resolve_recipients(db, rec_email)
+        results = send_collection_alerts(recipients, item['internal_id'], item['type'], unit_id=item['unit_id'])
         
-        if group:
-            members = db.execute("SELECT email FROM email_group_members WHERE group_id = ?", (group['id'],)).fetchall()
-            emails_sent = 0
-            for member in members:
-                if send_collection_alert(member['email'], item['internal_id'], item['type']):
-                    emails_sent += 1
+        if is_group:
+            emails_sent = sum(results.values())
             flash(f'Alertas reenviados para o grupo "{rec_email}". {emails_sent} notificações enviadas!', 'success')
+            _flash_failed_recipients(results)
         else:
-            if send_collection_alert(rec_email, item['internal_id'], item['type']):
+            if results.get(rec_email.strip()):
                 flash(f'Alerta de reenvio enviado para {rec_email}!', 'success')
             else:
                 flash(f'Erro ao reenviar e-mail para {rec_email}.', 'warning')
     else:
         flash('Destinatário não possui e-mail cadastrado.', 'warning')
 
-    return redirect(url_for('facilities.dashboard', tab='entregar'))
+    return _action_response(item_id, 'entregar')
+
+# --- Operações em lote ------------------------------------------------
+# Coleta, alocação e entrega de vários itens marcados no painel: uma transação, um UPDATE por
+# lote de ids e executemany para movements/proofs, em vez de um POST (e um commit) por item.
+# Ids por UPDATE/SELECT: abaixo do limite de parâmetros de uma query no SQLite
+BULK_CHUNK = 500
+
+def _bulk_ids():
+    """IDs marcados no painel (checkboxes item_ids), sem repetidos"""
+    return list(dict.fromkeys(int(value) for value in request.values.getlist('item_ids') if value.isdigit()))
+
+def _id_chunks(item_ids):
+    for start in range(0, len(item_ids), BULK_CHUNK):
+        chunk = item_ids[start:start + BULK_CHUNK]
+        yield chunk, ', '.join('?' for _ in chunk)
+
+def _bulk_items(db, unit_id, item_ids, status):
+    """Itens da unidade entre os marcados que ainda estão em `status` (o resto é ignorado)"""
+    items = []
+    for chunk, marks in _id_chunks(item_ids):
+        items += db.execute(
+            f"SELECT * FROM items WHERE id IN ({marks}) AND unit_id = ? AND status = ? ORDER BY id",
+            chunk + [unit_id, status]
+        ).fetchall()
+    return items
+
+def _bulk_update(db, item_ids, assignments, params=()):
+    for chunk, marks in _id_chunks(item_ids):
+        db.execute(f"UPDATE items SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id IN ({marks})",
+                   list(params) + chunk)
+
+def _bulk_movements(db, item_ids, action, unit_id):
+    db.executemany("INSERT INTO movements (item_id, user_id, action, unit_id) VALUES (?, ?, ?, ?)",
+                   [(item_id, session['user_id'], action, unit_id) for item_id in item_ids])
+
+def _recipient_key(item):
+    return (item['recipient_email'] or item['recipient_name_manual'] or '').strip().lower()
+
+def _bulk_response(item_ids, tab, fallback=None):
+    """Como _action_response, para o lote: no JSON vai uma linha (com item_id) por item afetado"""
+    if not wants_json():
+        return redirect(fallback or url_for('facilities.dashboard', tab=tab))
+    db = get_db()
+    unit_id = session.get('unit_id')
+    items = {}
+    for chunk, marks in _id_chunks(item_ids):
+        for item in db.execute(DASHBOARD_SELECT + f"WHERE i.id IN ({marks}) AND i.unit_id = ?", chunk + [unit_id]):
+            items[item['id']] = item
+    rows = [dict(_item_row(items.get(item_id)), item_id=item_id) for item_id in item_ids]
+    return _action_json(db, unit_id, item_ids=item_ids, rows=rows)
+
+@facilities_bp.route('/facilities/bulk/collect', methods=['POST'])
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def bulk_collect():
+    db = get_db()
+    unit_id = session.get('unit_id')
+    item_ids = [item['id'] for item in _bulk_items(db, unit_id, _bulk_ids(), 'RECEBIDO_PORTARIA')]
+    if not item_ids:
+        flash('Nenhum dos itens marcados está aguardando coleta.', 'warning')
+        return _bulk_response([], 'portaria')
+
+    _bulk_update(db, item_ids, "status = 'EM_FACILITIES'")
+    _bulk_movements(db, item_ids, 'COLLECT_FROM_PORTARIA', unit_id)
+    db.commit()
+    flash(f'{len(item_ids)} item(ns) coletado(s) com sucesso.', 'success')
+    return _bulk_response(item_ids, 'portaria')
+
+@facilities_bp.route('/facilities/bulk/allocate', methods=['POST'])
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def bulk_allocate():
+    """Mesmo local e destinatário para todos os itens marcados; um aviso por endereço listando todos"""
+    location, rec_email, rec_manual, rec_floor, observation = _allocation_form()
+    db = get_db()
+    unit_id = session.get('unit_id')
+    items = _bulk_items(db, unit_id, _bulk_ids(), 'EM_FACILITIES')
+    if not items:
+        flash('Nenhum dos itens marcados está aguardando alocação.', 'warning')
+        return _bulk_response([], 'triagem')
+
+    item_ids = [item['id'] for item in items]
+    _bulk_update(
+        db, item_ids,
+        "status = 'DISPONIVEL_PARA_RETIRADA', location = ?, recipient_email = ?, recipient_name_manual = ?, "
+        "recipient_floor = ?, observation = ?",
+        (location, rec_email, rec_manual, rec_floor, observation)
+    )
+    _bulk_movements(db, item_ids, f'ALLOCATED: {location} AND ID_RECIPIENT | {observation or ""}', unit_id)
+
+    if rec_email:
+        is_group, recipients = resolve_recipients(db, rec_email)
+        results = send_collection_digest(recipients, items, location, unit_id=unit_id)
+        emails_sent = sum(results.values())
+        if emails_sent:
+            flash(f'{len(items)} item(ns) alocado(s) em {location} para {rec_email}. {emails_sent} notificação(ões) enviada(s)!', 'success')
+        else:
+            flash(f'{len(items)} item(ns) alocado(s) em {location}, mas houve um erro ao enviar o e-mail.', 'warning')
+        if is_group:
+            _flash_failed_recipients(results)
+    else:
+        flash(f'{len(items)} item(ns) alocado(s) em {location} para {rec_manual}. (Sem e-mail para notificar)', 'success')
+
+    db.commit()
+    return _bulk_response(item_ids, 'triagem')
+
+def _bulk_delivery_items(db, unit_id):
+    """Itens marcados prontos para retirada; None (com flash) se forem de destinatários diferentes"""
+    items = _bulk_items(db, unit_id, _bulk_ids(), 'DISPONIVEL_PARA_RETIRADA')
+    if not items:
+        flash('Nenhum dos itens marcados está disponível para entrega.', 'warning')
+        return None
+    if len({_recipient_key(item) for item in items}) > 1:
+        flash('Entrega em lote: todos os itens marcados precisam ser do mesmo destinatário.', 'danger')
+        return None
+    return items
+
+@facilities_bp.route('/delivery/bulk')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def bulk_delivery_page():
+    items = _bulk_delivery_items(get_db(), session.get('unit_id'))
+    if items is None:
+        return redirect(url_for('facilities.dashboard', tab='entregar'))
+    capture_mode = current_app.config.get('SIGNATURE_CAPTURE_MODE', 'vector')
+    return render_template('delivery.html', item=None, items=items, capture_mode=capture_mode)
+
+@facilities_bp.route('/delivery/bulk/confirm', methods=['POST'])
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def bulk_delivery_confirm():
+    """Uma assinatura para todos os itens marcados do mesmo destinatário"""
+    received_by = request.form['received_by_name']
+    db = get_db()
+    unit_id = session.get('unit_id')
+    items = _bulk_delivery_items(db, unit_id)
+    if items is None:
+        return _bulk_response([], 'entregar')
+    item_ids = [item['id'] for item in items]
+
+    try:
+        signature = _form_signature()
+    except signature_vector.InvalidSignature as e:
+        flash(f'Assinatura inválida: {e} Colete novamente.', 'danger')
+        return _bulk_response(item_ids, 'entregar', url_for('facilities.bulk_delivery_page', item_ids=item_ids))
+
+    _bulk_update(db, item_ids, "status = 'ENTREGUE'")
+    # Todos os comprovantes apontam para a mesma assinatura (no store, o mesmo arquivo)
+    db.executemany(
+        "INSERT OR REPLACE INTO proofs (item_id, signature_data, delivered_by, received_by_name, delivered_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        [(item_id, signature, session['user_id'], received_by) for item_id in item_ids]
+    )
+    _bulk_movements(db, item_ids, 'DELIVERED', unit_id)
+    db.commit()
+
+    flash(f'{len(item_ids)} item(ns) entregue(s) com sucesso para {received_by}!', 'success')
+    return _bulk_response(item_ids, 'entregar')
 
 @facilities_bp.route('/facilities/register-occurrence', methods=['POST'])
 @login_required
@@ -264,13 +517,22 @@ def register_occurrence():
         flash('Senha de confirmação incorreta. O registro não foi salvo.', 'danger')
         return redirect(url_for('facilities.dashboard', tab='entregar')) # Abre o modal via JS
 
-    # 2. Buscar o Item
-    item = db.execute("SELECT * FROM items WHERE internal_id = ? AND unit_id = ?", (internal_id, unit_id)).fetchone()
+    # 2. Buscar o Item (também no arquivo: itens antigos podem ser recuperados)
+    item, tier = find_in_tiers(db, "SELECT * FROM {items} WHERE internal_id = ? AND unit_id = ?", (internal_id, unit_id))
     if not item:
         flash(f'Item com ID "{internal_id}" não encontrado nesta unidade.', 'danger')
         return redirect(url_for('facilities.dashboard'))
 
     # 3. Processar Ação
+    if action == 'RECUPERADO' and item['status'] in ['DEVOLVIDO', 'ENTREGUE'] and session.get('role') != 'ADMIN':
+        # REGRA: Se o item está DEVOLVIDO ou ENTREGUE, apenas ADMIN pode recuperar
+        flash('Apenas administradores podem recuperar itens marcados como devolvidos ou já entregues.', 'danger')
+        return redirect(url_for('facilities.dashboard'))
+
+    if tier is COLD and action in ('EXTRAVIADO', 'DEVOLVIDO', 'RECUPERADO'):
+        # Item arquivado volta para as tabelas ativas antes de mudar (o arquivamento o leva de novo depois)
+        restore_item(db, item['id'])
+
     if action in ('EXTRAVIADO', 'DEVOLVIDO'):
         # Move para o histórico com nota
         db.execute("UPDATE items SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (action, item['id']))
@@ -285,11 +547,6 @@ def register_occurrence():
         flash(f'Ocorrência de {action} registrada para o item {internal_id}.', 'warning')
 
     elif action == 'RECUPERADO':
-        # REGRA: Se o item está DEVOLVIDO ou ENTREGUE, apenas ADMIN pode recuperar
-        if item['status'] in ['DEVOLVIDO', 'ENTREGUE'] and session.get('role') != 'ADMIN':
-            flash('Apenas administradores podem recuperar itens marcados como devolvidos ou já entregues.', 'danger')
-            return redirect(url_for('facilities.dashboard'))
-
         # Volta para triagem (Alocar Local)
         db.execute("UPDATE items SET status = 'EM_FACILITIES', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (item['id'],))
         
@@ -311,8 +568,68 @@ def register_occurrence():
 def check_item_status(internal_id):
     db = get_db()
     unit_id = session.get('unit_id')
-    item = db.execute("SELECT status FROM items WHERE internal_id = ? AND unit_id = ?", (internal_id, unit_id)).fetchone()
+    item, _ = find_in_tiers(db, "SELECT status FROM {items} WHERE internal_id = ? AND unit_id = ?", (internal_id, unit_id))
     
     if item:
         return {"status": item['status']}, 200
     return {"error": "Item não encontrado"}, 404
+
+@facilities_bp.route('/api/counters')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def counters():
+    """Contadores da unidade ativa (cards do dashboard e badges do navbar)"""
+    db = get_db()
+    unit_id = session.get('unit_id')
+    return {
+        "unit_id": unit_id,
+        "stats": get_dashboard_stats(db, unit_id),
+        "by_status": get_status_counts(db, unit_id)
+    }, 200
+
+@facilities_bp.route('/api/recipients/search')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def recipients_search():
+    """Typeahead de destinatários (usuários e grupos) da unidade ativa"""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if not query:
+        return {"results": []}, 200
+
+    matches = search_recipients(get_db(), session.get('unit_id'), query, limit,
+                                ttl=current_app.config.get('RECIPIENT_INDEX_TTL', 60))
+    return {
+        "results": [{"value": m['value'], "label": m['label'], "kind": m['kind']} for m in matches]
+    }, 200
+
+@facilities_bp.route('/facilities/search')
+@login_required
+@role_required(['FACILITIES', 'ADMIN', 'FACILITIES_PORTARIA'])
+def search():
+    """Pesquisa global de encomendas da unidade (índice de texto, ordenado por relevância)"""
+    db = get_db()
+    unit_id = session.get('unit_id')
+    text = request.args.get('q', '').strip()
+    status = request.args.get('status') or None
+    # A data do filtro é o início do dia no fuso da unidade (timestamp UTC, comparável com updated_at)
+    since = parse_day(request.args.get('date'))
+    if since:
+        since = day_start(since, unit_timezone(db, unit_id))
+
+    items = None
+    if text:
+        items = search_items(db, unit_id, text, status=status, since=since)
+    elif status or since:
+        # Sem texto: só os filtros, mais recentes primeiro, nas duas camadas (ativa e arquivo)
+        template = "SELECT i.* FROM {items} i WHERE i.unit_id = ?"
+        params = [unit_id]
+        if status:
+            template += " AND i.status = ?"
+            params.append(status)
+        if since:
+            template += " AND i.updated_at >= ?"
+            params.append(since)
+        sources = [(query, params) for query in tier_queries(template)]
+        items = keyset_merge(db, sources, ['i.updated_at', 'i.id'], descending=True, limit=SEARCH_LIMIT).items
+    return render_template('facilities/search.html', items=items)
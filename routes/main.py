@@ -1,7 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from utils.db import get_db
+import os
+import heapq
+import base64
+import binascii
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, make_response, send_file
+from utils.db import get_db, get_pool
 from utils.auth import login_required, role_required
 from utils.notifications import send_support_ticket
+from utils.signature_store import get_signature_store, is_blob_ref
+from utils import signature_vector
+from utils.exports import history_filters
+from utils.pagination import keyset_merge
+from utils.archive import tier_queries, find_in_tiers
+from utils.versions import conditional_page, data_versions
+from utils.fragment_cache import get_fragment_cache
+from utils import reference_data, live
 
 main_bp = Blueprint('main', __name__)
 
@@ -16,7 +28,15 @@ ITEM_ACTION_MAP = {
     'RECORDED_OCCURRENCE: DEVOLVIDO': '⚠️ Registrada Ocorrência: DEVOLVIDO'
 }
 
+def _my_items(db, email, unit_id):
+    """Encomendas do usuário nas duas camadas (os finalizados antigos estão no arquivo), mais novas primeiro"""
+    template = "SELECT * FROM {items} WHERE (recipient_email = ? OR recipient_name_manual = ?) AND unit_id = ? ORDER BY created_at DESC"
+    streams = [db.execute(query, (email, email, unit_id)).fetchall() for query in tier_queries(template)]
+    # Cada camada já vem ordenada; NULL por último, como no ORDER BY ... DESC do SQLite
+    return list(heapq.merge(*streams, key=lambda item: (item['created_at'] is not None, item['created_at']), reverse=True))
+
 @main_bp.route('/')
+@conditional_page
 def index():
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
@@ -32,10 +52,7 @@ def index():
         email = user['email']
         
         unit_id = session.get('unit_id')
-        my_items = db.execute(
-            'SELECT * FROM items WHERE (recipient_email = ? OR recipient_name_manual = ?) AND unit_id = ? ORDER BY created_at DESC', 
-            (email, email, unit_id)
-        ).fetchall()
+        my_items = _my_items(db, email, unit_id)
 
         unclaimed_items = db.execute(
             "SELECT * FROM items WHERE (recipient_email IS NULL OR recipient_email = '') "
@@ -48,16 +65,14 @@ def index():
 
 @main_bp.route('/home')
 @login_required
+@conditional_page
 def home_user():
     db = get_db()
     user = db.execute('SELECT email FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     email = user['email']
     
     unit_id = session.get('unit_id')
-    my_items = db.execute(
-        'SELECT * FROM items WHERE (recipient_email = ? OR recipient_name_manual = ?) AND unit_id = ? ORDER BY created_at DESC', 
-        (email, email, unit_id)
-    ).fetchall()
+    my_items = _my_items(db, email, unit_id)
 
     unclaimed_items = db.execute(
         "SELECT * FROM items WHERE (recipient_email IS NULL OR recipient_email = '') "
@@ -71,39 +86,101 @@ def home_user():
 @main_bp.route('/history')
 @login_required
 @role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+@conditional_page
 def history():
-    db = get_db()
-    
-    unit_id = session.get('unit_id')
-    query = """
-        SELECT i.*, p.signature_data, p.received_by_name, p.delivered_at, u.full_name as deliverer_name, p.occurrence_note
-        FROM items i
-        JOIN proofs p ON i.id = p.item_id
+    page = _history_page(get_db(), session.get('unit_id'), request.args)
+    return render_template('history.html', items=page.items, next_cursor=page.next_cursor)
+
+@main_bp.route('/history/more')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def history_more():
+    """Próxima página do histórico ("Carregar mais"), com os mesmos filtros"""
+    try:
+        page = _history_page(get_db(), session.get('unit_id'), request.args, request.args.get('cursor'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    html = render_template('includes/page_rows.html', macros='macros/history_rows.html', row='history_row', items=page.items)
+    return {"html": html, "next_cursor": page.next_cursor}
+
+def _history_page(db, unit_id, args, cursor=None):
+    # (delivered_at, item_id) é exatamente o idx_proofs_delivered_at (item_id é o rowid de proofs);
+    # cada camada (ativa e arquivo) devolve a sua página pelo próprio índice e elas são intercaladas
+    template = """
+        SELECT i.*, p.item_id, p.received_by_name, p.delivered_at, u.full_name as deliverer_name, p.occurrence_note
+        FROM {items} i
+        JOIN {proofs} p ON i.id = p.item_id
         JOIN users u ON p.delivered_by = u.id
         WHERE i.status IN ('ENTREGUE', 'EXTRAVIADO', 'DEVOLVIDO') AND i.unit_id = ?
     """
-    params = [unit_id]
-    
-    search = request.args.get('q')
-    if search:
-        query += " AND (i.internal_id LIKE ? OR i.tracking_code LIKE ? OR i.sender LIKE ? OR p.received_by_name LIKE ?)"
-        term = f"%{search}%"
-        params.extend([term, term, term, term])
-        
-    start_date = request.args.get('start_date')
-    if start_date:
-        query += " AND date(p.delivered_at) >= ?"
-        params.append(start_date)
-        
-    end_date = request.args.get('end_date')
-    if end_date:
-        query += " AND date(p.delivered_at) <= ?"
-        params.append(end_date)
-        
-    query += " ORDER BY p.delivered_at DESC"
-    
-    items = db.execute(query, params).fetchall()
-    return render_template('history.html', items=items)
+    filters, params = history_filters(args, 'p.delivered_at', unit_id)
+    sources = [(query + filters, [unit_id] + params) for query in tier_queries(template)]
+    return keyset_merge(db, sources, ['p.delivered_at', 'p.item_id'], descending=True, cursor=cursor)
+
+# Comprovantes não mudam depois da entrega: a URL leva a versão (delivered_at) e pode ficar em cache
+SIGNATURE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+PASSWORD_SIGNATURE = 'DATA:AUTHENTICATED_BY_PASSWORD'
+
+def _decode_data_url(data_url):
+    """Converte 'data:image/png;base64,...' em (mimetype, bytes); None se não for uma imagem"""
+    if not data_url or not data_url.startswith('data:image/') or ';base64,' not in data_url:
+        return None
+    header, encoded = data_url.split(';base64,', 1)
+    try:
+        return header[len('data:'):], base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+@main_bp.route('/history/signature/<int:item_id>')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def history_signature(item_id):
+    """Imagem da assinatura de um comprovante (carregada sob demanda pelo histórico)"""
+    db = get_db()
+    unit_id = session.get('unit_id')
+
+    proof, tier = find_in_tiers(
+        db, "SELECT p.delivered_at FROM {proofs} p JOIN {items} i ON i.id = p.item_id WHERE p.item_id = ? AND i.unit_id = ?",
+        (item_id, unit_id)
+    )
+    if not proof:
+        return {"error": "Comprovante não encontrado"}, 404
+
+    etag = f"sig-{item_id}-{proof['delivered_at']}"
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        signature = db.execute(f"SELECT signature_data FROM {tier['proofs']} WHERE item_id = ?", (item_id,)).fetchone()[0]
+        if signature == PASSWORD_SIGNATURE:
+            # Entrega autenticada por senha: não há imagem
+            response = make_response('', 204)
+        elif signature_vector.is_vector(signature):
+            try:
+                svg = signature_vector.render_svg(signature)
+            except (ValueError, signature_vector.InvalidSignature):
+                return {"error": "Comprovante sem assinatura"}, 404
+            response = make_response(svg)
+            response.mimetype = 'image/svg+xml'
+        elif is_blob_ref(signature):
+            # Arquivo no store em disco: send_file usa o file_wrapper do servidor (sem cópia em memória)
+            try:
+                path = get_signature_store().resolve(signature)
+            except ValueError:
+                path = None
+            if not path or not os.path.exists(path):
+                return {"error": "Arquivo da assinatura não encontrado"}, 404
+            response = send_file(path, mimetype='image/png', conditional=False, etag=False)
+        else:
+            decoded = _decode_data_url(signature)
+            if decoded is None:
+                return {"error": "Comprovante sem assinatura"}, 404
+            mimetype, data = decoded
+            response = make_response(data)
+            response.mimetype = mimetype
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = SIGNATURE_CACHE_CONTROL
+    return response
 
 @main_bp.route('/report-problem', methods=['POST'])
 @login_required
@@ -129,35 +206,75 @@ def report_problem():
 def set_unit(unit_id):
     db = get_db()
     # Verifica se a unidade existe e está ativa
-    unit = db.execute("SELECT id FROM settings_companies WHERE id = ? AND is_active = 1", (unit_id,)).fetchone()
-    if unit:
+    unit = reference_data.company(db, unit_id)
+    if unit and unit['is_active']:
         session['unit_id'] = unit['id']
         flash(f'Unidade alterada com sucesso.', 'info')
     
     return redirect(request.referrer or url_for('main.index'))
 
+@main_bp.route('/api/unit/<int:unit_id>/version')
+@login_required
+def unit_version(unit_id):
+    """Versão dos dados da unidade para quem faz polling: só recarrega quando ela muda"""
+    if unit_id != session.get('unit_id') and session.get('role') != 'ADMIN':
+        return {"error": "Unidade não permitida"}, 403
+    version, reference_version = data_versions(get_db(), unit_id)
+    return {"unit_id": unit_id, "version": version, "reference_version": reference_version}
+
+@main_bp.route('/api/fragment-cache')
+@login_required
+@role_required(['ADMIN'])
+def fragment_cache_stats():
+    """Acertos, falhas e ocupação do cache de fragmentos deste worker"""
+    cache = get_fragment_cache()
+    if cache is None:
+        return {"enabled": False, "pid": os.getpid()}
+    return dict(cache.stats(), enabled=True, pid=os.getpid())
+
+@main_bp.route('/api/db-pool')
+@login_required
+@role_required(['ADMIN'])
+def db_pool_stats():
+    """Conexões abertas, em uso, esperas e timeouts do pool deste worker"""
+    pool = get_pool()
+    if pool is None:
+        return {"enabled": False, "pid": os.getpid()}
+    return dict(pool.stats(), enabled=True)
+
+@main_bp.route('/api/unit/<int:unit_id>/events')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA', 'PORTARIA'])
+def unit_events(unit_id):
+    """Feed ao vivo (Server-Sent Events) do ciclo de vida dos itens da unidade, para os painéis"""
+    if unit_id != session.get('unit_id') and session.get('role') != 'ADMIN':
+        return {"error": "Unidade não permitida"}, 403
+    # Na reconexão o navegador manda o último id recebido; na primeira, vale o da página
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return live.event_stream(get_db(), unit_id, last_event_id)
+
 @main_bp.route('/api/item/history/<int:item_id>')
 @login_required
 def get_item_history(item_id):
     db = get_db()
-    # 1. Busca dados básicos do item
-    item = db.execute("SELECT internal_id, status, sender, observation FROM items WHERE id = ?", (item_id,)).fetchone()
+    # 1. Busca dados básicos do item (ativo ou arquivado)
+    item, tier = find_in_tiers(db, "SELECT internal_id, status, sender, observation FROM {items} WHERE id = ?", (item_id,))
     if not item:
         return {"error": "Item não encontrado"}, 404
 
     # 2. Busca todas as movimentações com o nome do usuário responsável
-    movements = db.execute("""
+    movements = db.execute(f"""
         SELECT m.timestamp, m.action, u.full_name as user_name
-        FROM movements m
+        FROM {tier['movements']} m
         JOIN users u ON m.user_id = u.id
         WHERE m.item_id = ?
         ORDER BY m.timestamp ASC
     """, (item_id,)).fetchall()
     
     # 3. Busca detalhes extras do comprovante se houver (quem recebeu de fato)
-    proof = db.execute("""
+    proof = db.execute(f"""
         SELECT p.received_by_name, p.occurrence_note
-        FROM proofs p
+        FROM {tier['proofs']} p
         WHERE p.item_id = ?
     """, (item_id,)).fetchone()
     
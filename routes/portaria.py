@@ -1,15 +1,21 @@
 import datetime
 import random
 import string
+from markupsafe import Markup
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from utils.db import get_db
 from utils.auth import login_required, role_required
+from utils.timezones import unit_timezone, local_today, day_range
+from utils.versions import conditional_page
+from utils.fragment_cache import cached_fragment
+from utils import reference_data, live
 
 portaria_bp = Blueprint('portaria', __name__)
 
 @portaria_bp.route('/portaria')
 @login_required
 @role_required(['PORTARIA', 'ADMIN', 'FACILITIES_PORTARIA'])
+@conditional_page
 def dashboard():
     db = get_db()
     user_role = session.get('role')
@@ -35,32 +41,70 @@ def dashboard():
             session['unit_id'] = first_unit['id']
             unit_id = first_unit['id']
 
-    today_date = datetime.date.today().strftime('%Y-%m-%d')
+    # "Hoje" é o dia no fuso da unidade; o banco grava em UTC, então o dia vira uma faixa de timestamps
+    tz = unit_timezone(db, unit_id)
+    today = local_today(tz)
+    today_start, tomorrow_start = day_range(today, tz)
+    today_date = today.strftime('%Y-%m-%d')
 
-    # Itens recebidos hoje (considerando que o banco já armazena em horário local)
-    today_items = db.execute(
-        'SELECT * FROM items WHERE date(created_at) = ? '
-        'AND unit_id = ? '
+    # Itens recebidos hoje
+    today = _list_fragment(db, unit_id, 'today', today_date, lambda: db.execute(
+        'SELECT * FROM items WHERE unit_id = ? '
+        'AND created_at >= ? AND created_at < ? '
         'ORDER BY created_at DESC',
-        (today_date, unit_id)
-    ).fetchall()
+        (unit_id, today_start, tomorrow_start)
+    ).fetchall())
     
     # Itens pendentes de dias anteriores
-    pending_items = db.execute(
-        'SELECT * FROM items WHERE status = "RECEBIDO_PORTARIA" '
-        'AND date(created_at) < ? '
+    pending = _list_fragment(db, unit_id, 'pending', today_date, lambda: db.execute(
+        "SELECT * FROM items WHERE status = 'RECEBIDO_PORTARIA' "
+        'AND created_at < ? '
         'AND unit_id = ? '
         'ORDER BY created_at ASC',
-        (today_date, unit_id)
-    ).fetchall()
+        (today_start, unit_id)
+    ).fetchall())
     
-    item_types = db.execute("SELECT * FROM settings_item_types WHERE is_active = 1").fetchall()
+    item_types = reference_data.item_types(db)
     
     return render_template('portaria/dashboard.html', 
-                           today_items=today_items, 
-                           pending_items=pending_items, 
+                           today=today, 
+                           pending=pending, 
                            item_types=item_types,
-                           today_date=today_date)
+                           today_date=today_date,
+                           live_since=live.latest_event_id(db))
+
+def _rows_html(name, items):
+    return render_template('includes/page_rows.html', macros='macros/portaria_rows.html', row=f'{name}_row', items=items)
+
+def _list_fragment(db, unit_id, name, day, query):
+    """Tabela do painel já renderizada, no cache de fragmentos pela versão da unidade e pelo dia local"""
+    def render():
+        items = query()
+        return {"html": Markup(_rows_html(name, items)), "count": len(items)}
+    return cached_fragment(db, unit_id, f'portaria:{name}', render, variant=day)
+
+@portaria_bp.route('/portaria/row/<int:item_id>')
+@login_required
+@role_required(['PORTARIA', 'ADMIN', 'FACILITIES_PORTARIA'])
+def dashboard_row(item_id):
+    """Linha atual do item no painel da portaria (feed ao vivo); list=None quando ele não aparece mais"""
+    db = get_db()
+    unit_id = session.get('unit_id')
+    item = db.execute("SELECT * FROM items WHERE id = ? AND unit_id = ?", (item_id, unit_id)).fetchone()
+    if not item:
+        return {"list": None}
+
+    tz = unit_timezone(db, unit_id)
+    today_start, tomorrow_start = day_range(local_today(tz), tz)
+    created_at = item['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    if today_start <= created_at < tomorrow_start:
+        name, table, position = 'today', 'tableTodayPortaria', 'top'
+    elif created_at < today_start and item['status'] == 'RECEBIDO_PORTARIA':
+        name, table, position = 'pending', 'tablePendingPortaria', 'bottom'
+    else:
+        return {"list": None}
+    html = _rows_html(name, [item])
+    return {"list": name, "table": table, "html": html, "position": position}
 
 @portaria_bp.route('/portaria/register', methods=['POST'])
 @login_required
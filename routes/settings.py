@@ -1,9 +1,13 @@
+import os
 import sqlite3
-import csv
-import io
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, current_app
 from utils.db import get_db
-from utils.auth import login_required, role_required
+from utils.auth import login_required, role_required, wants_json
+from utils import reference_data
+from utils.exports import stream_export, wants_gzip
+from utils.timezones import get_zone
+from utils.export_jobs import (enqueue_export, get_job, list_jobs, job_status, job_path, get_spool_dir,
+                               download_name, FORMATS)
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -14,24 +18,17 @@ def dashboard():
     db = get_db()
     
     unit_id = session.get('unit_id')
-    item_types = db.execute("SELECT * FROM settings_item_types WHERE is_active = 1 ORDER BY name ASC").fetchall()
-    locations = db.execute("SELECT * FROM settings_locations WHERE is_active = 1 AND unit_id = ? ORDER BY name ASC", (unit_id,)).fetchall()
-    companies = db.execute("SELECT * FROM settings_companies WHERE is_active = 1 ORDER BY name ASC").fetchall()
+    item_types = reference_data.item_types(db)
+    locations = reference_data.locations(db, unit_id)
+    companies = reference_data.active_companies(db)
     
-    # Busca grupos e concatena os membros para facilitar o preenchimento dos modais
-    email_groups = db.execute("""
-        SELECT g.id, g.name, GROUP_CONCAT(m.email, ', ') as members
-        FROM email_groups g
-        LEFT JOIN email_group_members m ON g.id = m.group_id
-        WHERE g.unit_id = ?
-        GROUP BY g.id
-        ORDER BY g.name ASC
-    """, (unit_id,)).fetchall()
+    # Grupos com os membros concatenados para facilitar o preenchimento dos modais
+    email_groups = reference_data.email_groups(db, unit_id)
     
     domains = []
     
     if session['role'] == 'ADMIN':
-        domains = db.execute("SELECT * FROM settings_allowed_domains WHERE is_active = 1 ORDER BY domain ASC").fetchall()
+        domains = reference_data.allowed_domains(db)
         
     return render_template('settings.html', 
                             item_types=item_types, 
@@ -64,6 +61,7 @@ def add(category):
             flash('Ação não permitida ou categoria inválida.', 'danger')
             return redirect(url_for('settings.dashboard'))
             
+        reference_data.bump_version(db)
         db.commit()
         flash('Item adicionado com sucesso.', 'success')
     except sqlite3.IntegrityError:
@@ -92,6 +90,7 @@ def delete(category, item_id):
         return redirect(url_for('settings.dashboard'))
 
     db.execute(query, (item_id,))
+    reference_data.bump_version(db)
     db.commit()
     flash('Item removido.', 'success')
     
@@ -116,6 +115,7 @@ def add_email_group():
             if email:
                 db.execute("INSERT INTO email_group_members (group_id, email) VALUES (?, ?)", (group_id, email))
         
+        reference_data.bump_version(db)
         db.commit()
         flash(f'Grupo "{name}" criado com sucesso.', 'success')
     except sqlite3.IntegrityError:
@@ -130,6 +130,7 @@ def delete_email_group(group_id):
     db = get_db()
     db.execute("DELETE FROM email_groups WHERE id = ?", (group_id,))
     db.execute("DELETE FROM email_group_members WHERE group_id = ?", (group_id,))
+    reference_data.bump_version(db)
     db.commit()
     flash('Grupo de e-mail removido.', 'success')
     return redirect(url_for('settings.dashboard', tab='list-groups'))
@@ -154,6 +155,7 @@ def edit_email_group(group_id):
             if email:
                 db.execute("INSERT INTO email_group_members (group_id, email) VALUES (?, ?)", (group_id, email))
         
+        reference_data.bump_version(db)
         db.commit()
         flash(f'Grupo "{name}" atualizado com sucesso.', 'success')
     except sqlite3.IntegrityError:
@@ -161,85 +163,89 @@ def edit_email_group(group_id):
         
     return redirect(url_for('settings.dashboard', tab='list-groups'))
 
-@settings_bp.route('/history/export')
+@settings_bp.route('/settings/company/<int:unit_id>/timezone', methods=['POST'])
 @login_required
 @role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
-def export():
+def company_timezone(unit_id):
+    """Fuso da unidade: define o "hoje" da portaria e os filtros por data (vazio = padrão do sistema)"""
+    name = request.form.get('timezone', '').strip() or None
+    if name:
+        try:
+            get_zone(name)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('settings.dashboard', tab='list-companies'))
+
+    db = get_db()
+    db.execute("UPDATE settings_companies SET timezone = ? WHERE id = ?", (name, unit_id))
+    reference_data.bump_version(db)
+    db.commit()
+    flash('Fuso horário atualizado.', 'success')
+    return redirect(url_for('settings.dashboard', tab='list-companies'))
+
+def _export(kind):
+    """Enfileira a exportação (padrão) ou, com ?stream=1, entrega o CSV direto em streaming"""
     db = get_db()
-    
     unit_id = session.get('unit_id')
-    query = """
-        SELECT i.internal_id, i.tracking_code, i.type, i.sender, i.recipient_email, i.recipient_name_manual, 
-               i.location, p.received_by_name, u.full_name as deliverer_name, p.delivered_at
-        FROM items i
-        LEFT JOIN proofs p ON i.id = p.item_id
-        LEFT JOIN users u ON p.delivered_by = u.id
-        WHERE i.status = 'ENTREGUE' AND i.unit_id = ?
-        ORDER BY p.delivered_at DESC
-    """
-    
-    items = db.execute(query, (unit_id,)).fetchall()
-    
-    si = io.StringIO()
-    cw = csv.writer(si, delimiter=';') 
-    
-    cw.writerow(['ID Interno', 'Código Rastreio', 'Tipo', 'Remetente', 'Destinatário (Email)', 'Destinatário (Manual)', 'Local Armazenado', 'Recebido Por', 'Entregue Por', 'Data Entrega'])
-    
-    for item in items:
-        cw.writerow([
-            item['internal_id'],
-            item['tracking_code'] or '',
-            item['type'],
-            item['sender'],
-            item['recipient_email'] or '',
-            item['recipient_name_manual'] or '',
-            item['location'] or '',
-            item['received_by_name'],
-            item['deliverer_name'],
-            item['delivered_at'].strftime('%d/%m/%Y %H:%M:%S') if item['delivered_at'] else ''
-        ])
-        
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = "attachment; filename=relatorio_entregas.csv"
-    output.headers["Content-type"] = "text/csv"
-    return output
+    if request.args.get('stream'):
+        return stream_export(db, kind, unit_id, request.args)
+
+    fmt = request.args.get('format') or ('csv.gz' if wants_gzip(request.args) else 'csv')
+    try:
+        job_id = enqueue_export(db, kind, fmt, unit_id, session['user_id'], request.args,
+                                current_app.config.get('EXPORT_MAX_PER_USER', 3))
+    except ValueError as e:
+        if wants_json():
+            return {"error": str(e)}, 429
+        flash(str(e), 'warning')
+        return redirect(url_for('settings.exports'))
+
+    if wants_json():
+        return {"job_id": job_id, "status_url": url_for('settings.export_status', job_id=job_id)}, 202
+    flash(f'Exportação #{job_id} na fila. O arquivo fica disponível para download aqui quando terminar.', 'info')
+    return redirect(url_for('settings.exports'))
+
+@settings_bp.route('/history/export')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def export():
+    return _export('history')
 
 @settings_bp.route('/panel/export')
 @login_required
 @role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
 def export_panel():
-    db = get_db()
-    
-    unit_id = session.get('unit_id')
-    # Exporta itens que NÃO foram entregues ainda (Etapas 1, 2 e 3)
-    query = """
-        SELECT i.internal_id, i.tracking_code, i.type, i.sender, i.recipient_email, i.recipient_name_manual, 
-               i.location, i.status, i.created_at
-        FROM items i
-        WHERE i.status != 'ENTREGUE' AND i.unit_id = ?
-        ORDER BY i.created_at ASC
-    """
-    
-    items = db.execute(query, (unit_id,)).fetchall()
-    
-    si = io.StringIO()
-    cw = csv.writer(si, delimiter=';') 
-    
-    cw.writerow(['ID Interno', 'Código Rastreio', 'Tipo', 'Remetente', 'Destinatário', 'Local', 'Status Atual', 'Data Entrada'])
-    
-    for item in items:
-        cw.writerow([
-            item['internal_id'],
-            item['tracking_code'] or '',
-            item['type'],
-            item['sender'],
-            item['recipient_email'] or item['recipient_name_manual'] or '',
-            item['location'] or '',
-            item['status'],
-            item['created_at'].strftime('%d/%m/%Y %H:%M:%S') if item['created_at'] else ''
-        ])
-        
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = "attachment; filename=painel_facilities.csv"
-    output.headers["Content-type"] = "text/csv"
-    return output
+    return _export('panel')
+
+@settings_bp.route('/exports')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def exports():
+    jobs = [job_status(job) | {'created_at': job['created_at']} for job in list_jobs(get_db(), session['user_id'])]
+    return render_template('exports.html', jobs=jobs)
+
+@settings_bp.route('/exports/<int:job_id>')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def export_status(job_id):
+    job = get_job(get_db(), job_id, session['user_id'])
+    if not job:
+        return {"error": "Exportação não encontrada"}, 404
+    status = job_status(job)
+    if job['status'] == 'DONE':
+        status['download_url'] = url_for('settings.export_download', job_id=job_id)
+    return status
+
+@settings_bp.route('/exports/<int:job_id>/download')
+@login_required
+@role_required(['ADMIN', 'FACILITIES', 'FACILITIES_PORTARIA'])
+def export_download(job_id):
+    job = get_job(get_db(), job_id, session['user_id'])
+    if not job or job['status'] != 'DONE':
+        flash('Exportação não encontrada ou ainda não concluída.', 'warning')
+        return redirect(url_for('settings.exports'))
+    path = job_path(get_spool_dir(), job)
+    if not os.path.exists(path):
+        flash('O arquivo desta exportação expirou. Gere novamente.', 'warning')
+        return redirect(url_for('settings.exports'))
+    return send_file(path, mimetype=FORMATS[job['format']][1], as_attachment=True, download_name=download_name(job))
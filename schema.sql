@@ -1,3 +1,13 @@
+DROP TABLE IF EXISTS unit_versions;
+DROP TABLE IF EXISTS cache_versions;
+DROP TABLE IF EXISTS proofs_archive;
+DROP TABLE IF EXISTS movements_archive;
+DROP TABLE IF EXISTS items_archive;
+DROP TABLE IF EXISTS items_fts;
+DROP TABLE IF EXISTS export_jobs;
+DROP TABLE IF EXISTS scheduler_leases;
+DROP TABLE IF EXISTS notification_outbox;
+DROP TABLE IF EXISTS item_status_counts;
 DROP TABLE IF EXISTS proofs;
 DROP TABLE IF EXISTS movements;
 DROP TABLE IF EXISTS items;
@@ -39,6 +49,7 @@ CREATE TABLE items (
     observation TEXT,
     unit_id INTEGER,
     last_notified_at TIMESTAMP,
+    next_reminder_at TIMESTAMP, -- próximo lembrete do `flask scheduler run`
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (recipient_email) REFERENCES users (email),
@@ -64,7 +75,7 @@ CREATE TABLE proofs (
     received_by_name TEXT NOT NULL,
     delivered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     occurrence_note TEXT, -- Nota para extravios ou devoluções
-    FOREIGN KEY (item_id) REFERENCES items id,
+    FOREIGN KEY (item_id) REFERENCES items (id),
     FOREIGN KEY (delivered_by) REFERENCES users (id)
 );
 
@@ -85,7 +96,8 @@ CREATE TABLE settings_locations (
 CREATE TABLE settings_companies (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL UNIQUE,
-    is_active INTEGER DEFAULT 1
+    is_active INTEGER DEFAULT 1,
+    timezone TEXT -- ex: America/Sao_Paulo; NULL = DEFAULT_TIMEZONE
 );
 
 CREATE TABLE settings_allowed_domains (
@@ -108,3 +120,288 @@ CREATE TABLE email_group_members (
     email TEXT NOT NULL,
     FOREIGN KEY (group_id) REFERENCES email_groups (id) ON DELETE CASCADE
 );
+
+-- Índices dos caminhos quentes (dashboards, histórico, ciclo de vida e cron)
+CREATE INDEX idx_items_unit_status ON items (unit_id, status, updated_at);
+CREATE INDEX idx_items_unit_created ON items (unit_id, created_at);
+CREATE INDEX idx_items_unit_status_created ON items (unit_id, status, created_at);
+CREATE INDEX idx_items_recipient_email ON items (recipient_email, unit_id);
+CREATE INDEX idx_items_recipient_manual ON items (recipient_name_manual, unit_id);
+CREATE INDEX idx_items_status_notified ON items (status, last_notified_at);
+CREATE INDEX idx_items_status_reminder ON items (status, next_reminder_at);
+CREATE INDEX idx_movements_item ON movements (item_id, timestamp);
+CREATE INDEX idx_proofs_delivered_at ON proofs (delivered_at);
+CREATE INDEX idx_users_active_created ON users (is_active, created_at);
+CREATE INDEX idx_email_group_members_group ON email_group_members (group_id);
+
+-- Contadores materializados (unit_id, status) -> count, mantidos por triggers.
+-- unit_id NULL vira 0 para que o UPSERT funcione (NULL nunca conflita na PK).
+CREATE TABLE item_status_counts (
+    unit_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (unit_id, status)
+);
+
+CREATE TRIGGER trg_items_count_insert AFTER INSERT ON items
+BEGIN
+    INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+    ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER trg_items_count_delete AFTER DELETE ON items
+BEGIN
+    UPDATE item_status_counts SET count = count - 1
+    WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+END;
+
+CREATE TRIGGER trg_items_count_update AFTER UPDATE OF status, unit_id ON items
+WHEN OLD.status IS NOT NEW.status OR OLD.unit_id IS NOT NEW.unit_id
+BEGIN
+    UPDATE item_status_counts SET count = count - 1
+    WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+    INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+    ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+END;
+
+-- Fila persistente de e-mails: o request só insere (na mesma transação do item);
+-- o processo `flask notifications-worker` envia, com retry e dead-letter.
+CREATE TABLE notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    reply_to TEXT,
+    item_internal_id TEXT,
+    status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING, SENDING, SENT, DEAD
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_by TEXT,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX idx_outbox_status_due ON notification_outbox (status, next_attempt_at);
+CREATE INDEX idx_outbox_locked_by ON notification_outbox (locked_by);
+
+-- Lease do scheduler de lembretes: só um processo `flask scheduler run` age por vez
+CREATE TABLE scheduler_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Exportações em segundo plano: o request registra o job, o `flask exports-worker` gera o arquivo
+CREATE TABLE export_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL, -- history, panel
+    format TEXT NOT NULL, -- csv, csv.gz, xlsx
+    filters TEXT, -- JSON com q, start_date, end_date
+    unit_id INTEGER NOT NULL,
+    requested_by INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING, RUNNING, DONE, FAILED
+    total_rows INTEGER,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    file_name TEXT,
+    error TEXT,
+    locked_by TEXT,
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (requested_by) REFERENCES users (id),
+    FOREIGN KEY (unit_id) REFERENCES settings_companies (id)
+);
+
+CREATE INDEX idx_export_jobs_status ON export_jobs (status, id);
+CREATE INDEX idx_export_jobs_user ON export_jobs (requested_by, id);
+
+-- Busca textual (FTS5) de encomendas e comprovantes; rowid = items.id, sincronizada por triggers.
+-- unit_key ('u<unit_id>') deixa o filtro por unidade dentro do próprio MATCH
+CREATE VIRTUAL TABLE items_fts USING fts5(
+    internal_id, tracking_code, sender, recipient, received_by_name, unit_key,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+);
+
+CREATE TRIGGER trg_items_fts_insert AFTER INSERT ON items
+BEGIN
+    INSERT INTO items_fts (rowid, internal_id, tracking_code, sender, recipient, received_by_name, unit_key)
+    VALUES (NEW.id, NEW.internal_id, NEW.tracking_code, NEW.sender,
+            COALESCE(NEW.recipient_email, '') || ' ' || COALESCE(NEW.recipient_name_manual, ''),
+            NULL, 'u' || COALESCE(NEW.unit_id, 0));
+END;
+
+CREATE TRIGGER trg_items_fts_update
+AFTER UPDATE OF internal_id, tracking_code, sender, recipient_email, recipient_name_manual, unit_id ON items
+BEGIN
+    UPDATE items_fts SET internal_id = NEW.internal_id, tracking_code = NEW.tracking_code, sender = NEW.sender,
+        recipient = COALESCE(NEW.recipient_email, '') || ' ' || COALESCE(NEW.recipient_name_manual, ''),
+        unit_key = 'u' || COALESCE(NEW.unit_id, 0)
+    WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER trg_items_fts_delete AFTER DELETE ON items
+BEGIN
+    DELETE FROM items_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER trg_proofs_fts_insert AFTER INSERT ON proofs
+BEGIN
+    UPDATE items_fts SET received_by_name = NEW.received_by_name WHERE rowid = NEW.item_id;
+END;
+
+CREATE TRIGGER trg_proofs_fts_update AFTER UPDATE OF received_by_name ON proofs
+BEGIN
+    UPDATE items_fts SET received_by_name = NEW.received_by_name WHERE rowid = NEW.item_id;
+END;
+
+CREATE TRIGGER trg_proofs_fts_delete AFTER DELETE ON proofs
+BEGIN
+    UPDATE items_fts SET received_by_name = NULL WHERE rowid = OLD.item_id;
+END;
+
+-- Arquivo (camada fria): itens finalizados há mais de ARCHIVE_AFTER_DAYS, movidos por `flask archive-items`.
+-- Mesmas colunas e ids das tabelas quentes; histórico, comprovantes e exportações leem as duas camadas.
+-- Os contadores por status continuam contando os arquivados.
+CREATE TABLE items_archive (
+    id INTEGER PRIMARY KEY, -- mesmo id de items (AUTOINCREMENT lá: nunca é reutilizado)
+    internal_id TEXT NOT NULL,
+    tracking_code TEXT,
+    type TEXT NOT NULL,
+    sender TEXT,
+    recipient_email TEXT,
+    recipient_name_manual TEXT,
+    recipient_floor TEXT,
+    location TEXT,
+    status TEXT NOT NULL,
+    observation TEXT,
+    unit_id INTEGER,
+    last_notified_at TIMESTAMP,
+    next_reminder_at TIMESTAMP,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE movements_archive (
+    id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    unit_id INTEGER,
+    timestamp TIMESTAMP
+);
+
+CREATE TABLE proofs_archive (
+    item_id INTEGER PRIMARY KEY,
+    signature_data TEXT NOT NULL,
+    delivered_by INTEGER NOT NULL,
+    received_by_name TEXT NOT NULL,
+    delivered_at TIMESTAMP,
+    occurrence_note TEXT
+);
+
+CREATE INDEX idx_items_archive_internal ON items_archive (internal_id, unit_id);
+CREATE INDEX idx_items_archive_unit_created ON items_archive (unit_id, created_at);
+CREATE INDEX idx_items_archive_recipient_email ON items_archive (recipient_email, unit_id);
+CREATE INDEX idx_items_archive_recipient_manual ON items_archive (recipient_name_manual, unit_id);
+CREATE INDEX idx_movements_archive_item ON movements_archive (item_id, timestamp);
+CREATE INDEX idx_proofs_archive_delivered_at ON proofs_archive (delivered_at);
+
+CREATE TRIGGER trg_items_archive_count_insert AFTER INSERT ON items_archive
+BEGIN
+    INSERT INTO item_status_counts (unit_id, status, count) VALUES (COALESCE(NEW.unit_id, 0), NEW.status, 1)
+    ON CONFLICT (unit_id, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER trg_items_archive_count_delete AFTER DELETE ON items_archive
+BEGIN
+    UPDATE item_status_counts SET count = count - 1
+    WHERE unit_id = COALESCE(OLD.unit_id, 0) AND status = OLD.status;
+END;
+
+-- Versões de cache entre workers: quem altera dados de referência (configurações, usuários)
+-- incrementa a linha; cada worker compara com a versão do seu cache em memória
+CREATE TABLE cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Versão dos dados de cada unidade: toda escrita em items, movements, proofs e nas
+-- configurações da unidade incrementa a linha (ETag/304 das páginas e /api/unit/<id>/version)
+CREATE TABLE unit_versions (
+    unit_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER trg_items_version_insert AFTER INSERT ON items
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+-- Só colunas que as páginas mostram: last_notified_at/next_reminder_at (lembretes) não invalidam ETag nem cache
+CREATE TRIGGER trg_items_version_update AFTER UPDATE OF
+    internal_id, tracking_code, type, sender, recipient_email, recipient_name_manual, recipient_floor,
+    location, status, observation, unit_id, created_at, updated_at
+ON items
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    -- Item mudou de unidade: a de origem também muda
+    INSERT INTO unit_versions (unit_id, version)
+    SELECT COALESCE(OLD.unit_id, 0), 1 WHERE COALESCE(OLD.unit_id, 0) != COALESCE(NEW.unit_id, 0)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_items_version_delete AFTER DELETE ON items
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_movements_version_insert AFTER INSERT ON movements
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_proofs_version_insert AFTER INSERT ON proofs
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE((SELECT unit_id FROM items WHERE id = NEW.item_id), 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_proofs_version_update AFTER UPDATE ON proofs
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE((SELECT unit_id FROM items WHERE id = NEW.item_id), 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_locations_version_insert AFTER INSERT ON settings_locations
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_locations_version_update AFTER UPDATE ON settings_locations
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(NEW.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_locations_version_delete AFTER DELETE ON settings_locations
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (COALESCE(OLD.unit_id, 0), 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_companies_version_update AFTER UPDATE ON settings_companies
+BEGIN
+    INSERT INTO unit_versions (unit_id, version) VALUES (NEW.id, 1)
+    ON CONFLICT (unit_id) DO UPDATE SET version = version + 1;
+END;
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+import argparse
+
+# Mede a busca de destinatários fora da suíte de testes (tempo de relógio varia com a máquina)
+
+# Adiciona o diretório raiz ao path para importar módulos locais
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.recipients import RecipientIndex
+
+QUERIES = ('p', 'sobrenome42 pessoa', 'user1999@teste.com')
+
+def run_bench(size=2000, rounds=100, limit=10):
+    """Monta um diretório sintético e imprime o tempo médio por busca"""
+    entries = [
+        {'kind': 'user', 'value': f'user{n}@teste.com', 'name': f'Pessoa {n} Sobrenome{n % 97}',
+         'email': f'user{n}@teste.com', 'label': ''}
+        for n in range(size)
+    ]
+    start = time.perf_counter()
+    index = RecipientIndex(entries)
+    print(f"Índice com {size} destinatários montado em {(time.perf_counter() - start) * 1000:.2f} ms")
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = index.search(query, limit)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{query!r}: {elapsed * 1000:.3f} ms por busca ({len(results)} resultado(s))")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da busca de destinatários.")
+    parser.add_argument('--size', type=int, default=2000, help="Quantidade de destinatários sintéticos.")
+    parser.add_argument('--rounds', type=int, default=100, help="Repetições por consulta.")
+    args = parser.parse_args()
+    run_bench(args.size, args.rounds)
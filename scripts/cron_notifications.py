@@ -1,13 +1,28 @@
 import os
 import sys
 import sqlite3
+import argparse
 from datetime import datetime, timedelta
 
+# Mantido para instalações ainda no crontab; o caminho recomendado é `flask scheduler run`
+
 # Adiciona o diretório raiz ao path para importar módulos locais
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
-from utils.notifications import send_collection_alert
+from utils.notifications import send_collection_alert, send_collection_alerts
+from utils.reminders import send_reminder_digests
+from utils.db import get_db
+
+def run_digest(interval_days=3):
+    """Modo digest: um lembrete consolidado por destinatário, em poucas queries set-based"""
+    app = create_app()
+    with app.app_context():
+        print(f"[{datetime.now()}] Iniciando lembretes consolidados (intervalo: {interval_days} dias)...")
+        stats = send_reminder_digests(get_db(), interval_days)
+        print(f"{stats['items']} item(ns) em {stats['recipients']} lembrete(s) enfileirado(s). "
+              f"Sem e-mail: {stats['without_email']}.")
+        print(f"[{datetime.now()}] Cron finalizado.")
 
 def run_cron():
     app = create_app()
@@ -50,9 +65,8 @@ def run_cron():
                 success = False
                 if group:
                     members = cursor.execute("SELECT email FROM email_group_members WHERE group_id = ?", (group['id'],)).fetchall()
-                    for member in members:
-                        if send_collection_alert(member['email'], item['internal_id'], item['type']):
-                            success = True
+                    results = send_collection_alerts([m['email'] for m in members], item['internal_id'], item['type'])
+                    success = any(results.values())
                 else:
                     if send_collection_alert(rec_email, item['internal_id'], item['type']):
                         success = True
@@ -68,4 +82,12 @@ def run_cron():
         print(f"[{datetime.now()}] Cron finalizado.")
 
 if __name__ == "__main__":
-    run_cron()
+    parser = argparse.ArgumentParser(description="Reenvia alertas de itens aguardando retirada.")
+    parser.add_argument('--digest', action='store_true', help="Um e-mail por destinatário com todos os itens pendentes.")
+    parser.add_argument('--days', type=int, default=3, help="Intervalo mínimo entre lembretes (modo digest).")
+    args = parser.parse_args()
+
+    if args.digest:
+        run_digest(args.days)
+    else:
+        run_cron()
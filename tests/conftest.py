@@ -1,21 +1,31 @@
 import os
+import shutil
 import pytest
 import tempfile
-from app import create_app
-from utils.db import get_db
+from app import create_app, mail
+from utils.db import get_db, close_pool
+from utils.recipients import invalidate_recipient_index
+from utils.reference_data import invalidate_reference_data
 
 @pytest.fixture
 def app():
     # Cria um arquivo temporário para o banco de dados de teste
     db_fd, db_path = tempfile.mkstemp()
+    signatures_dir = tempfile.mkdtemp()
+    exports_dir = tempfile.mkdtemp()
     
     app = create_app()
     app.config.update({
         'TESTING': True,
         'DATABASE': db_path,
         'SECRET_KEY': 'test_secret',
-        'MAIL_SUPPRESS_SEND': True  # Não envia e-mails reais nos testes
+        'MAIL_SUPPRESS_SEND': True,  # Não envia e-mails reais nos testes
+        'MAIL_DEFAULT_SENDER': 'aeropost@teste.com',
+        'SIGNATURE_STORE_DIR': signatures_dir,
+        'EXPORT_SPOOL_DIR': exports_dir
     })
+    # O Flask-Mail lê MAIL_SUPPRESS_SEND/TESTING no init_app: reaplica com a config de teste
+    mail.init_app(app)
 
     # Inicializa o banco de dados de teste usando o schema.sql
     with app.app_context():
@@ -27,8 +37,17 @@ def app():
     yield app
 
     # Limpeza após os testes
+    close_pool(app)
+    invalidate_recipient_index()
+    invalidate_reference_data()
     os.close(db_fd)
     os.unlink(db_path)
+    shutil.rmtree(signatures_dir, ignore_errors=True)
+    shutil.rmtree(exports_dir, ignore_errors=True)
+    # Arquivos auxiliares do modo WAL
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
 
 @pytest.fixture
 def client(app):
@@ -0,0 +1,73 @@
+import pytest
+from utils.db import get_db
+from werkzeug.security import generate_password_hash
+
+JSON = {'Accept': 'application/json'}
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Json')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_json', generate_password_hash('j123'), 'FACILITIES_PORTARIA', 'Fac Json', 1)
+        )
+        db.execute(
+            "INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('dest@teste.com', generate_password_hash('d123'), 'USER', 'Destinatario Json', 1)
+        )
+        db.commit()
+    auth.login('fac_json', 'j123')
+    client.get('/facilities')
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'JSON-1', 'sender': 'Loja'})
+    client.get('/portaria')
+    return client
+
+def _item_id(app):
+    with app.app_context():
+        return get_db().execute("SELECT id FROM items WHERE tracking_code = 'JSON-1'").fetchone()[0]
+
+def test_actions_return_row_and_counters(logged_in_facilities, app):
+    client = logged_in_facilities
+    item_id = _item_id(app)
+
+    data = client.post(f'/facilities/collect/{item_id}', headers=JSON).get_json()
+    assert data['ok'] and data['item_id'] == item_id
+    assert (data['row']['list'], data['row']['position']) == ('triagem', 'bottom')
+    assert f'data-item-id="{item_id}"' in data['row']['html']
+    assert data['stats'] == {'in_portaria': 0, 'in_facilities': 1, 'ready': 0}
+    assert data['messages'] == [{'category': 'success', 'text': 'Item coletado com sucesso.'}]
+
+    data = client.post(f'/facilities/allocate/{item_id}', headers=JSON,
+                       data={'location': 'Sala 1', 'recipient_name_manual': 'Fulano'}).get_json()
+    assert data['row']['list'] == 'entrega' and 'Sala 1' in data['row']['html']
+    assert data['stats']['ready'] == 1
+
+    data = client.post(f'/facilities/update_location/{item_id}', headers=JSON, data={'location': 'Sala 2'}).get_json()
+    assert 'Sala 2' in data['row']['html']
+
+    data = client.post(f'/facilities/resend_alert/{item_id}', headers=JSON).get_json()
+    assert data['messages'][0]['category'] == 'warning' and data['row']['list'] == 'entrega'
+
+    # Nenhuma mensagem fica para a próxima página
+    assert b'alert-success' not in client.get('/facilities').data
+
+def test_delivery_json_and_errors(logged_in_facilities, app):
+    client = logged_in_facilities
+    item_id = _item_id(app)
+    client.post(f'/facilities/collect/{item_id}')
+    client.post(f'/facilities/allocate/{item_id}', data={'location': 'Sala 1', 'recipient_email': 'dest@teste.com'})
+
+    response = client.post(f'/delivery/confirm_password/{item_id}', headers=JSON,
+                           data={'email': 'dest@teste.com', 'password': 'errada'})
+    assert response.status_code == 400 and not response.get_json()['ok']
+
+    data = client.post(f'/delivery/confirm_password/{item_id}', headers=JSON,
+                       data={'email': 'dest@teste.com', 'password': 'd123'}).get_json()
+    assert data['ok'] and data['row'] == {'list': None}
+    assert data['stats'] == {'in_portaria': 0, 'in_facilities': 0, 'ready': 0}
+
+def test_form_posts_still_redirect(logged_in_facilities, app):
+    response = logged_in_facilities.post(f'/facilities/collect/{_item_id(app)}')
+    assert response.status_code == 302 and '/facilities?tab=portaria' in response.headers['Location']
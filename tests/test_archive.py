@@ -0,0 +1,139 @@
+import re
+import pytest
+from datetime import datetime
+from utils.db import get_db
+from utils.archive import archive_items, archive_stats
+from utils.counters import get_status_counts, verify_counters
+from werkzeug.security import generate_password_hash
+
+NOW = datetime(2031, 6, 1, 12, 0, 0)
+
+@pytest.fixture
+def seeded(app, client, auth):
+    app.config['PAGE_SIZE'] = 3
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Arquivo')")
+        db.execute(
+            "INSERT INTO users (id, username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (1, 'arq_admin', generate_password_hash('a123'), 'ADMIN', 'Admin Arquivo', 1)
+        )
+        # AP-ARQ-0..3 finalizados em 2030 (antigos), 4..5 finalizados agora, 6 em andamento desde 2029
+        for n in range(7):
+            moment = f'2030-01-0{1 + n} 10:00:00' if n < 4 else ('2031-05-30 10:00:00' if n < 6 else '2029-01-01 10:00:00')
+            status = 'RECEBIDO_PORTARIA' if n == 6 else ('EXTRAVIADO' if n == 3 else 'ENTREGUE')
+            cur = db.execute(
+                "INSERT INTO items (internal_id, tracking_code, type, sender, status, unit_id, created_at, updated_at) "
+                "VALUES (?, ?, 'Caixa', 'Loja Arquivo', ?, 1, ?, ?)", (f'AP-ARQ-{n}', f'TRKARQ{n}', status, moment, moment)
+            )
+            db.execute("INSERT INTO movements (item_id, user_id, action, unit_id, timestamp) VALUES (?, 1, 'REGISTER_PORTARIA', 1, ?)",
+                       (cur.lastrowid, moment))
+            if status != 'RECEBIDO_PORTARIA':
+                db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name, delivered_at) "
+                           "VALUES (?, 'DATA:AUTHENTICATED_BY_PASSWORD', 1, ?, ?)", (cur.lastrowid, f'Recebedor {n}', moment))
+        db.commit()
+    auth.login('arq_admin', 'a123')
+    return app
+
+def _archive(app, batch_size=2):
+    with app.app_context():
+        db = get_db()
+        before = get_status_counts(db, 1)
+        archived = archive_items(db, 365, batch_size, now=NOW)
+        assert get_status_counts(db, 1) == before
+        assert verify_counters(db) == []
+        return archived, archive_stats(db)
+
+def _item_id(app, internal_id):
+    with app.app_context():
+        db = get_db()
+        return db.execute(
+            "SELECT id FROM items WHERE internal_id = ? UNION ALL SELECT id FROM items_archive WHERE internal_id = ?",
+            (internal_id, internal_id)
+        ).fetchone()[0]
+
+def test_archive_moves_only_old_finalized_items(seeded):
+    assert _archive(seeded) == (4, {'hot': 3, 'archived': 4})
+    with seeded.app_context():
+        db = get_db()
+        assert [r[0] for r in db.execute("SELECT internal_id FROM items ORDER BY id")] == ['AP-ARQ-4', 'AP-ARQ-5', 'AP-ARQ-6']
+        assert db.execute("SELECT COUNT(*) FROM movements_archive").fetchone()[0] == 4
+        assert db.execute("SELECT COUNT(*) FROM proofs_archive").fetchone()[0] == 4
+        assert db.execute("SELECT COUNT(*) FROM proofs").fetchone()[0] == 2
+    # Rodar de novo não encontra nada
+    assert _archive(seeded)[0] == 0
+
+def test_history_reads_both_tiers(seeded, client):
+    _archive(seeded)
+    seen, cursor = [], None
+    while True:
+        data = client.get('/history/more?q=' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen += re.findall(r'data-internal-id="(AP-ARQ-\d)"', data['html'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    # Mesma ordem de antes do arquivamento: delivered_at desc, id desc
+    assert seen == ['AP-ARQ-5', 'AP-ARQ-4', 'AP-ARQ-3', 'AP-ARQ-2', 'AP-ARQ-1', 'AP-ARQ-0']
+
+    # A busca textual e o filtro de data continuam achando os arquivados
+    assert 'AP-ARQ-1' in client.get('/history?q=TRKARQ1').data.decode()
+    page = client.get('/history?start_date=2030-01-02&end_date=2030-01-02').data.decode()
+    assert 'data-internal-id="AP-ARQ-1"' in page and 'AP-ARQ-4' not in page
+
+def test_recipient_home_lists_archived_items(seeded, client, auth):
+    with seeded.app_context():
+        db = get_db()
+        db.execute("UPDATE items SET recipient_email = 'morador@teste.com' WHERE internal_id IN ('AP-ARQ-1', 'AP-ARQ-5')")
+        db.execute(
+            "INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('morador@teste.com', generate_password_hash('m123'), 'USER', 'Morador', 1)
+        )
+        db.commit()
+    _archive(seeded)
+    auth.logout()
+    auth.login('morador@teste.com', 'm123')
+    # AP-ARQ-1 está no arquivo, AP-ARQ-5 na tabela ativa: os dois aparecem, mais novo primeiro
+    # (AP-ARQ-6, sem destinatário, vem depois na lista de não identificados)
+    for url in ('/home', '/'):
+        page = client.get(url).data.decode()
+        assert re.findall(r'AP-ARQ-\d', page) == ['AP-ARQ-5', 'AP-ARQ-1', 'AP-ARQ-6']
+
+def test_global_search_finds_archived_items(seeded, client):
+    _archive(seeded)
+    page = client.get('/facilities/search?q=TRKARQ1').data.decode()
+    assert 'AP-ARQ-1' in page
+    # Só o filtro de status também olha o arquivo, mais recentes primeiro
+    page = client.get('/facilities/search?status=ENTREGUE').data.decode()
+    found = re.findall(r'AP-ARQ-\d', page)
+    assert list(dict.fromkeys(found)) == ['AP-ARQ-5', 'AP-ARQ-4', 'AP-ARQ-2', 'AP-ARQ-1', 'AP-ARQ-0']
+
+def test_archived_item_details_and_export(seeded, client):
+    _archive(seeded)
+    archived_id = _item_id(seeded, 'AP-ARQ-0')
+
+    history = client.get(f'/api/item/history/{archived_id}').get_json()
+    assert history['internal_id'] == 'AP-ARQ-0'
+    assert [h['action'] for h in history['history']] == ['📦 Recebido na Portaria']
+
+    # Entrega por senha: comprovante encontrado no arquivo, sem imagem
+    assert client.get(f'/history/signature/{archived_id}').status_code == 204
+    assert client.get('/facilities/check-item-status/AP-ARQ-0').get_json() == {'status': 'ENTREGUE'}
+
+    csv = client.get('/history/export?stream=1').data.decode('utf-8')
+    ids = [line.split(';')[0] for line in csv.strip().splitlines()[1:]]
+    assert sorted(ids[:2]) == ['AP-ARQ-4', 'AP-ARQ-5'] and ids[2:] == ['AP-ARQ-2', 'AP-ARQ-1', 'AP-ARQ-0']
+
+def test_recovery_restores_archived_item(seeded, client):
+    _archive(seeded)
+    item_id = _item_id(seeded, 'AP-ARQ-3')
+    client.post('/facilities/register-occurrence',
+                data={'internal_id': 'AP-ARQ-3', 'action': 'RECUPERADO', 'note': 'achado', 'password': 'a123'})
+    with seeded.app_context():
+        db = get_db()
+        item = db.execute("SELECT id, status FROM items WHERE internal_id = 'AP-ARQ-3'").fetchone()
+        assert (item['id'], item['status']) == (item_id, 'EM_FACILITIES')
+        assert db.execute("SELECT COUNT(*) FROM items_archive WHERE id = ?", (item_id,)).fetchone()[0] == 0
+        assert db.execute("SELECT COUNT(*) FROM movements WHERE item_id = ?", (item_id,)).fetchone()[0] == 2
+        assert verify_counters(db) == []
+        # Continua no índice de busca depois de voltar
+        assert db.execute("SELECT COUNT(*) FROM items_fts WHERE rowid = ?", (item_id,)).fetchone()[0] == 1
@@ -0,0 +1,121 @@
+import base64
+import pytest
+from utils.db import get_db
+from utils import signature_vector
+from werkzeug.security import generate_password_hash
+
+SIGNATURE = base64.b64encode(signature_vector.encode(300, 200, [[(10, 10), (30, 25)]])).decode()
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Lote')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_lote', generate_password_hash('l123'), 'FACILITIES_PORTARIA', 'Fac Lote', 1)
+        )
+        db.execute(
+            "INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('dest@lote.com', generate_password_hash('d123'), 'USER', 'Destinatario Lote', 1)
+        )
+        db.commit()
+    auth.login('fac_lote', 'l123')
+    for n in range(3):
+        client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': f'LOTE-{n}', 'sender': 'Loja'})
+    # Consome as mensagens do cadastro
+    client.get('/portaria')
+    return client
+
+def _ids(app):
+    with app.app_context():
+        return [r[0] for r in get_db().execute("SELECT id FROM items WHERE tracking_code LIKE 'LOTE-%' ORDER BY id")]
+
+def _statuses(app):
+    with app.app_context():
+        return [r[0] for r in get_db().execute("SELECT status FROM items WHERE tracking_code LIKE 'LOTE-%' ORDER BY id")]
+
+def test_bulk_collect_and_allocate(logged_in_facilities, app):
+    client = logged_in_facilities
+    ids = _ids(app)
+
+    response = client.post('/facilities/bulk/collect', data={'item_ids': ids})
+    assert response.status_code == 302 and 'tab=portaria' in response.headers['Location']
+    assert _statuses(app) == ['EM_FACILITIES'] * 3
+
+    client.post('/facilities/bulk/allocate', data={
+        'item_ids': ids[:2], 'location': 'Sala Lote', 'recipient_email': 'dest@lote.com'
+    })
+    assert _statuses(app) == ['DISPONIVEL_PARA_RETIRADA'] * 2 + ['EM_FACILITIES']
+    with app.app_context():
+        db = get_db()
+        # Um único aviso listando os dois itens
+        outbox = db.execute("SELECT recipient, body FROM notification_outbox").fetchall()
+        assert len(outbox) == 1 and outbox[0]['recipient'] == 'dest@lote.com'
+        assert db.execute("SELECT COUNT(*) FROM items WHERE last_notified_at IS NOT NULL").fetchone()[0] == 2
+        actions = [r[0] for r in db.execute("SELECT action FROM movements WHERE item_id = ? ORDER BY id", (ids[0],))]
+        assert actions[1] == 'COLLECT_FROM_PORTARIA' and actions[2].startswith('ALLOCATED: Sala Lote')
+
+def test_bulk_collect_ignores_items_in_other_states(logged_in_facilities, app):
+    client = logged_in_facilities
+    ids = _ids(app)
+    client.post(f'/facilities/collect/{ids[0]}')
+    client.post('/facilities/bulk/collect', data={'item_ids': ids})
+    with app.app_context():
+        # O item já coletado não ganha uma segunda coleta
+        collects = get_db().execute(
+            "SELECT COUNT(*) FROM movements WHERE item_id = ? AND action = 'COLLECT_FROM_PORTARIA'", (ids[0],)
+        ).fetchone()[0]
+    assert collects == 1 and _statuses(app) == ['EM_FACILITIES'] * 3
+
+def test_bulk_delivery_same_recipient(logged_in_facilities, app):
+    client = logged_in_facilities
+    ids = _ids(app)
+    client.post('/facilities/bulk/collect', data={'item_ids': ids})
+    client.post('/facilities/bulk/allocate', data={'item_ids': ids[:2], 'location': 'Sala 1', 'recipient_email': 'dest@lote.com'})
+    client.post('/facilities/bulk/allocate', data={'item_ids': ids[2:], 'location': 'Sala 2', 'recipient_name_manual': 'Outra Pessoa'})
+
+    # Destinatários diferentes não entram na mesma assinatura
+    response = client.get('/delivery/bulk', query_string={'item_ids': ids})
+    assert response.status_code == 302
+    assert 'mesmo destinatário' in client.get('/facilities').data.decode()
+
+    page = client.get('/delivery/bulk', query_string={'item_ids': ids[:2]}).data.decode()
+    assert '2 itens' in page and '/delivery/bulk/confirm' in page
+
+    client.post('/delivery/bulk/confirm', data={
+        'item_ids': ids[:2], 'received_by_name': 'Destinatario Lote',
+        'signature_format': 'vector', 'signature_vector': SIGNATURE,
+    })
+    assert _statuses(app) == ['ENTREGUE'] * 2 + ['DISPONIVEL_PARA_RETIRADA']
+    with app.app_context():
+        proofs = get_db().execute("SELECT signature_data FROM proofs ORDER BY item_id").fetchall()
+    assert len(proofs) == 2 and proofs[0][0] == proofs[1][0]
+    assert signature_vector.is_vector(proofs[0][0])
+
+def test_bulk_actions_return_rows_and_counters(logged_in_facilities, app):
+    client = logged_in_facilities
+    ids = _ids(app)
+    json = {'Accept': 'application/json'}
+
+    data = client.post('/facilities/bulk/collect', headers=json, data={'item_ids': ids[:2]}).get_json()
+    assert data['ok'] and data['item_ids'] == ids[:2]
+    assert [(row['item_id'], row['list']) for row in data['rows']] == [(ids[0], 'triagem'), (ids[1], 'triagem')]
+    assert all(f'data-item-id="{row["item_id"]}"' in row['html'] for row in data['rows'])
+    assert data['stats'] == {'in_portaria': 1, 'in_facilities': 2, 'ready': 0}
+    assert data['messages'] == [{'category': 'success', 'text': '2 item(ns) coletado(s) com sucesso.'}]
+
+    data = client.post('/facilities/bulk/allocate', headers=json,
+                       data={'item_ids': ids[:2], 'location': 'Sala 1', 'recipient_name_manual': 'Fulano'}).get_json()
+    assert {row['list'] for row in data['rows']} == {'entrega'} and data['stats']['ready'] == 2
+
+    data = client.post('/delivery/bulk/confirm', headers=json, data={
+        'item_ids': ids[:2], 'received_by_name': 'Fulano',
+        'signature_format': 'vector', 'signature_vector': SIGNATURE,
+    }).get_json()
+    assert [row['list'] for row in data['rows']] == [None, None]
+    assert data['stats'] == {'in_portaria': 1, 'in_facilities': 0, 'ready': 0}
+
+    # Nada a fazer: aviso, sem linhas
+    data = client.post('/facilities/bulk/collect', headers=json, data={'item_ids': ids[:2]}).get_json()
+    assert data['ok'] and data['rows'] == [] and data['messages'][0]['category'] == 'warning'
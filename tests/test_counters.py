@@ -0,0 +1,68 @@
+import pytest
+from utils.db import get_db
+from utils.counters import get_status_counts, verify_counters
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_cnt', generate_password_hash('f123'), 'FACILITIES_PORTARIA', 'Fac Cnt', 1)
+        )
+        db.commit()
+    auth.login('fac_cnt', 'f123')
+    return client
+
+def test_counters_follow_item_lifecycle(logged_in_facilities, app):
+    client = logged_in_facilities
+    for n in range(3):
+        client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': f'CNT-{n}', 'sender': 'Loja'})
+
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-OTHER', 'Caixa', 'RECEBIDO_PORTARIA', 2)")
+        db.commit()
+        item_id = db.execute("SELECT id FROM items WHERE tracking_code = 'CNT-0'").fetchone()[0]
+        assert get_status_counts(db, 1) == {'RECEBIDO_PORTARIA': 3}
+
+    client.post(f'/facilities/collect/{item_id}')
+    client.post(f'/facilities/allocate/{item_id}', data={'location': 'Sala', 'recipient_name_manual': 'Fulano'})
+
+    response = client.get('/api/counters')
+    assert response.json['stats'] == {'in_portaria': 2, 'in_facilities': 0, 'ready': 1}
+
+    with app.app_context():
+        db = get_db()
+        db.execute("DELETE FROM items WHERE internal_id = 'AP-OTHER'")
+        db.commit()
+        assert get_status_counts(db, 2) == {'RECEBIDO_PORTARIA': 0}
+        assert verify_counters(db) == []
+
+def test_dashboard_cards_use_counters(logged_in_facilities, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE item_status_counts SET count = 0")
+        db.execute("INSERT INTO item_status_counts (unit_id, status, count) VALUES (1, 'EM_FACILITIES', 42)")
+        db.commit()
+    response = logged_in_facilities.get('/facilities')
+    assert b'<h3>42</h3>' in response.data
+
+def test_verify_and_rebuild_commands(app, runner):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-CNT-1', 'Caixa', 'ENTREGUE', 1)")
+        db.execute("UPDATE item_status_counts SET count = 7")
+        db.commit()
+
+    result = runner.invoke(args=['counters-verify'])
+    assert result.exit_code == 1
+    assert 'contador=7, real=1' in result.output
+
+    assert runner.invoke(args=['counters-rebuild']).exit_code == 0
+    result = runner.invoke(args=['counters-verify'])
+    assert result.exit_code == 0
+    assert 'consistentes' in result.output
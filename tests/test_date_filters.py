@@ -0,0 +1,106 @@
+import pytest
+from datetime import date, datetime, timedelta
+from werkzeug.datastructures import MultiDict
+from utils.db import get_db
+from utils.exports import history_filters
+from utils.timezones import get_zone, day_range, day_start, local_today, unit_timezone
+from werkzeug.security import generate_password_hash
+
+# Horários nas bordas do dia (gravados em UTC, como o CURRENT_TIMESTAMP)
+MOMENTS = ['2030-01-09 23:59:59', '2030-01-10 00:00:00', '2030-01-10 02:59:59', '2030-01-10 03:00:00',
+           '2030-01-10 12:00:00', '2030-01-10 23:59:59', '2030-01-11 00:00:00', '2030-01-11 02:59:59',
+           '2030-01-12 08:30:00']
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade UTC')")
+        db.execute("INSERT INTO settings_companies (id, name, timezone) VALUES (2, 'Unidade SP', 'America/Sao_Paulo')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('port_tz', generate_password_hash('p123'), 'PORTARIA', 'Port Tz', 2)
+        )
+        for n, moment in enumerate(MOMENTS):
+            cur = db.execute(
+                "INSERT INTO items (internal_id, type, status, unit_id, created_at) VALUES (?, 'Caixa', 'ENTREGUE', 1, ?)",
+                (f'AP-TZ-{n}', moment)
+            )
+            db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name, delivered_at) "
+                       "VALUES (?, 'DATA:X', 1, 'Fulano', ?)", (cur.lastrowid, moment))
+        db.commit()
+    return app
+
+def _history_ids(db, sql, params):
+    query = "SELECT i.internal_id FROM items i JOIN proofs p ON p.item_id = i.id WHERE i.unit_id = ?"
+    return sorted(r[0] for r in db.execute(query + sql, [1] + params).fetchall())
+
+def test_day_range_follows_unit_timezone(app):
+    sao_paulo = get_zone('America/Sao_Paulo')
+    assert day_range(date(2030, 1, 10), sao_paulo) == ('2030-01-10 03:00:00', '2030-01-11 03:00:00')
+    assert day_range(date(2030, 1, 10), get_zone('UTC')) == ('2030-01-10 00:00:00', '2030-01-11 00:00:00')
+    assert local_today(sao_paulo, datetime(2030, 1, 10, 2, 0, tzinfo=get_zone('UTC'))) == date(2030, 1, 9)
+    with pytest.raises(ValueError):
+        get_zone('Marte/Olympus')
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('2030-01-10', '2030-01-10'), ('2030-01-10', None), (None, '2030-01-10'),
+    ('2030-01-09', '2030-01-11'), ('2030-01-11', '2030-01-12'), ('2030-01-13', None),
+])
+def test_history_ranges_match_previous_date_filter(seeded, start_date, end_date):
+    """Em UTC a faixa de timestamps devolve exatamente o que date(coluna) devolvia"""
+    with seeded.test_request_context():
+        db = get_db()
+        old_sql, old_params = '', []
+        if start_date:
+            old_sql += " AND date(p.delivered_at) >= ?"
+            old_params.append(start_date)
+        if end_date:
+            old_sql += " AND date(p.delivered_at) <= ?"
+            old_params.append(end_date)
+
+        args = MultiDict({k: v for k, v in (('start_date', start_date), ('end_date', end_date)) if v})
+        sql, params = history_filters(args, 'p.delivered_at', 1)
+        assert 'date(' not in sql
+        assert _history_ids(db, sql, params) == _history_ids(db, old_sql, old_params)
+
+def test_history_ranges_use_unit_timezone(seeded):
+    with seeded.test_request_context():
+        db = get_db()
+        db.execute("UPDATE items SET unit_id = 2")
+        db.commit()
+        sql, params = history_filters(MultiDict({'start_date': '2030-01-10', 'end_date': '2030-01-10'}), 'p.delivered_at', 2)
+        ids = sorted(r[0] for r in db.execute(
+            "SELECT i.internal_id FROM items i JOIN proofs p ON p.item_id = i.id WHERE i.unit_id = ?" + sql, [2] + params
+        ).fetchall())
+        # Dia 10 em São Paulo = 03:00 do dia 10 até 02:59:59 do dia 11 (UTC)
+        assert ids == ['AP-TZ-3', 'AP-TZ-4', 'AP-TZ-5', 'AP-TZ-6', 'AP-TZ-7']
+
+        # Data inválida é ignorada em vez de virar comparação de texto
+        assert history_filters(MultiDict({'start_date': '10/01/2030'}), 'p.delivered_at', 2) == ('', [])
+
+def test_portaria_today_uses_unit_day_and_index(seeded, client, auth):
+    with seeded.test_request_context():
+        db = get_db()
+        tz = unit_timezone(db, 2)
+        today_start = day_range(local_today(tz), tz)[0]
+        one_second_before = (datetime.fromisoformat(today_start) - timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+        db.execute("INSERT INTO items (internal_id, type, sender, status, unit_id, created_at) VALUES ('AP-HOJE', 'Caixa', 'Loja Hoje', 'RECEBIDO_PORTARIA', 2, ?)",
+                   (today_start,))
+        db.execute("INSERT INTO items (internal_id, type, sender, status, unit_id, created_at) VALUES ('AP-ONTEM', 'Caixa', 'Loja Ontem', 'RECEBIDO_PORTARIA', 2, ?)",
+                   (one_second_before,))
+        db.commit()
+
+        plan = ' '.join(r['detail'] for r in db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM items WHERE unit_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC",
+            (2, today_start, day_start(local_today(tz) + timedelta(days=1), tz))
+        ).fetchall())
+        assert 'created_at>? AND created_at<?' in plan
+
+    auth.login('port_tz', 'p123')
+    page = client.get('/portaria').data.decode()
+    today_table, pending_table = page.split('id="tablePendingPortaria"')
+    today_table = today_table.split('id="tableTodayPortaria"')[1]
+    # Um segundo antes da meia-noite local já é "dia anterior": fica só na lista de pendentes
+    assert 'Loja Hoje' in today_table and 'Loja Ontem' not in today_table
+    assert 'Loja Ontem' in pending_table and 'Loja Hoje' not in pending_table
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import pytest
+from utils.db import get_db, get_pool
+from utils.pool import ConnectionPool, PoolTimeoutError
+from werkzeug.security import generate_password_hash
+
+def _memory_pool(**kwargs):
+    return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+
+def test_connection_is_reused_between_requests(app):
+    """A mesma conexão física volta ao pool e é reutilizada no próximo request"""
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        second = get_db()
+    assert first is second
+
+    stats = get_pool(app).stats()
+    assert stats['checkouts'] == 3  # conftest + 2 contextos acima
+    assert stats['created'] == 1
+    assert stats['in_use'] == 0
+
+def test_uncommitted_work_is_rolled_back_on_release(app):
+    """Um request que não faz commit não pode deixar transação aberta para o próximo"""
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (name) VALUES ('Sem Commit')")
+        assert db.in_transaction
+    with app.app_context():
+        db = get_db()
+        assert not db.in_transaction
+        assert db.execute("SELECT id FROM settings_companies WHERE name = 'Sem Commit'").fetchone() is None
+
+def test_pool_disabled_opens_fresh_connections(app):
+    app.config['DB_POOL_ENABLED'] = False
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        second = get_db()
+    assert first is not second
+
+def test_pool_timeout_when_exhausted():
+    pool = _memory_pool(max_size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['timeouts'] == 1
+    pool.release(held)
+    pool.close()
+
+def test_recycle_after_n_uses():
+    pool = _memory_pool(max_size=1, recycle_uses=2)
+    first = pool.acquire()
+    pool.release(first)
+    again = pool.acquire()
+    assert again is first
+    pool.release(again)
+    recycled = pool.acquire()
+    assert recycled is not first
+    assert pool.stats()['recycled'] == 1
+    pool.release(recycled)
+    pool.close()
+
+def test_unhealthy_connection_is_replaced():
+    pool = ConnectionPool(
+        lambda: sqlite3.connect(':memory:', check_same_thread=False),
+        ping=lambda conn: conn.execute('SELECT 1') is not None,
+        max_size=1,
+    )
+    first = pool.acquire()
+    pool.release(first)
+    first.conn.close()
+    replacement = pool.acquire()
+    assert replacement is not first
+    assert pool.stats()['discarded'] == 1
+    pool.release(replacement)
+    pool.close()
+
+def test_worker_pool_stats_endpoint(client, auth, app):
+    """Cada worker expõe o próprio pool (só para admin)"""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name) VALUES (?, ?, ?, ?)",
+            ('pool_admin', generate_password_hash('p123'), 'ADMIN', 'Admin Pool')
+        )
+        db.commit()
+    auth.login('pool_admin', 'p123')
+    data = client.get('/api/db-pool').get_json()
+    assert data['enabled'] and data['pid'] == os.getpid()
+    assert data['in_use'] == 1 and data['checkouts'] >= 2
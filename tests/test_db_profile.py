@@ -0,0 +1,33 @@
+import pytest
+from utils.db import get_db, close_pool, sqlite_pragmas
+
+def test_concurrent_profile_is_applied(app):
+    """O perfil padrão coloca o banco em WAL com busy_timeout"""
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert db.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+def test_overrides_take_precedence(app):
+    close_pool(app)
+    app.config['SQLITE_PRAGMAS'] = 'busy_timeout=12000, synchronous=FULL'
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 12000
+        assert db.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+def test_invalid_profile_and_pragmas_are_rejected():
+    with pytest.raises(ValueError):
+        sqlite_pragmas('turbo')
+    with pytest.raises(ValueError):
+        sqlite_pragmas('concurrent', 'page_size=1; DROP TABLE users')
+    assert sqlite_pragmas('legacy') == {}
+
+def test_db_tune_reports_effective_settings(runner):
+    result = runner.invoke(args=['db-tune'])
+    assert result.exit_code == 0
+    assert 'Perfil: concurrent' in result.output
+    assert 'journal_mode   wal' in result.output
+    assert 'esperado' not in result.output
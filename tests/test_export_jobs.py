@@ -0,0 +1,111 @@
+import io
+import os
+import gzip
+import zipfile
+import pytest
+from utils.db import get_db
+from utils.export_jobs import ExportWorker, enqueue_export
+from werkzeug.security import generate_password_hash
+
+JSON = {'Accept': 'application/json'}
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        for username in ('fac_exp', 'fac_other'):
+            db.execute(
+                "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+                (username, generate_password_hash('f123'), 'FACILITIES', username, 1)
+            )
+        for n in range(7):
+            cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES (?, 'Caixa', 'ENTREGUE', 1)",
+                             (f'AP-EXP-{n:03}',))
+            db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name) VALUES (?, 'DATA:X', 1, ?)",
+                       (cur.lastrowid, f'Recebedor & <{n}>'))
+        db.commit()
+    auth.login('fac_exp', 'f123')
+    return client
+
+def _run_worker(app, **options):
+    with app.app_context():
+        worker = ExportWorker(app, **options)
+        worker.run(get_db(), once=True)
+        return worker.metrics
+
+def test_export_is_queued_and_downloaded(client, app, logged_in_facilities, monkeypatch):
+    from utils import export_jobs
+    monkeypatch.setattr(export_jobs, 'PROGRESS_EVERY', 2)
+
+    response = client.get('/history/export?q=AP-EXP&format=csv.gz', headers=JSON)
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert client.get(response.json['status_url']).json['status'] == 'PENDING'
+    assert client.get(f'/exports/{job_id}/download').status_code == 302
+
+    assert _run_worker(app)['done'] == 1
+    status = client.get(f'/exports/{job_id}').json
+    assert status['status'] == 'DONE'
+    assert (status['rows_written'], status['total_rows'], status['percent']) == (7, 7, 100)
+
+    download = client.get(status['download_url'])
+    assert 'relatorio_entregas.csv.gz' in download.headers['Content-Disposition']
+    body = gzip.decompress(download.data).decode('utf-8')
+    assert body.count('AP-EXP-') == 7
+
+    page = client.get('/exports')
+    assert f'/exports/{job_id}/download'.encode() in page.data
+
+def test_xlsx_export(client, app, logged_in_facilities):
+    client.get('/history/export?format=xlsx&end_date=2999-12-31')
+    _run_worker(app)
+    job_id = client.get('/exports/1').json['id']
+    data = client.get(f'/exports/{job_id}/download').data
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row>') == 8  # cabeçalho + 7
+    assert 'Recebedor &amp; &lt;3&gt;' in sheet
+
+def test_jobs_are_private_and_capped(client, auth, app, logged_in_facilities):
+    app.config['EXPORT_MAX_PER_USER'] = 2
+    assert client.get('/panel/export', headers=JSON).status_code == 202
+    assert client.get('/panel/export', headers=JSON).status_code == 202
+    response = client.get('/panel/export', headers=JSON)
+    assert response.status_code == 429
+    assert 'andamento' in response.json['error']
+
+    auth.logout()
+    auth.login('fac_other', 'f123')
+    assert client.get('/exports/1').status_code == 404
+
+def test_worker_respects_running_cap(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        first = enqueue_export(db, 'history', 'csv', 1, 1, {})
+        second = enqueue_export(db, 'history', 'csv', 1, 1, {})
+        # Outro worker já ocupa a única vaga
+        db.execute("UPDATE export_jobs SET status = 'RUNNING', locked_by = 'outro', locked_at = '2999-01-01 00:00:00' WHERE id = ?",
+                   (first,))
+        db.commit()
+        worker = ExportWorker(app, max_running=1)
+        assert worker.claim(db) is None
+
+        # Lease vencido: o job volta para a fila e este worker assume o mais antigo
+        db.execute("UPDATE export_jobs SET locked_at = '2000-01-01 00:00:00' WHERE id = ?", (first,))
+        db.commit()
+        assert worker.claim(db)['id'] == first
+        assert worker.metrics['reclaimed'] == 1
+        assert db.execute("SELECT status FROM export_jobs WHERE id = ?", (second,)).fetchone()[0] == 'PENDING'
+
+def test_expired_files_are_purged(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        enqueue_export(db, 'panel', 'csv', 1, 1, {})
+        _run_worker(app)
+        db.execute("UPDATE export_jobs SET finished_at = '2000-01-01 00:00:00'")
+        db.commit()
+        assert _run_worker(app)['purged'] == 1
+        assert db.execute("SELECT COUNT(*) FROM export_jobs").fetchone()[0] == 0
+        assert os.listdir(app.config['EXPORT_SPOOL_DIR']) == []
@@ -81,3 +81,37 @@ def test_full_facilities_workflow(logged_in_facilities, test_recipient, app):
         proof = db.execute("SELECT * FROM proofs WHERE item_id = ?", (item_id,)).fetchone()
         assert proof is not None
         assert proof['received_by_name'] == 'Destinatario Teste'
+
+def test_dashboard_renders_pickers_once(client, auth, app):
+    """O diretório de destinatários e os locais saem uma vez por página, não uma por item"""
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_pick', generate_password_hash('f123'), 'FACILITIES', 'Fac Pick', 1)
+        )
+        for n in range(20):
+            db.execute(
+                "INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+                (f'pessoa{n}@teste.com', 'x', 'USER', f'Pessoa {n}', 1)
+            )
+        db.execute("INSERT INTO settings_locations (name, unit_id) VALUES ('Armario Z9', 1)")
+        db.execute("INSERT INTO email_groups (name, unit_id) VALUES ('Grupo Financeiro', 1)")
+        for n in range(10):
+            status = 'EM_FACILITIES' if n % 2 else 'DISPONIVEL_PARA_RETIRADA'
+            db.execute(
+                "INSERT INTO items (internal_id, type, status, location, unit_id) VALUES (?, 'Caixa', ?, 'Sala', 1)",
+                (f'AP-PICK-{n}', status)
+            )
+        db.commit()
+    auth.login('fac_pick', 'f123')
+
+    html = client.get('/facilities').get_data(as_text=True)
+    # Destinatários vêm do typeahead (/api/recipients/search), não do HTML
+    assert 'pessoa7@teste.com' not in html
+    assert 'Grupo Financeiro' not in html
+    # Uma por item em triagem, mais a barra de alocação em lote
+    assert html.count('list="recipient-suggestions"') == 6
+    assert html.count('Armario Z9') == 2  # value + rótulo da única <option>
+    assert html.count('data-options="tpl-location-options"') == 11
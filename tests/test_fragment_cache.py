@@ -0,0 +1,82 @@
+import re
+import sys
+import pytest
+from utils.db import get_db
+from utils.fragment_cache import FragmentCache
+from werkzeug.security import generate_password_hash
+
+ITEMS_QUERY = re.compile(r'\bFROM items\b')
+
+@pytest.fixture
+def operators(app, client):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Fragmento')")
+        for username in ('frag_a', 'frag_b'):
+            db.execute(
+                "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+                (username, generate_password_hash('f123'), 'FACILITIES_PORTARIA', username, 1)
+            )
+        db.commit()
+    return [_login(app, username) for username in ('frag_a', 'frag_b')]
+
+def _login(app, username):
+    client = app.test_client()
+    client.post('/login', data={'login': username, 'password': 'f123'})
+    # Consome a mensagem de boas-vindas
+    client.get('/facilities')
+    return client
+
+def test_lru_respects_memory_cap():
+    page = lambda n: {'html': 'x' * 300 + str(n)}
+    # Cabem exatamente três páginas
+    cache = FragmentCache(max_bytes=3 * sys.getsizeof(page(0)['html']))
+    for n in range(3):
+        cache.get_or_render(n, lambda n=n: page(n))
+    assert cache.get_or_render(0, lambda: pytest.fail('deveria estar no cache'))['html'].endswith('0')
+    # A quarta entrada passa do limite: sai a menos usada recentemente (1, já que 0 acabou de ser lida)
+    cache.get_or_render(3, lambda: page(3))
+    assert cache.get_or_render(1, lambda: page('novo'))['html'].endswith('novo')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 5)
+    assert stats['evictions'] >= 1 and stats['bytes'] <= cache.max_bytes
+
+def test_second_operator_reuses_rendered_tables(app, operators):
+    first, second = operators
+    first.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'FRAG-1', 'sender': 'Loja'})
+    # O primeiro operador renderiza as tabelas da versão atual
+    assert first.get('/facilities').status_code == 200
+    with app.app_context():
+        internal_id = get_db().execute("SELECT internal_id FROM items WHERE tracking_code = 'FRAG-1'").fetchone()[0]
+
+    statements = []
+    with app.app_context():
+        conn = get_db()
+    conn.set_trace_callback(statements.append)
+    try:
+        page = second.get('/facilities').data.decode()
+    finally:
+        conn.set_trace_callback(None)
+    assert internal_id in page
+    assert [s for s in statements if ITEMS_QUERY.search(s)] == []
+
+    # Uma escrita muda a versão da unidade: a próxima leitura já traz o item novo
+    second.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'FRAG-2', 'sender': 'Loja'})
+    assert first.get('/facilities').data.decode().count('data-item-id=') > page.count('data-item-id=')
+
+def test_portaria_tables_and_stats(app, operators, auth):
+    first, second = operators
+    first.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'FRAG-3', 'sender': 'Loja Fragmento'})
+    assert 'Loja Fragmento' in first.get('/portaria').data.decode()
+    assert 'Loja Fragmento' in second.get('/portaria').data.decode()
+
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('frag_admin', generate_password_hash('f123'), 'ADMIN', 'Admin', 1)
+        )
+        db.commit()
+    stats = _login(app, 'frag_admin').get('/api/fragment-cache').get_json()
+    assert stats['enabled'] and stats['hits'] >= 2 and stats['entries'] >= 2
+    assert first.get('/api/fragment-cache').status_code == 302
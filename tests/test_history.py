@@ -0,0 +1,86 @@
+import base64
+import pytest
+from utils.db import get_db
+from werkzeug.security import generate_password_hash
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+SIGNATURE = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+
+@pytest.fixture
+def delivered_items(client, auth, app):
+    """Cria um usuário facilities, um item entregue com assinatura e outro via senha"""
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_hist', generate_password_hash('f123'), 'FACILITIES', 'Fac Hist', 1)
+        )
+        ids = {}
+        for internal_id, signature, unit_id in (('AP-SIG-001', SIGNATURE, 1),
+                                                ('AP-PWD-001', 'DATA:AUTHENTICATED_BY_PASSWORD', 1),
+                                                ('AP-OTHER-001', SIGNATURE, 2)):
+            cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES (?, 'Caixa', 'ENTREGUE', ?)",
+                             (internal_id, unit_id))
+            db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name) VALUES (?, ?, 1, 'Fulano')",
+                       (cur.lastrowid, signature))
+            ids[internal_id] = cur.lastrowid
+        db.commit()
+    auth.login('fac_hist', 'f123')
+    return ids
+
+def test_history_does_not_inline_signatures(client, delivered_items):
+    response = client.get('/history')
+    assert b'AP-SIG-001' in response.data
+    assert b'data:image/png' not in response.data
+    assert f'/history/signature/{delivered_items["AP-SIG-001"]}'.encode() in response.data
+
+def test_signature_endpoint_serves_png_with_etag(client, delivered_items):
+    url = f'/history/signature/{delivered_items["AP-SIG-001"]}'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == PNG_BYTES
+    assert 'immutable' in response.headers['Cache-Control']
+
+    etag = response.headers['ETag']
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+def test_signature_endpoint_password_and_unit_isolation(client, delivered_items):
+    assert client.get(f'/history/signature/{delivered_items["AP-PWD-001"]}').status_code == 204
+    assert client.get(f'/history/signature/{delivered_items["AP-OTHER-001"]}').status_code == 404
+
+def test_export_streams_filtered_csv(client, delivered_items):
+    response = client.get('/history/export?stream=1&q=AP-SIG', buffered=False)
+    assert response.is_streamed
+    body = b''.join(response.response).decode('utf-8')
+    assert body.startswith('ID Interno;')
+    assert 'AP-SIG-001' in body
+    assert 'AP-PWD-001' not in body and 'AP-OTHER-001' not in body
+
+    body = client.get('/history/export?stream=1&end_date=2000-01-01').data.decode('utf-8')
+    assert body.count('\n') == 1  # só o cabeçalho
+
+def test_export_gzip(client, delivered_items):
+    import gzip
+    response = client.get('/history/export?stream=1&gzip=1')
+    assert response.mimetype == 'application/gzip'
+    assert 'relatorio_entregas.csv.gz' in response.headers['Content-Disposition']
+    body = gzip.decompress(response.data).decode('utf-8')
+    assert 'AP-SIG-001' in body and 'AP-PWD-001' in body
+
+def test_panel_export_in_chunks(client, app, delivered_items, monkeypatch):
+    from utils import exports
+    with app.app_context():
+        db = get_db()
+        db.executemany("INSERT INTO items (internal_id, type, status, unit_id) VALUES (?, 'Caixa', 'EM_FACILITIES', 1)",
+                       [(f'AP-PNL-{n:03}',) for n in range(25)])
+        db.commit()
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_ROWS', 10)
+    chunks = list(client.get('/panel/export?stream=1', buffered=False).response)
+    body = b''.join(chunks).decode('utf-8')
+    assert body.count('AP-PNL-') == 25
+    assert len(chunks) == 3
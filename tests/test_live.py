@@ -0,0 +1,101 @@
+import json
+import queue
+import pytest
+from utils.db import get_db
+from utils.live import ChangeBus, event_kind, fetch_events, latest_event_id
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    app.config.update({'LIVE_POLL_INTERVAL': 0.05, 'LIVE_HEARTBEAT_SECONDS': 0.05, 'LIVE_STREAM_SECONDS': 0.2})
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Live')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_live', generate_password_hash('l123'), 'FACILITIES_PORTARIA', 'Fac Live', 1)
+        )
+        db.commit()
+    auth.login('fac_live', 'l123')
+    return client
+
+def _item_id(app, tracking_code):
+    with app.app_context():
+        return get_db().execute("SELECT id FROM items WHERE tracking_code = ?", (tracking_code,)).fetchone()[0]
+
+def _read_stream(response):
+    """Eventos (tipo, dados) do text/event-stream até o fim do stream"""
+    body = b''.join(response.response).decode('utf-8')
+    response.close()
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return body, events
+
+def test_event_kind():
+    assert event_kind('REGISTER_PORTARIA') == 'registered'
+    assert event_kind('LOCATION_CHANGED_TO: Sala 2') == 'allocated'
+    assert event_kind('DELIVERED') == 'delivered'
+    assert event_kind('NOTIFIED_RECIPIENT') is None
+
+def test_fetch_events_filters_by_unit(logged_in_facilities, app):
+    logged_in_facilities.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'LIVE-1', 'sender': 'Loja'})
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO movements (item_id, user_id, action, unit_id) VALUES (999, 1, 'REGISTER_PORTARIA', 2)")
+        db.commit()
+        events, last_id, more = fetch_events(db, 0, unit_id=1)
+        assert [(e['kind'], e['unit_id']) for e in events] == [('registered', 1)]
+        assert last_id == events[0]['id'] and not more
+        assert fetch_events(db, 0)[1] == latest_event_id(db)
+
+def test_bus_publishes_only_to_the_item_unit(logged_in_facilities, app):
+    bus = ChangeBus(app)
+    with app.app_context():
+        db = get_db()
+        mine, other = queue.Queue(), queue.Queue()
+        bus.last_id = latest_event_id(db)
+        bus._subscribers = {1: {mine}, 2: {other}}
+    logged_in_facilities.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'LIVE-2', 'sender': 'Loja'})
+    item_id = _item_id(app, 'LIVE-2')
+    logged_in_facilities.post(f'/facilities/collect/{item_id}')
+    with app.test_request_context():
+        assert bus.poll_once(get_db()) == 2
+        # Uma segunda leitura não repete nada
+        assert bus.poll_once(get_db()) == 0
+    assert [mine.get_nowait()['kind'] for _ in range(2)] == ['registered', 'collected']
+    assert mine.empty() and other.empty()
+
+def test_stream_resumes_from_last_event_id(logged_in_facilities, app):
+    client = logged_in_facilities
+    with app.app_context():
+        since = latest_event_id(get_db())
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'LIVE-3', 'sender': 'Loja'})
+
+    response = client.get(f'/api/unit/1/events?last_event_id={since}', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    body, events = _read_stream(response)
+    assert body.startswith('retry: 3000')
+    assert [(kind, data['kind'], data['item_id']) for kind, data in events] == [('item', 'registered', _item_id(app, 'LIVE-3'))]
+
+    assert client.get('/api/unit/2/events').status_code == 403
+
+def test_row_endpoints_place_item_in_current_list(logged_in_facilities, app):
+    client = logged_in_facilities
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'LIVE-4', 'sender': 'Loja'})
+    item_id = _item_id(app, 'LIVE-4')
+
+    row = client.get(f'/portaria/row/{item_id}').get_json()
+    assert (row['list'], row['table']) == ('today', 'tableTodayPortaria')
+    assert f'data-item-id="{item_id}"' in row['html']
+    assert client.get(f'/facilities/row/{item_id}').get_json()['list'] == 'portaria'
+
+    client.post(f'/facilities/collect/{item_id}')
+    row = client.get(f'/facilities/row/{item_id}').get_json()
+    assert (row['list'], row['table']) == ('triagem', 'table-triagem')
+    assert f'data-item-id="{item_id}"' in row['html']
+    assert client.get('/facilities/row/999999').get_json() == {'list': None}
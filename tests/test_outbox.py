@@ -0,0 +1,127 @@
+import pytest
+from utils.db import get_db
+from utils.outbox import OutboxWorker, outbox_stats, requeue_dead, backoff_seconds
+from utils.notifications import send_collection_alerts
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_out', generate_password_hash('f123'), 'FACILITIES', 'Fac Out', 1)
+        )
+        cur = db.execute("INSERT INTO email_groups (name, unit_id) VALUES ('Grupo Outbox', 1)")
+        for n in range(3):
+            db.execute("INSERT INTO email_group_members (group_id, email) VALUES (?, ?)", (cur.lastrowid, f'membro{n}@teste.com'))
+        cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-OUT-001', 'Caixa', 'EM_FACILITIES', 1)")
+        db.commit()
+        item_id = cur.lastrowid
+    auth.login('fac_out', 'f123')
+    return item_id
+
+def _outbox(db):
+    return db.execute("SELECT * FROM notification_outbox ORDER BY id").fetchall()
+
+def test_allocation_only_enqueues(client, app, logged_in_facilities):
+    from app import mail
+    with mail.record_messages() as outbox:
+        client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'Grupo Outbox'})
+        assert outbox == []
+
+    with app.app_context():
+        rows = _outbox(get_db())
+        assert [r['recipient'] for r in rows] == ['membro0@teste.com', 'membro1@teste.com', 'membro2@teste.com']
+        assert {r['status'] for r in rows} == {'PENDING'}
+        assert rows[0]['item_internal_id'] == 'AP-OUT-001'
+
+def test_worker_sends_pending_messages(client, app, runner, logged_in_facilities):
+    from app import mail
+    client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'Grupo Outbox'})
+
+    with mail.record_messages() as sent:
+        result = runner.invoke(args=['notifications-worker', '--once', '--concurrency', '2'])
+    assert result.exit_code == 0
+    assert 'Enviados: 3' in result.output
+    assert 'Conexões SMTP: 2' in result.output
+    assert sorted(m.recipients[0] for m in sent) == ['membro0@teste.com', 'membro1@teste.com', 'membro2@teste.com']
+    assert 'AP-OUT-001' in sent[0].subject
+
+    with app.app_context():
+        db = get_db()
+        assert {r['status'] for r in _outbox(db)} == {'SENT'}
+        assert outbox_stats(db)['counts']['SENT'] == 3
+
+def test_failures_back_off_then_dead_letter(app, logged_in_facilities, client):
+    client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'membro0@teste.com'})
+
+    def failing_send(row):
+        raise ConnectionError('SMTP fora do ar')
+
+    with app.app_context():
+        db = get_db()
+        worker = OutboxWorker(app, max_attempts=2, backoff_base=60, send=failing_send)
+        worker.run(db, once=True)
+        row = _outbox(db)[0]
+        assert (row['status'], row['attempts']) == ('PENDING', 1)
+        assert 'SMTP fora do ar' in row['last_error']
+
+        # Ainda no backoff: nada é reservado
+        worker.run(db, once=True)
+        assert _outbox(db)[0]['attempts'] == 1
+
+        db.execute("UPDATE notification_outbox SET next_attempt_at = '2000-01-01 00:00:00'")
+        db.commit()
+        worker.run(db, once=True)
+        assert _outbox(db)[0]['status'] == 'DEAD'
+        assert worker.metrics['retried'] == 1 and worker.metrics['dead'] == 1
+
+        assert requeue_dead(db) == 1
+        assert _outbox(db)[0]['status'] == 'PENDING'
+
+def test_stale_lease_is_reclaimed(app, logged_in_facilities, client):
+    client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'membro0@teste.com'})
+    sent = []
+    with app.app_context():
+        db = get_db()
+        # Worker que morreu no meio do envio
+        db.execute("UPDATE notification_outbox SET status = 'SENDING', locked_by = 'x', locked_at = '2000-01-01 00:00:00'")
+        db.commit()
+        worker = OutboxWorker(app, send=sent.append)
+        worker.run(db, once=True)
+        assert _outbox(db)[0]['status'] == 'SENT'
+        assert len(sent) == 1 and worker.metrics['reclaimed'] == 1
+
+def test_backoff_is_exponential_and_capped():
+    assert [backoff_seconds(n, 30, 200) for n in (1, 2, 3, 4)] == [30, 60, 120, 200]
+
+def test_group_fan_out_is_batched(app, logged_in_facilities, client, monkeypatch):
+    from app import mail
+    with app.app_context():
+        db = get_db()
+        group_id = db.execute("SELECT id FROM email_groups WHERE name = 'Grupo Outbox'").fetchone()[0]
+        db.executemany("INSERT INTO email_group_members (group_id, email) VALUES (?, ?)",
+                       [(group_id, f'extra{n}@teste.com') for n in range(47)])
+        db.commit()
+
+    client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'Grupo Outbox'})
+
+    connections = []
+    original_connect = mail.connect
+    monkeypatch.setattr(mail, 'connect', lambda: connections.append(1) or original_connect())
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT last_notified_at FROM items WHERE internal_id = 'AP-OUT-001'").fetchone()[0] is not None
+        with mail.record_messages() as sent:
+            OutboxWorker(app, concurrency=1, batch_size=100).run(db, once=True)
+        assert len(sent) == 50
+        assert len(connections) == 1
+        assert {r['status'] for r in _outbox(db)} == {'SENT'}
+
+def test_fan_out_reports_per_recipient(app, logged_in_facilities):
+    with app.test_request_context():
+        results = send_collection_alerts(['a@teste.com', 'invalido', 'a@teste.com', ' b@teste.com '], 'AP-OUT-001', 'Caixa')
+        assert results == {'a@teste.com': True, 'invalido': False, 'b@teste.com': True}
+        assert len(_outbox(get_db())) == 2
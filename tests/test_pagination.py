@@ -0,0 +1,108 @@
+import re
+import pytest
+from utils.db import get_db
+from utils.pagination import keyset_page, encode_cursor, decode_cursor
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    app.config['PAGE_SIZE'] = 3
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_pag', generate_password_hash('f123'), 'FACILITIES', 'Fac Pag', 1)
+        )
+        # Vários itens com o mesmo horário: o id desempata e nada se repete ou some entre páginas
+        for n in range(8):
+            moment = f'2030-01-0{1 + n // 3} 10:00:00'
+            status = 'ENTREGUE' if n % 2 else 'RECEBIDO_PORTARIA'
+            cur = db.execute(
+                "INSERT INTO items (internal_id, tracking_code, type, status, unit_id, created_at, updated_at) "
+                "VALUES (?, ?, 'Caixa', ?, 1, ?, ?)", (f'AP-PAG-{n}', f'TRK-PAG-{n % 2}', status, moment, moment)
+            )
+            if status == 'ENTREGUE':
+                db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name, delivered_at) "
+                           "VALUES (?, 'DATA:X', 1, 'Fulano', ?)", (cur.lastrowid, moment))
+        db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-OUTRA', 'Caixa', 'RECEBIDO_PORTARIA', 2)")
+        db.commit()
+    auth.login('fac_pag', 'f123')
+    return client
+
+def _walk(client, url, pattern=r'AP-PAG-\d'):
+    """Segue o "Carregar mais" até o fim e devolve os internal_ids na ordem recebida"""
+    seen, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        data = response.get_json()
+        seen += re.findall(pattern, data['html'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return seen
+
+def test_keyset_page_is_stable_with_ties(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        query, params = "SELECT * FROM items WHERE unit_id = ?", [1]
+        expected = [r['id'] for r in db.execute(query + " ORDER BY created_at DESC, id DESC", params)]
+
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(db, query, params, ['created_at', 'id'], descending=True, cursor=cursor, limit=3)
+            seen += [r['id'] for r in page.items]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert seen == expected
+
+        # Linha inserida no meio da paginação não desloca as próximas páginas (não há OFFSET)
+        first = keyset_page(db, query, params, ['created_at', 'id'], descending=True, limit=3)
+        db.execute("INSERT INTO items (internal_id, type, status, unit_id, created_at) VALUES ('AP-NOVO', 'Caixa', 'ENTREGUE', 1, '2031-01-01 00:00:00')")
+        second = keyset_page(db, query, params, ['created_at', 'id'], descending=True, cursor=first.next_cursor, limit=3)
+        assert [r['id'] for r in second.items] == expected[3:6]
+
+def test_cursor_round_trip_and_tampering():
+    assert decode_cursor(encode_cursor(['2030-01-01 10:00:00', 7]), 2) == ['2030-01-01 10:00:00', 7]
+    for bad in ('nao-e-base64!', encode_cursor([1]), encode_cursor(['x', None])):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, 2)
+
+def test_dashboard_lists_load_more(app, logged_in_facilities):
+    page = logged_in_facilities.get('/facilities').data.decode()
+    assert page.count('AP-PAG-') == 3
+    assert 'Carregar mais' in page
+
+    portaria = _walk(logged_in_facilities, '/facilities/more?list=portaria')
+    assert portaria == ['AP-PAG-0', 'AP-PAG-2', 'AP-PAG-4', 'AP-PAG-6']
+    assert _walk(logged_in_facilities, '/facilities/more?list=triagem') == []
+
+    assert logged_in_facilities.get('/facilities/more?list=outra').status_code == 400
+    assert logged_in_facilities.get('/facilities/more?list=portaria&cursor=lixo').status_code == 400
+
+def test_history_load_more_keeps_filters(app, logged_in_facilities):
+    proof = r'data-internal-id="(AP-PAG-\d)"'
+    assert _walk(logged_in_facilities, '/history/more?q=', proof) == ['AP-PAG-7', 'AP-PAG-5', 'AP-PAG-3', 'AP-PAG-1']
+    assert _walk(logged_in_facilities, '/history/more?start_date=2030-01-02&end_date=2030-01-02', proof) == ['AP-PAG-5', 'AP-PAG-3']
+
+    page = logged_in_facilities.get('/history?start_date=2030-01-01').data.decode()
+    assert page.count('data-internal-id="AP-PAG-') == 3
+    assert '/history/more?start_date=2030-01-01' in page
+
+def test_users_list_is_paginated(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        for n in range(5):
+            db.execute("INSERT INTO users (username, password_hash, role, full_name, is_active) VALUES (?, 'x', 'USER', ?, ?)",
+                       (f'pag{n}', f'Usuario Pag {n}', 0 if n == 4 else 1))
+        db.commit()
+
+    page = logged_in_facilities.get('/users').data.decode()
+    assert '>5</span>' in page  # total de ativos, não o tamanho da página
+    assert page.count('class="user-row"') == 3
+
+    data = logged_in_facilities.get('/users/more?list=blocked').get_json()
+    assert 'Usuario Pag 4' in data['html'] and data['next_cursor'] is None
+    assert logged_in_facilities.get('/users/more?list=todos').status_code == 400
@@ -0,0 +1,167 @@
+import re
+import pytest
+from flask import request
+from utils.db import get_db
+from utils.export_jobs import ExportWorker
+from utils.exports import EXPORTS, export_query, export_rows
+from utils.pagination import encode_cursor
+from werkzeug.security import generate_password_hash
+
+# Tabelas grandes: nenhuma query de rota pode fazer SCAN completo nelas
+HOT_TABLES = ('items', 'movements', 'proofs')
+SQL_KEYWORDS = {'where', 'join', 'left', 'inner', 'on', 'set', 'order', 'group', 'limit', 'values', 'select'}
+
+@pytest.fixture
+def seeded(app):
+    """Banco com volume suficiente para o planejador ter escolhas reais"""
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Plano')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute("INSERT INTO settings_locations (name, unit_id) VALUES ('Armario 1', 1)")
+        db.execute("INSERT INTO settings_item_types (name) VALUES ('Caixa')")
+        db.execute(
+            "INSERT INTO users (username, email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?, ?)",
+            ('plan_admin', 'plan_admin@teste.com', generate_password_hash('plan123'), 'ADMIN', 'Plan Admin', 1)
+        )
+        db.execute(
+            "INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('dest@teste.com', generate_password_hash('dest123'), 'USER', 'Destinatario', 1)
+        )
+        db.execute("INSERT INTO email_groups (id, name, unit_id) VALUES (1, 'Grupo Plano', 1)")
+        db.execute("INSERT INTO email_group_members (group_id, email) VALUES (1, 'm1@teste.com'), (1, 'm2@teste.com')")
+
+        statuses = ['RECEBIDO_PORTARIA', 'EM_FACILITIES', 'DISPONIVEL_PARA_RETIRADA', 'ENTREGUE', 'EXTRAVIADO']
+        for n in range(500):
+            status = statuses[n % len(statuses)]
+            cur = db.execute(
+                "INSERT INTO items (internal_id, tracking_code, type, sender, recipient_email, status, unit_id, created_at, updated_at) "
+                "VALUES (?, ?, 'Caixa', 'Remetente', ?, ?, ?, datetime('now', ?), datetime('now', ?))",
+                (f'AP-PLAN-{n:04d}', f'TRK{n:06d}', 'dest@teste.com' if n % 3 else None, status,
+                 1 + n % 2, f'-{n} hours', f'-{n} hours')
+            )
+            db.execute("INSERT INTO movements (item_id, user_id, action, unit_id) VALUES (?, 1, 'REGISTER_PORTARIA', ?)",
+                       (cur.lastrowid, 1 + n % 2))
+            if status in ('ENTREGUE', 'EXTRAVIADO'):
+                db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name) VALUES (?, 'DATA:X', 1, 'Fulano')",
+                           (cur.lastrowid,))
+        db.commit()
+    return app
+
+@pytest.fixture
+def traced_sql(seeded):
+    """Registra toda SQL executada pela conexão (reaproveitada pelo pool) durante os requests"""
+    statements = []
+    with seeded.app_context():
+        conn = get_db()
+    conn.set_trace_callback(statements.append)
+    yield statements
+    conn.set_trace_callback(None)
+
+def _aliases(sql):
+    """Mapeia alias -> tabela para as tabelas quentes citadas na query"""
+    aliases = {}
+    for table, alias in re.findall(r'\b(items|movements|proofs)\b(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+def _full_scans(db, sql):
+    aliases = _aliases(sql)
+    if not aliases:
+        return []
+    scans = []
+    for row in db.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        match = re.match(r'SCAN (\w+)', row['detail'])
+        if match and aliases.get(match.group(1).lower()) in HOT_TABLES:
+            scans.append(row['detail'])
+    return scans
+
+def _exercise_routes(client, app):
+    client.post('/login', data={'login': 'plan_admin', 'password': 'plan123'})
+    with client.session_transaction() as sess:
+        sess['unit_id'] = 1
+
+    with app.app_context():
+        db = get_db()
+        portaria_id = db.execute("SELECT id FROM items WHERE status = 'RECEBIDO_PORTARIA' AND unit_id = 1 LIMIT 1").fetchone()[0]
+        triage_id = db.execute("SELECT id FROM items WHERE status = 'EM_FACILITIES' AND unit_id = 1 LIMIT 1").fetchone()[0]
+        ready_ids = [r[0] for r in db.execute("SELECT id FROM items WHERE status = 'DISPONIVEL_PARA_RETIRADA' AND unit_id = 1 LIMIT 2").fetchall()]
+
+    client.get('/portaria')
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'TRK-NEW', 'sender': 'Loja'})
+    client.get('/facilities')
+    client.post(f'/facilities/collect/{portaria_id}')
+    client.post(f'/facilities/allocate/{triage_id}', data={'location': 'Armario 1', 'recipient_email': 'Grupo Plano'})
+    client.post(f'/facilities/update_location/{ready_ids[0]}', data={'location': 'Armario 1'})
+    client.post(f'/facilities/resend_alert/{ready_ids[0]}')
+    client.get(f'/delivery/{ready_ids[0]}')
+    client.get(f'/delivery/password/{ready_ids[0]}')
+    client.post(f'/delivery/confirm/{ready_ids[0]}', data={'received_by_name': 'Fulano', 'signature_data': 'data:image/png;base64,AAAA'})
+    client.post(f'/delivery/confirm_password/{ready_ids[1]}', data={'email': 'dest@teste.com', 'password': 'dest123'})
+    client.post('/facilities/register-occurrence', data={'internal_id': 'AP-PLAN-0000', 'action': 'EXTRAVIADO', 'note': 'x', 'password': 'plan123'})
+    client.get('/facilities/check-item-status/AP-PLAN-0002')
+    client.get('/history')
+    client.get('/history?q=TRK0000&start_date=2020-01-01&end_date=2099-12-31')
+    client.get(f'/history/signature/{ready_ids[0]}')
+    client.get(f'/api/item/history/{ready_ids[0]}')
+    client.get('/api/recipients/search?q=dest')
+    client.get('/facilities/search?q=TRK00001')
+    client.get('/facilities/search?q=AP-PLAN&status=ENTREGUE&date=2020-01-01')
+    client.get('/facilities/search?status=EM_FACILITIES')
+    client.get('/home')
+    client.get('/history/export?stream=1&q=TRK&start_date=2020-01-01').data  # streaming: consome o corpo
+    client.get('/panel/export?stream=1').data
+    client.get('/history/export?format=xlsx&start_date=2020-01-01')
+    with app.app_context():
+        ExportWorker.from_config(app).run_once(get_db())
+    client.get('/exports')
+    client.get('/settings')
+    client.get('/users')
+    # Páginas seguintes (keyset): o cursor vira uma faixa no índice, sem OFFSET nem ordenação em memória
+    oldest, newest = encode_cursor(['2000-01-01 00:00:00', 0]), encode_cursor(['2099-01-01 00:00:00', 10 ** 9])
+    client.get(f'/facilities/more?list=portaria&cursor={oldest}')
+    client.get(f'/facilities/more?list=triagem&cursor={oldest}')
+    client.get(f'/facilities/more?list=entrega&cursor={newest}')
+    client.get(f'/history/more?q=TRK&start_date=2020-01-01&cursor={newest}')
+    client.get(f'/users/more?list=active&cursor={newest}')
+
+def test_routes_never_full_scan_hot_tables(client, seeded, traced_sql):
+    _exercise_routes(client, seeded)
+
+    queries = [s for s in traced_sql if s.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))]
+    assert any('FROM items' in q for q in queries)
+
+    offenders = {}
+    with seeded.app_context():
+        db = get_db()
+        for sql in queries:
+            scans = _full_scans(db, sql)
+            if scans:
+                offenders[sql] = scans
+
+    assert not offenders, "Queries com SCAN em tabelas quentes:\n" + "\n".join(
+        f"{scans}: {sql}" for sql, scans in offenders.items()
+    )
+
+@pytest.mark.parametrize('kind', sorted(EXPORTS))
+@pytest.mark.parametrize('filters', ['', 'start_date=2020-01-01'])
+def test_exports_stream_in_index_order(seeded, kind, filters):
+    """Cada camada da exportação sai na ordem de um índice: nada é ordenado em tabela temporária"""
+    # (Com busca textual o planejador parte dos resultados do FTS, um conjunto pequeno, e ordena esses)
+    with seeded.test_request_context(f'/?{filters}'):
+        db = get_db()
+        db.execute("ANALYZE")
+        spec, sources = export_query(kind, 1, request.args)
+        direction = ' DESC' if spec.descending else ' ASC'
+        for query, params in sources:
+            plan = [row['detail'] for row in db.execute(
+                f"EXPLAIN QUERY PLAN {query} ORDER BY {spec.order}{direction}", params
+            ).fetchall()]
+            assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+        rows = list(export_rows(db, spec, sources))
+        key = spec.order.rsplit('.', 1)[-1]
+        values = [row[key] for row in rows]
+        assert rows and values == sorted(values, reverse=spec.descending)
@@ -0,0 +1,92 @@
+import pytest
+from utils.db import get_db
+from utils.recipients import RecipientIndex, search_recipients
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_rec', generate_password_hash('f123'), 'FACILITIES', 'Fac Rec', 1)
+        )
+        people = [
+            ('joao.silva@teste.com', 'João da Silva', 1, 1),
+            ('joana@teste.com', 'Joana Prado', 1, 1),
+            ('maria@teste.com', 'Maria Joaquina', 1, 1),
+            ('bloqueado@teste.com', 'Joel Bloqueado', 1, 0),
+            ('jorge@outra.com', 'Jorge Outra', 2, 1),
+        ]
+        for email, name, unit_id, active in people:
+            db.execute(
+                "INSERT INTO users (email, password_hash, role, full_name, default_unit_id, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+                (email, 'x', 'USER', name, unit_id, active)
+            )
+        db.execute("INSERT INTO email_groups (name, unit_id) VALUES ('Jornal Interno', 1)")
+        db.commit()
+    auth.login('fac_rec', 'f123')
+    return client
+
+def _values(response):
+    return [r['value'] for r in response.json['results']]
+
+def test_search_by_name_email_and_group(logged_in_facilities):
+    client = logged_in_facilities
+    # Grupo primeiro, depois usuários; sem acento, sem bloqueados e só da unidade
+    assert _values(client.get('/api/recipients/search?q=jo')) == [
+        'Jornal Interno', 'joana@teste.com', 'joao.silva@teste.com', 'maria@teste.com'
+    ]
+    assert _values(client.get('/api/recipients/search?q=silva jo')) == ['joao.silva@teste.com']
+    assert _values(client.get('/api/recipients/search?q=JOAO.SILVA@teste.com')) == ['joao.silva@teste.com']
+    assert _values(client.get('/api/recipients/search?q=jo&limit=2')) == ['Jornal Interno', 'joana@teste.com']
+    assert _values(client.get('/api/recipients/search?q=')) == []
+    assert _values(client.get('/api/recipients/search?q=xyz')) == []
+
+def test_password_delivery_offered_for_users_of_other_units(logged_in_facilities, app):
+    client = logged_in_facilities
+    with app.app_context():
+        db = get_db()
+        item_id = db.execute(
+            "INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-REC-1', 'Caixa', 'DISPONIVEL_PARA_RETIRADA', 1)"
+        ).lastrowid
+        db.commit()
+    # O typeahead fica na unidade; a entrega por senha usa a busca exata em todos os usuários
+    assert _values(client.get('/api/recipients/search?q=jorge')) == []
+    assert client.get('/check_user/jorge@outra.com').json == {'exists': True}
+    assert '/check_user/' in client.get(f'/delivery/{item_id}').data.decode()
+
+def test_index_invalidated_by_group_changes(logged_in_facilities):
+    client = logged_in_facilities
+    assert _values(client.get('/api/recipients/search?q=financeiro')) == []
+
+    client.post('/settings/email_groups/add', data={'name': 'Financeiro', 'emails': 'a@teste.com'})
+    assert _values(client.get('/api/recipients/search?q=financeiro')) == ['Financeiro']
+
+def test_index_expires_after_ttl(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        assert search_recipients(db, 1, 'novo') == []
+        # Escrita feita por outro processo: este só enxerga após o TTL
+        db.execute("INSERT INTO users (email, password_hash, role, full_name, default_unit_id) VALUES ('novo@teste.com', 'x', 'USER', 'Novo', 1)")
+        db.commit()
+        assert search_recipients(db, 1, 'novo') == []
+        assert [m['value'] for m in search_recipients(db, 1, 'novo', ttl=0)] == ['novo@teste.com']
+
+def test_ranking_in_large_directory():
+    entries = [
+        {'kind': 'user', 'value': f'user{n}@teste.com', 'name': f'Pessoa {n} Sobrenome{n % 97}',
+         'email': f'user{n}@teste.com', 'label': ''}
+        for n in range(2000)
+    ]
+    index = RecipientIndex(entries)
+    names = lambda query: [r['name'] for r in index.search(query, 10)]
+    # Todos casam pelo começo do nome: ordem alfabética
+    assert names('p') == sorted((e['name'] for e in entries), key=str.lower)[:10]
+    # Dois termos: só quem tem os dois tokens (n % 97 == 42), em ordem de nome
+    assert names('sobrenome42 pessoa') == sorted((f'Pessoa {n} Sobrenome42' for n in range(42, 2000, 97)), key=str.lower)[:10]
+    # Nome completo digitado vem antes de quem só casa por token
+    assert names('pessoa 19 sobrenome19') == ['Pessoa 19 Sobrenome19', 'Pessoa 1959 Sobrenome19']
+    assert [r['value'] for r in index.search('user1999@teste.com', 10)] == ['user1999@teste.com']
@@ -0,0 +1,74 @@
+import re
+import pytest
+from utils.db import get_db
+from utils.reference_data import bump_version, item_types
+from werkzeug.security import generate_password_hash
+
+REFERENCE_TABLES = re.compile(r'\b(settings_\w+|email_groups)\b')
+
+@pytest.fixture
+def logged_in_admin(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Ref')")
+        db.execute("INSERT INTO settings_locations (name, unit_id) VALUES ('Armario Ref', 1)")
+        db.execute("INSERT INTO settings_item_types (name) VALUES ('Caixa')")
+        db.execute("INSERT INTO settings_allowed_domains (domain) VALUES ('@teste.com')")
+        db.execute("INSERT INTO email_groups (name, unit_id) VALUES ('Grupo Ref', 1)")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('ref_admin', generate_password_hash('r123'), 'ADMIN', 'Ref Admin', 1)
+        )
+        db.commit()
+    auth.login('ref_admin', 'r123')
+    return client
+
+@pytest.fixture
+def traced_sql(app, logged_in_admin):
+    statements = []
+    with app.app_context():
+        conn = get_db()
+    conn.set_trace_callback(statements.append)
+    yield statements
+    conn.set_trace_callback(None)
+
+PAGES = ['/facilities', '/portaria', '/settings', '/users', '/history']
+
+def test_page_renders_make_no_settings_queries(logged_in_admin, traced_sql):
+    for url in PAGES:
+        assert logged_in_admin.get(url).status_code == 200
+    # Primeira rodada aquece o cache; a segunda não toca nas tabelas de referência
+    traced_sql.clear()
+    for url in PAGES:
+        page = logged_in_admin.get(url).data.decode()
+        assert 'Unidade Ref' in page
+    assert [s for s in traced_sql if REFERENCE_TABLES.search(s)] == []
+    # Só a versão é conferida: uma vez por request
+    assert sum('FROM cache_versions' in s for s in traced_sql) == len(PAGES)
+
+def test_settings_writes_invalidate_cache(logged_in_admin):
+    assert 'Envelope' not in logged_in_admin.get('/portaria').data.decode()
+    logged_in_admin.post('/settings/add/type', data={'name': 'Envelope'})
+    assert 'Envelope' in logged_in_admin.get('/portaria').data.decode()
+
+    logged_in_admin.post('/settings/add/company', data={'name': 'Unidade Nova'})
+    assert 'Unidade Nova' in logged_in_admin.get('/settings').data.decode()
+
+def test_write_from_another_worker_is_seen_after_version_bump(app, logged_in_admin):
+    with app.test_request_context():
+        assert [t['name'] for t in item_types(get_db())] == ['Caixa']
+
+    # Outro worker grava direto no banco: este processo só descarta o cache quando a versão muda
+    with app.test_request_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_item_types (name) VALUES ('Pallet')")
+        db.commit()
+    with app.test_request_context():
+        assert [t['name'] for t in item_types(get_db())] == ['Caixa']
+
+    with app.test_request_context():
+        db = get_db()
+        bump_version(db)
+        db.commit()
+    with app.test_request_context():
+        assert [t['name'] for t in item_types(get_db())] == ['Caixa', 'Pallet']
@@ -0,0 +1,52 @@
+from utils.db import get_db
+from utils.reminders import send_reminder_digests
+
+def _seed(db):
+    cur = db.execute("INSERT INTO email_groups (name, unit_id) VALUES ('Grupo Lembrete', 1)")
+    db.executemany("INSERT INTO email_group_members (group_id, email) VALUES (?, ?)",
+                   [(cur.lastrowid, 'ana@teste.com'), (cur.lastrowid, 'bruno@teste.com')])
+    items = [
+        ('AP-R-1', 'ana@teste.com', None, None),
+        ('AP-R-2', 'ana@teste.com', None, '2000-01-01 00:00:00'),
+        ('AP-R-3', 'Grupo Lembrete', None, None),
+        ('AP-R-4', None, 'carla@teste.com', None),
+        ('AP-R-5', None, 'Sem Email', None),
+        ('AP-R-6', 'ana@teste.com', None, '2999-01-01 00:00:00'),  # avisado há pouco
+    ]
+    for internal_id, email, manual, notified in items:
+        db.execute(
+            "INSERT INTO items (internal_id, type, status, location, recipient_email, recipient_name_manual, last_notified_at, unit_id) "
+            "VALUES (?, 'Caixa', 'DISPONIVEL_PARA_RETIRADA', 'Armario 1', ?, ?, ?, 1)",
+            (internal_id, email, manual, notified)
+        )
+    db.execute("INSERT INTO items (internal_id, type, status, recipient_email, unit_id) VALUES ('AP-R-7', 'Caixa', 'ENTREGUE', 'ana@teste.com', 1)")
+    db.commit()
+
+def test_one_digest_per_recipient(app):
+    with app.app_context():
+        db = get_db()
+        _seed(db)
+
+        statements = []
+        db.set_trace_callback(statements.append)
+        stats = send_reminder_digests(db, interval_days=3)
+        db.set_trace_callback(None)
+
+        assert stats == {'items': 4, 'recipients': 3, 'without_email': 1}
+        # Itens, grupos+membros, inserção em lote e um UPDATE: sem N+1
+        selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+        assert len(selects) == 2
+
+        messages = {r['recipient']: r for r in db.execute("SELECT * FROM notification_outbox").fetchall()}
+        assert sorted(messages) == ['ana@teste.com', 'bruno@teste.com', 'carla@teste.com']
+        ana = messages['ana@teste.com']
+        assert '3 encomendas' in ana['subject']
+        assert all(i in ana['body'] for i in ('AP-R-1', 'AP-R-2', 'AP-R-3'))
+        assert 'AP-R-6' not in ana['body']
+        assert 'AP-R-3' in messages['bruno@teste.com']['subject']
+
+        notified = {r[0] for r in db.execute("SELECT internal_id FROM items WHERE last_notified_at < '2999-01-01'").fetchall()}
+        assert notified == {'AP-R-1', 'AP-R-2', 'AP-R-3', 'AP-R-4'}
+
+        # Rodar de novo em seguida não repete os lembretes
+        assert send_reminder_digests(db, interval_days=3)['recipients'] == 0
@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime
+from utils.db import get_db
+from utils.reminders import parse_policies, policy_for, send_due_reminders, ReminderPolicy
+from utils.scheduler import acquire_lease, release_lease, ReminderScheduler
+from werkzeug.security import generate_password_hash
+
+NOW = datetime(2030, 1, 10, 12, 0, 0)
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_sch', generate_password_hash('f123'), 'FACILITIES', 'Fac Sch', 1)
+        )
+        cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-SCH-001', 'Caixa', 'EM_FACILITIES', 1)")
+        db.commit()
+        item_id = cur.lastrowid
+    auth.login('fac_sch', 'f123')
+    return item_id
+
+def _seed_due(db):
+    items = [
+        ('AP-D-1', 'ana@teste.com', 1, '2030-01-10 11:00:00'),
+        ('AP-D-2', 'ana@teste.com', 1, '2030-01-09 00:00:00'),
+        ('AP-D-3', 'ana@teste.com', 2, '2030-01-10 11:00:00'),
+        ('AP-D-4', 'ana@teste.com', 2, '2030-01-10 11:30:00'),
+        ('AP-D-5', 'ana@teste.com', 3, '2030-01-10 11:00:00'),
+        ('AP-D-6', 'ana@teste.com', 1, '2030-01-11 00:00:00'),  # ainda não venceu
+        ('AP-D-7', None, 1, '2030-01-10 11:00:00'),
+    ]
+    db.executemany(
+        "INSERT INTO items (internal_id, type, status, recipient_email, unit_id, next_reminder_at) "
+        "VALUES (?, 'Caixa', 'DISPONIVEL_PARA_RETIRADA', ?, ?, ?)", items
+    )
+    db.commit()
+
+def test_parse_policies():
+    policies = parse_policies("1=48, 2=off,3=24:single", default_hours=72)
+    assert policies[1] == ReminderPolicy(48.0, True, True)
+    assert policies[2].enabled is False
+    assert policies[3] == ReminderPolicy(24.0, True, False)
+    assert policy_for(9, {'REMINDER_INTERVAL_HOURS': 72, 'REMINDER_POLICIES': '1=48'}) == ReminderPolicy(72, True, True)
+    with pytest.raises(ValueError):
+        parse_policies("1=abc")
+
+def test_allocation_schedules_next_reminder(client, app, logged_in_facilities):
+    app.config['REMINDER_POLICIES'] = '1=24'
+    client.post(f'/facilities/allocate/{logged_in_facilities}', data={'location': 'Sala', 'recipient_email': 'ana@teste.com'})
+    with app.app_context():
+        row = get_db().execute("SELECT last_notified_at, next_reminder_at FROM items WHERE id = ?", (logged_in_facilities,)).fetchone()
+        assert (row['next_reminder_at'] - row['last_notified_at']).total_seconds() == 24 * 3600
+
+def test_due_reminders_follow_unit_policy(app):
+    policies = parse_policies("2=12:single,3=off")
+    with app.app_context():
+        db = get_db()
+        _seed_due(db)
+        stats = send_due_reminders(db, lambda unit_id: policies.get(unit_id, ReminderPolicy(72, True, True)), NOW)
+        assert stats == {'items': 4, 'recipients': 3, 'skipped': 1, 'without_email': 1}
+
+        subjects = [r['subject'] for r in db.execute("SELECT subject FROM notification_outbox ORDER BY id").fetchall()]
+        assert '2 encomendas' in subjects[0]  # unidade 1 em digest
+        assert 'AP-D-3' in subjects[1] and 'AP-D-4' in subjects[2]  # unidade 2: um por item
+
+        schedule = {r['internal_id']: r['next_reminder_at'] for r in db.execute("SELECT internal_id, next_reminder_at FROM items")}
+        assert schedule['AP-D-1'] == datetime(2030, 1, 13, 12, 0, 0)
+        assert schedule['AP-D-3'] == datetime(2030, 1, 11, 0, 0, 0)
+        assert schedule['AP-D-5'] == datetime(2030, 1, 13, 12, 0, 0)  # desligada: só reagenda
+        assert schedule['AP-D-6'] == datetime(2030, 1, 11, 0, 0, 0)
+        assert schedule['AP-D-7'] is None
+
+        # Nada mais vencido: a segunda rodada não enfileira de novo
+        assert send_due_reminders(db, lambda unit_id: ReminderPolicy(72, True, True), NOW)['items'] == 0
+
+def test_lease_is_exclusive(app):
+    with app.app_context():
+        db = get_db()
+        assert acquire_lease(db, 'reminders', 'a', 60, NOW)
+        assert not acquire_lease(db, 'reminders', 'b', 60, NOW)
+        assert acquire_lease(db, 'reminders', 'a', 60, NOW)
+        # Dono morreu: o lease expira e outro assume
+        assert acquire_lease(db, 'reminders', 'b', 60, datetime(2030, 1, 10, 12, 1, 0))
+        release_lease(db, 'reminders', 'b')
+        assert acquire_lease(db, 'reminders', 'a', 60, NOW)
+
+def test_scheduler_tick_sleeps_until_next_due(app):
+    with app.app_context():
+        db = get_db()
+        _seed_due(db)
+        scheduler = ReminderScheduler(app, lease_seconds=100000, max_sleep=86400)
+        # Próximo vencimento (AP-D-6) é às 00:00 do dia seguinte
+        assert scheduler.tick(db, NOW) == 12 * 3600
+        assert scheduler.metrics['items'] == 5
+
+        other = ReminderScheduler(app, lease_seconds=3600, max_sleep=86400)
+        other.owner = 'outro-host:1'
+        assert other.tick(db, NOW) == 1800  # metade do lease: tenta de novo
+        assert other.metrics == {'ticks': 0, 'items': 0, 'recipients': 0, 'skipped': 0, 'lease_denied': 1}
+
+def test_scheduler_run_once_command(app, runner):
+    with app.app_context():
+        db = get_db()
+        _seed_due(db)
+        db.execute("UPDATE items SET next_reminder_at = '2000-01-01 00:00:00'")
+        db.commit()
+    result = runner.invoke(args=['scheduler', 'run', '--once'])
+    assert result.exit_code == 0
+    assert 'Itens lembrados: 6 | E-mails: 3' in result.output
+    with app.app_context():
+        assert get_db().execute("SELECT COUNT(*) FROM scheduler_leases").fetchone()[0] == 0
+
+    app.config['REMINDER_POLICIES'] = '1=nunca'
+    result = runner.invoke(args=['scheduler', 'run', '--once'])
+    assert result.exit_code != 0
+    assert 'REMINDER_POLICIES' in result.output
@@ -0,0 +1,85 @@
+import pytest
+from utils.db import get_db
+from utils.search import search_items, search_terms, fts_match
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_busca', generate_password_hash('f123'), 'FACILITIES', 'Fac Busca', 1)
+        )
+        items = [
+            ('AP-20240101-0001', 'BR123456789BR', 'Amazon', 'joao@teste.com', 'ENTREGUE', 1),
+            ('AP-20240101-0002', 'LX999', 'Loja BR123456789BR', None, 'DISPONIVEL_PARA_RETIRADA', 1),
+            ('AP-20240101-0003', 'BR123456789BR', 'Amazon', None, 'ENTREGUE', 2),
+        ]
+        for internal_id, tracking, sender, email, status, unit_id in items:
+            db.execute(
+                "INSERT INTO items (internal_id, tracking_code, sender, recipient_email, status, type, unit_id) "
+                "VALUES (?, ?, ?, ?, ?, 'Caixa', ?)", (internal_id, tracking, sender, email, status, unit_id)
+            )
+        db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name) VALUES (1, 'DATA:X', 1, 'José Conceição')")
+        db.commit()
+    auth.login('fac_busca', 'f123')
+    return client
+
+def _ids(rows):
+    return [row['internal_id'] for row in rows]
+
+def test_terms_are_sanitized():
+    assert search_terms('  AP-2024 "x" OR * ') == ['ap', '2024', 'x', 'or']
+    assert fts_match(['br12'], 1) == 'unit_key : "u1" AND {internal_id tracking_code sender recipient received_by_name} : ("br12"*)'
+
+def test_prefix_ranking_and_unit_filter(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        # Rastreio pesa mais que menção no remetente; o item da outra unidade não aparece
+        assert _ids(search_items(db, 1, 'br1234')) == ['AP-20240101-0001', 'AP-20240101-0002']
+        assert _ids(search_items(db, 2, 'br1234')) == ['AP-20240101-0003']
+        assert _ids(search_items(db, 1, 'ap-20240101-0002')) == ['AP-20240101-0002']
+        assert _ids(search_items(db, 1, 'br1234', status='ENTREGUE')) == ['AP-20240101-0001']
+        # Sem acento e pelo nome de quem recebeu (comprovante)
+        assert _ids(search_items(db, 1, 'jose concei')) == ['AP-20240101-0001']
+        assert search_items(db, 1, '  *** ') == []
+
+def test_triggers_keep_index_in_sync(app, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE items SET recipient_name_manual = 'Mariana Souza', unit_id = 1 WHERE internal_id = 'AP-20240101-0003'")
+        db.execute("UPDATE proofs SET received_by_name = 'Pedro' WHERE item_id = 1")
+        db.commit()
+        assert _ids(search_items(db, 1, 'mariana')) == ['AP-20240101-0003']
+        assert search_items(db, 1, 'jose') == []
+        assert _ids(search_items(db, 1, 'pedro')) == ['AP-20240101-0001']
+
+        db.execute("DELETE FROM proofs WHERE item_id = 1")
+        db.execute("DELETE FROM items WHERE internal_id = 'AP-20240101-0003'")
+        db.commit()
+        assert search_items(db, 1, 'pedro') == []
+        assert search_items(db, 1, 'mariana') == []
+
+def test_search_page_and_history(client, logged_in_facilities):
+    response = client.get('/facilities/search?q=BR123')
+    assert response.status_code == 200
+    assert b'AP-20240101-0001' in response.data and b'AP-20240101-0003' not in response.data
+
+    response = client.get('/facilities/search?status=DISPONIVEL_PARA_RETIRADA')
+    assert b'AP-20240101-0002' in response.data and b'AP-20240101-0001' not in response.data
+
+    response = client.get('/history?q=Jose')
+    assert b'AP-20240101-0001' in response.data
+
+def test_rebuild_command(app, runner, logged_in_facilities):
+    with app.app_context():
+        db = get_db()
+        db.execute("DELETE FROM items_fts")
+        db.commit()
+    result = runner.invoke(args=['search-rebuild'])
+    assert '3 encomenda(s)' in result.output
+    with app.app_context():
+        assert _ids(search_items(get_db(), 1, 'jose')) == ['AP-20240101-0001']
@@ -0,0 +1,81 @@
+import os
+import base64
+import pytest
+from utils.db import get_db
+from utils.signature_store import get_signature_store, is_blob_ref
+from werkzeug.security import generate_password_hash
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x01' * 64
+SIGNATURE = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_sig', generate_password_hash('f123'), 'FACILITIES', 'Fac Sig', 1)
+        )
+        db.commit()
+    auth.login('fac_sig', 'f123')
+    return client
+
+def _new_item(app, internal_id, status='DISPONIVEL_PARA_RETIRADA'):
+    with app.app_context():
+        db = get_db()
+        cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES (?, 'Caixa', ?, 1)", (internal_id, status))
+        db.commit()
+        return cur.lastrowid
+
+def test_delivery_stores_signature_on_disk(logged_in_facilities, app):
+    item_id = _new_item(app, 'AP-BLOB-001')
+    logged_in_facilities.post(f'/delivery/confirm/{item_id}', data={
+        'received_by_name': 'Fulano', 'signature_data': SIGNATURE
+    })
+
+    with app.app_context():
+        ref = get_db().execute("SELECT signature_data FROM proofs WHERE item_id = ?", (item_id,)).fetchone()[0]
+        assert is_blob_ref(ref)
+        path = get_signature_store().resolve(ref)
+        with open(path, 'rb') as f:
+            assert f.read() == PNG_BYTES
+
+    response = logged_in_facilities.get(f'/history/signature/{item_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == PNG_BYTES
+
+def test_identical_signatures_share_one_file(app):
+    with app.app_context():
+        store = get_signature_store()
+        assert store.put(PNG_BYTES) == store.put(PNG_BYTES)
+        files = [f for _, _, names in os.walk(store.root) for f in names]
+        assert len(files) == 1
+
+def test_migrate_command_moves_inline_rows(app, runner):
+    ids = [_new_item(app, f'AP-MIG-{n}', 'ENTREGUE') for n in range(5)]
+    with app.app_context():
+        db = get_db()
+        for item_id in ids:
+            db.execute("INSERT INTO proofs (item_id, signature_data, delivered_by, received_by_name) VALUES (?, ?, 1, 'X')",
+                       (item_id, SIGNATURE))
+        db.execute("UPDATE proofs SET signature_data = 'DATA:AUTHENTICATED_BY_PASSWORD' WHERE item_id = ?", (ids[0],))
+        db.commit()
+
+        # Comprovante arquivado antes da migração, ainda com a imagem inline
+        db.execute("INSERT INTO items_archive (id, internal_id, type, status, unit_id) VALUES (900, 'AP-MIG-ARQ', 'Caixa', 'ENTREGUE', 1)")
+        db.execute("INSERT INTO proofs_archive (item_id, signature_data, delivered_by, received_by_name) VALUES (900, ?, 1, 'X')",
+                   (SIGNATURE,))
+        db.commit()
+
+    result = runner.invoke(args=['signatures-migrate', '--chunk-size', '2'])
+    assert result.exit_code == 0
+    assert '5 assinaturas movidas' in result.output
+
+    with app.app_context():
+        db = get_db()
+        rows = db.execute("SELECT signature_data FROM proofs ORDER BY item_id").fetchall()
+        assert rows[0][0] == 'DATA:AUTHENTICATED_BY_PASSWORD'
+        assert all(is_blob_ref(r[0]) for r in rows[1:])
+        assert is_blob_ref(db.execute("SELECT signature_data FROM proofs_archive WHERE item_id = 900").fetchone()[0])
@@ -0,0 +1,79 @@
+import base64
+import pytest
+from utils.db import get_db
+from utils import signature_vector
+from werkzeug.security import generate_password_hash
+
+STROKES = [[(10, 10), (12, 14), (15, 20), (30, 25)], [(50, 40)], [(60, 60), (58, 61), (55, 70)]]
+
+def _payload(width=300, height=200, strokes=STROKES):
+    return base64.b64encode(signature_vector.encode(width, height, strokes)).decode()
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Teste')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_vec', generate_password_hash('f123'), 'FACILITIES', 'Fac Vec', 1)
+        )
+        cur = db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-VEC-001', 'Caixa', 'DISPONIVEL_PARA_RETIRADA', 1)")
+        db.commit()
+        item_id = cur.lastrowid
+    auth.login('fac_vec', 'f123')
+    return item_id
+
+def test_roundtrip_is_compact():
+    data = signature_vector.encode(300, 200, STROKES)
+    assert signature_vector.decode(data) == (300, 200, STROKES)
+    assert len(data) < 40
+
+@pytest.mark.parametrize('payload', [
+    '',
+    'não é base64',
+    base64.b64encode(b'XX').decode(),
+    _payload(width=0),
+    _payload(strokes=[]),
+    _payload(strokes=[[(5000, 5000)]]),
+    _payload() + 'AAAA',
+])
+def test_invalid_payloads_are_rejected(payload):
+    with pytest.raises(signature_vector.InvalidSignature):
+        signature_vector.normalize_payload(payload)
+
+def test_vector_delivery_renders_svg(client, app, logged_in_facilities):
+    item_id = logged_in_facilities
+    client.post(f'/delivery/confirm/{item_id}', data={
+        'received_by_name': 'Fulano',
+        'signature_data': '',
+        'signature_format': 'vector',
+        'signature_vector': _payload(),
+    })
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT status FROM items WHERE id = ?", (item_id,)).fetchone()[0] == 'ENTREGUE'
+        stored = db.execute("SELECT signature_data FROM proofs WHERE item_id = ?", (item_id,)).fetchone()[0]
+        assert signature_vector.is_vector(stored)
+
+    response = client.get(f'/history/signature/{item_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+    assert b'<path d="M10 10 L12 14' in response.data
+    assert b'<circle cx="50" cy="40"' in response.data
+
+def test_invalid_vector_does_not_deliver(client, app, logged_in_facilities):
+    item_id = logged_in_facilities
+    response = client.post(f'/delivery/confirm/{item_id}', data={
+        'received_by_name': 'Fulano',
+        'signature_data': '',
+        'signature_format': 'vector',
+        'signature_vector': 'AAAA',
+    }, follow_redirects=True)
+    assert 'Assinatura inválida'.encode() in response.data
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT status FROM items WHERE id = ?", (item_id,)).fetchone()[0] == 'DISPONIVEL_PARA_RETIRADA'
+        assert db.execute("SELECT 1 FROM proofs WHERE item_id = ?", (item_id,)).fetchone() is None
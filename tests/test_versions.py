@@ -0,0 +1,83 @@
+import pytest
+from utils.db import get_db
+from utils.reminders import reschedule, mark_notified
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def logged_in_facilities(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (1, 'Unidade Versao')")
+        db.execute("INSERT INTO settings_companies (id, name) VALUES (2, 'Outra Unidade')")
+        db.execute(
+            "INSERT INTO users (username, password_hash, role, full_name, default_unit_id) VALUES (?, ?, ?, ?, ?)",
+            ('fac_ver', generate_password_hash('v123'), 'FACILITIES_PORTARIA', 'Fac Versao', 1)
+        )
+        db.commit()
+    auth.login('fac_ver', 'v123')
+    # Descarta a mensagem de boas-vindas: páginas com flash pendente nunca respondem 304
+    client.get('/facilities')
+    return client
+
+def _version(client, unit_id=1):
+    return client.get(f'/api/unit/{unit_id}/version').get_json()['version']
+
+def test_writes_bump_only_their_unit(logged_in_facilities, app):
+    client = logged_in_facilities
+    start = _version(client)
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'VER-1', 'sender': 'Loja'})
+    after_register = _version(client)
+    assert after_register > start
+
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO items (internal_id, type, status, unit_id) VALUES ('AP-VER-2', 'Caixa', 'RECEBIDO_PORTARIA', 2)")
+        db.commit()
+    assert _version(client) == after_register
+
+    client.post('/settings/add/location', data={'name': 'Sala Versao'})
+    assert _version(client) > after_register
+    assert client.get('/api/unit/2/version').status_code == 403
+
+@pytest.mark.parametrize('url', ['/facilities', '/portaria', '/history?q=VER'])
+def test_unchanged_page_answers_304_without_queries(logged_in_facilities, app, url):
+    client = logged_in_facilities
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+
+    statements = []
+    with app.app_context():
+        conn = get_db()
+    conn.set_trace_callback(statements.append)
+    try:
+        cached = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    finally:
+        conn.set_trace_callback(None)
+    assert cached.status_code == 304 and cached.data == b''
+    # Só a leitura das versões (fora o ping do pool ao entregar a conexão)
+    statements = [s for s in statements if s != 'SELECT 1']
+    assert len(statements) == 1 and 'unit_versions' in statements[0]
+
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'VER-3', 'sender': 'Loja'})
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+def test_etag_depends_on_query_params(logged_in_facilities):
+    client = logged_in_facilities
+    etag = client.get('/history?q=A').headers['ETag']
+    assert client.get('/history?q=B', headers={'If-None-Match': etag}).status_code == 200
+
+def test_reminder_bookkeeping_keeps_the_version(logged_in_facilities, app):
+    client = logged_in_facilities
+    client.post('/portaria/register', data={'type': 'Caixa', 'tracking_code': 'VER-4', 'sender': 'Loja'})
+    before = _version(client)
+    with app.app_context():
+        db = get_db()
+        item_ids = [r[0] for r in db.execute("SELECT id FROM items WHERE unit_id = 1")]
+        # Só last_notified_at/next_reminder_at mudam: nada visível nas páginas
+        reschedule(db, item_ids, '2031-01-01 00:00:00')
+        mark_notified(db, item_ids, '2031-01-02 00:00:00')
+        db.commit()
+    assert _version(client) == before
+
+    client.post(f'/facilities/collect/{item_ids[0]}')
+    assert _version(client) > before
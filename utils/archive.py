@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+# Arquivamento hot/cold: itens em status final (entregues, devolvidos, extraviados) há mais de
+# ARCHIVE_AFTER_DAYS saem de items/movements/proofs e vão para as tabelas *_archive (mesmas
+# colunas + archived_at, mesmos ids). As tabelas quentes ficam só com o que está em andamento
+# e cabem no cache; histórico, linha do tempo do item, comprovantes e exportações leem as duas
+# camadas. O índice de busca (items_fts) continua cobrindo os arquivados.
+TERMINAL_STATUSES = ('ENTREGUE', 'DEVOLVIDO', 'EXTRAVIADO')
+ARCHIVE_BATCH_SIZE = 500
+
+HOT = {'items': 'items', 'movements': 'movements', 'proofs': 'proofs'}
+COLD = {'items': 'items_archive', 'movements': 'movements_archive', 'proofs': 'proofs_archive'}
+TIERS = (HOT, COLD)
+
+# tabela -> coluna com o id do item
+_ITEM_KEY = {'items': 'id', 'movements': 'item_id', 'proofs': 'item_id'}
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+def _ts(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def tier_queries(template):
+    """A query `template` (com {items}, {movements}, {proofs}) para a camada quente e a arquivada"""
+    return [template.format(**tier) for tier in TIERS]
+
+def find_in_tiers(db, template, params):
+    """Primeira linha encontrada, olhando a camada quente antes da arquivada; (linha, camada) ou (None, None)"""
+    for tier in TIERS:
+        row = db.execute(template.format(**tier), params).fetchone()
+        if row:
+            return row, tier
+    return None, None
+
+def _shared_columns(db, source, target):
+    target_columns = {row[1] for row in db.execute(f"PRAGMA table_info({target})").fetchall()}
+    return [row[1] for row in db.execute(f"PRAGMA table_info({source})").fetchall() if row[1] in target_columns]
+
+def _move(db, item_ids, source, target):
+    """Copia os itens (com movimentações e comprovante) de uma camada para a outra e apaga da origem"""
+    marks = ', '.join('?' for _ in item_ids)
+    for name in ('items', 'movements', 'proofs'):
+        columns = ', '.join(_shared_columns(db, source[name], target[name]))
+        db.execute(
+            f"INSERT INTO {target[name]} ({columns}) SELECT {columns} FROM {source[name]} "
+            f"WHERE {_ITEM_KEY[name]} IN ({marks})", item_ids
+        )
+    for name in ('proofs', 'movements', 'items'):
+        db.execute(f"DELETE FROM {source[name]} WHERE {_ITEM_KEY[name]} IN ({marks})", item_ids)
+
+def _index_archived(db, item_ids):
+    # O trigger de DELETE em items tira o item do items_fts; o arquivado continua pesquisável
+    marks = ', '.join('?' for _ in item_ids)
+    db.execute(
+        "INSERT INTO items_fts (rowid, internal_id, tracking_code, sender, recipient, received_by_name, unit_key) "
+        "SELECT i.id, i.internal_id, i.tracking_code, i.sender, "
+        "       COALESCE(i.recipient_email, '') || ' ' || COALESCE(i.recipient_name_manual, ''), "
+        "       p.received_by_name, 'u' || COALESCE(i.unit_id, 0) "
+        f"FROM items_archive i LEFT JOIN proofs_archive p ON p.item_id = i.id WHERE i.id IN ({marks})", item_ids
+    )
+
+def archive_items(db, older_than_days, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Arquiva itens finalizados há mais de `older_than_days`, em lotes com commit por lote; devolve o total"""
+    cutoff = _ts((now or _utcnow()) - timedelta(days=older_than_days))
+    marks = ', '.join('?' for _ in TERMINAL_STATUSES)
+    total = 0
+    while True:
+        item_ids = [row[0] for row in db.execute(
+            f"SELECT id FROM items WHERE status IN ({marks}) AND updated_at <= ? ORDER BY id LIMIT ?",
+            (*TERMINAL_STATUSES, cutoff, batch_size)
+        ).fetchall()]
+        if not item_ids:
+            return total
+        _move(db, item_ids, HOT, COLD)
+        _index_archived(db, item_ids)
+        db.commit()
+        total += len(item_ids)
+
+def restore_item(db, item_id):
+    """Traz um item arquivado de volta para as tabelas quentes (ex.: recuperação de extravio); sem commit"""
+    if not db.execute("SELECT 1 FROM items_archive WHERE id = ?", (item_id,)).fetchone():
+        return False
+    # O INSERT em items recria a linha do items_fts pelos triggers
+    db.execute("DELETE FROM items_fts WHERE rowid = ?", (item_id,))
+    _move(db, [item_id], COLD, HOT)
+    return True
+
+def archive_stats(db):
+    """Quantidade de itens em cada camada"""
+    return {name: db.execute(f"SELECT COUNT(*) FROM {tier['items']}").fetchone()[0]
+            for name, tier in (('hot', HOT), ('archived', COLD))}
+
+def init_app(app):
+    import click
+
+    @app.cli.command('archive-items')
+    @click.option('--older-than-days', type=int, default=None, help='Idade mínima (dias desde a finalização).')
+    @click.option('--batch-size', type=int, default=None, help='Itens por lote/commit.')
+    def archive_items_command(older_than_days, batch_size):
+        """Move itens finalizados antigos para as tabelas de arquivo"""
+        from utils.db import get_db
+        days = older_than_days if older_than_days is not None else app.config.get('ARCHIVE_AFTER_DAYS', 365)
+        batch_size = batch_size or app.config.get('ARCHIVE_BATCH_SIZE', ARCHIVE_BATCH_SIZE)
+        db = get_db()
+        archived = archive_items(db, days, batch_size)
+        if archived:
+            # Tabelas quentes encolheram: atualiza as estatísticas do planejador
+            db.execute("PRAGMA optimize")
+        stats = archive_stats(db)
+        print(f"📦 {archived} item(ns) arquivado(s) (finalizados há mais de {days} dias). "
+              f"Ativos: {stats['hot']} | Arquivados: {stats['archived']}")
@@ -20,6 +20,10 @@ def role_required(roles):
         return decorated_function
     return decorator
 
+def wants_json():
+    """O cliente prefere JSON a HTML (fetch com Accept: application/json); navegador e formulário recebem HTML"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
 def enforce_password_change_logic():
     if 'user_id' in session and session.get('must_change_password'):
         if request.endpoint not in ('auth.change_password', 'auth.logout', 'static'):
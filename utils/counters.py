@@ -0,0 +1,70 @@
+# Contadores por (unidade, status) mantidos pelos triggers trg_items_count_* do schema.sql.
+# Ler daqui é O(1); recontar em items é O(n) e só acontece no rebuild/verify.
+# Itens arquivados (items_archive) continuam contados: o arquivo não muda os totais por status.
+DASHBOARD_STATUSES = {
+    'in_portaria': 'RECEBIDO_PORTARIA',
+    'in_facilities': 'EM_FACILITIES',
+    'ready': 'DISPONIVEL_PARA_RETIRADA',
+}
+
+def get_status_counts(db, unit_id):
+    """Dict status -> quantidade de itens da unidade"""
+    rows = db.execute(
+        "SELECT status, count FROM item_status_counts WHERE unit_id = ?", (unit_id or 0,)
+    ).fetchall()
+    return {row['status']: row['count'] for row in rows}
+
+def get_dashboard_stats(db, unit_id):
+    """Cards do dashboard de Facilities (chaves usadas pelo template)"""
+    counts = get_status_counts(db, unit_id)
+    return {key: counts.get(status, 0) for key, status in DASHBOARD_STATUSES.items()}
+
+def _actual_counts(db):
+    rows = db.execute(
+        "SELECT COALESCE(unit_id, 0) AS unit_id, status, COUNT(*) AS count "
+        "FROM (SELECT unit_id, status FROM items UNION ALL SELECT unit_id, status FROM items_archive) GROUP BY 1, 2"
+    ).fetchall()
+    return {(row['unit_id'], row['status']): row['count'] for row in rows}
+
+def verify_counters(db):
+    """Lista de divergências (unit_id, status, contador, real) entre a tabela e items (+ arquivo)"""
+    actual = _actual_counts(db)
+    stored = {
+        (row['unit_id'], row['status']): row['count']
+        for row in db.execute("SELECT unit_id, status, count FROM item_status_counts").fetchall()
+    }
+    mismatches = []
+    for key in sorted(set(actual) | set(stored), key=lambda k: (k[0], k[1])):
+        if actual.get(key, 0) != stored.get(key, 0):
+            mismatches.append((key[0], key[1], stored.get(key, 0), actual.get(key, 0)))
+    return mismatches
+
+def rebuild_counters(db):
+    """Recalcula todos os contadores a partir de items e items_archive (transação única)"""
+    db.execute("DELETE FROM item_status_counts")
+    db.execute(
+        "INSERT INTO item_status_counts (unit_id, status, count) "
+        "SELECT COALESCE(unit_id, 0), status, COUNT(*) "
+        "FROM (SELECT unit_id, status FROM items UNION ALL SELECT unit_id, status FROM items_archive) GROUP BY 1, 2"
+    )
+    db.commit()
+
+def init_app(app):
+    @app.cli.command('counters-verify')
+    def counters_verify_command():
+        """Compara os contadores materializados com uma contagem real em items"""
+        from utils.db import get_db
+        mismatches = verify_counters(get_db())
+        if not mismatches:
+            print("✅ Contadores consistentes.")
+            return
+        for unit_id, status, stored, actual in mismatches:
+            print(f"❌ Unidade {unit_id} / {status}: contador={stored}, real={actual}")
+        raise SystemExit(1)
+
+    @app.cli.command('counters-rebuild')
+    def counters_rebuild_command():
+        """Recalcula a tabela item_status_counts a partir de items"""
+        from utils.db import get_db
+        rebuild_counters(get_db())
+        print("✅ Contadores recalculados.")
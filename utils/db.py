@@ -1,28 +1,168 @@
 import sqlite3
 import os
+import threading
 from flask import g, current_app
+from utils.pool import ConnectionPool
+
+_pool_lock = threading.Lock()
+
+# Perfis de PRAGMA aplicados a cada conexão SQLite nova (DATABASE_PROFILE no .env).
+# foreign_keys fica OFF por padrão: items.recipient_email também guarda nomes de grupos
+# e e-mails externos, que não existem em users.
+SQLITE_PROFILES = {
+    # Comportamento anterior: apenas os padrões do SQLite
+    'legacy': {},
+    # Leitores concorrentes não bloqueiam o escritor (vários workers do gunicorn)
+    'concurrent': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'OFF',
+    },
+    # WAL com fsync a cada commit (servidores sem nobreak / disco instável)
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 10000,
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'OFF',
+    },
+}
+
+SQLITE_TUNABLE_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size',
+                          'mmap_size', 'temp_store', 'foreign_keys')
+
+def sqlite_pragmas(profile='concurrent', overrides=''):
+    """Resolve o perfil + overrides ("cache_size=-64000,synchronous=FULL") em um dict de PRAGMAs"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil de banco desconhecido: '{profile}'. Opções: {', '.join(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+
+    for part in (overrides or '').split(','):
+        if not part.strip():
+            continue
+        name, _, value = part.partition('=')
+        name, value = name.strip().lower(), value.strip()
+        if name not in SQLITE_TUNABLE_PRAGMAS or not value or not value.lstrip('-').replace('_', '').isalnum():
+            raise ValueError(f"PRAGMA inválido em SQLITE_PRAGMAS: '{part.strip()}'")
+        pragmas[name] = value
+    return pragmas
+
+def _apply_pragmas(conn, pragmas):
+    # journal_mode primeiro: os demais podem depender dele (ex: synchronous=NORMAL com WAL)
+    for name in sorted(pragmas, key=lambda n: n != 'journal_mode'):
+        conn.execute(f"PRAGMA {name} = {pragmas[name]}").fetchall()
+
+def _is_postgres(db_url):
+    return db_url.startswith('postgresql://') or db_url.startswith('postgres://')
+
+def _sqlite_path(db_url, root_path):
+    path = db_url.replace('sqlite:///', '')
+    # Se não for um caminho absoluto e não começar com ./ ou ../, assume que é relativo à raiz
+    if not os.path.isabs(path) and not path.startswith('.'):
+        path = os.path.join(root_path, path)
+    return path
+
+def _connection_factory(db_url, root_path, pooled, pragmas=None):
+    """Retorna uma função que abre uma conexão nova para o banco configurado"""
+    if _is_postgres(db_url):
+        def connect():
+            import psycopg2
+            from psycopg2.extras import DictCursor
+            return psycopg2.connect(db_url, cursor_factory=DictCursor)
+    else:
+        path = _sqlite_path(db_url, root_path)
+
+        def connect():
+            # Conexões do pool podem ser usadas por threads diferentes (uma por vez)
+            conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=not pooled)
+            conn.row_factory = sqlite3.Row
+            if pragmas:
+                _apply_pragmas(conn, pragmas)
+            return conn
+    return connect
+
+def _app_pragmas(app):
+    return sqlite_pragmas(app.config.get('DATABASE_PROFILE', 'concurrent'), app.config.get('SQLITE_PRAGMAS', ''))
+
+_PRAGMA_NAMES = {
+    'synchronous': {'off': '0', 'normal': '1', 'full': '2', 'extra': '3'},
+    'temp_store': {'default': '0', 'file': '1', 'memory': '2'},
+    'foreign_keys': {'off': '0', 'on': '1'},
+}
+
+def _normalize_pragma(name, value):
+    """Converte o valor configurado para o formato que o SQLite devolve na leitura"""
+    value = str(value).lower()
+    return _PRAGMA_NAMES.get(name, {}).get(value, value)
+
+def _ping(conn):
+    if getattr(conn, 'closed', 0):
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT 1')
+        cur.fetchone()
+    finally:
+        cur.close()
+    return True
+
+def get_pool(app=None):
+    """Pool de conexões do processo atual (criado sob demanda); None se desativado"""
+    app = app or current_app._get_current_object()
+    if not app.config.get('DB_POOL_ENABLED', True):
+        return None
+
+    db_url = app.config['DATABASE']
+    entry = app.extensions.get('db_pool')
+    if entry is not None and entry[0] == db_url and entry[2] == os.getpid():
+        return entry[1]
+
+    with _pool_lock:
+        entry = app.extensions.get('db_pool')
+        if entry is not None and entry[0] == db_url and entry[2] == os.getpid():
+            return entry[1]
+        if entry is not None and entry[2] == os.getpid():
+            # DATABASE mudou (ex: testes): descarta o pool antigo
+            entry[1].close()
+
+        pool = ConnectionPool(
+            _connection_factory(db_url, app.root_path, pooled=True, pragmas=_app_pragmas(app)),
+            ping=_ping,
+            min_size=app.config.get('DB_POOL_MIN_SIZE', 0),
+            max_size=app.config.get('DB_POOL_MAX_SIZE', 10),
+            timeout=app.config.get('DB_POOL_TIMEOUT', 30.0),
+            recycle_uses=app.config.get('DB_POOL_RECYCLE_USES', 0),
+            idle_timeout=app.config.get('DB_POOL_IDLE_TIMEOUT', 0.0),
+        )
+        app.extensions['db_pool'] = (db_url, pool, os.getpid())
+        return pool
+
+def close_pool(app=None):
+    """Fecha o pool do processo atual (usado no shutdown e nos testes)"""
+    app = app or current_app._get_current_object()
+    entry = app.extensions.pop('db_pool', None)
+    if entry is not None and entry[2] == os.getpid():
+        entry[1].close()
 
 def get_db():
     if 'db' not in g:
         db_url = current_app.config['DATABASE']
-        
-        if db_url.startswith('postgresql://') or db_url.startswith('postgres://'):
-            import psycopg2
-            from psycopg2.extras import DictCursor
-            g.db_type = 'postgres'
-            conn = psycopg2.connect(db_url, cursor_factory=DictCursor)
-            g.db = conn
+        g.db_type = 'postgres' if _is_postgres(db_url) else 'sqlite'
+
+        pool = get_pool()
+        if pool is None:
+            app = current_app._get_current_object()
+            g.db = _connection_factory(db_url, app.root_path, pooled=False, pragmas=_app_pragmas(app))()
         else:
-            # Assume SQLite
-            g.db_type = 'sqlite'
-            path = db_url.replace('sqlite:///', '')
-            # Se não for um caminho absoluto e não começar com ./ ou ../, assume que é relativo à raiz
-            if not os.path.isabs(path) and not path.startswith('.'):
-                path = os.path.join(current_app.root_path, path)
-                
-            conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
-            conn.row_factory = sqlite3.Row
-            g.db = conn
+            g.db_pooled = pool.acquire()
+            g.db_pool = pool
+            g.db = g.db_pooled.conn
             
     return g.db
 
@@ -42,8 +182,23 @@ def query_db(query, args=(), one=False):
 
 def close_db(e=None):
     db = g.pop('db', None)
-    if db is not None:
+    pooled = g.pop('db_pooled', None)
+    pool = g.pop('db_pool', None)
+    if db is None:
+        return
+
+    if pooled is None:
         db.close()
+        return
+
+    # Transações não commitadas não podem vazar para o próximo request
+    discard = False
+    try:
+        if g.get('db_type') == 'postgres' or db.in_transaction:
+            db.rollback()
+    except Exception:
+        discard = True
+    pool.release(pooled, discard=discard)
 
 def init_db():
     db = get_db()
@@ -67,6 +222,33 @@ def init_app(app):
         init_db()
         print("Banco de Dados inicializado.")
 
+    @app.cli.command('db-tune')
+    def db_tune_command():
+        """Mostra o perfil de performance do SQLite e os PRAGMAs efetivos da conexão"""
+        db = get_db()
+        if g.get('db_type') != 'sqlite':
+            print("db-tune se aplica apenas ao SQLite.")
+            return
+
+        profile = current_app.config.get('DATABASE_PROFILE', 'concurrent')
+        expected = _app_pragmas(current_app)
+        print(f"Perfil: {profile}")
+        print(f"Arquivo: {db.execute('PRAGMA database_list').fetchone()['file']}")
+        print("")
+        for name in SQLITE_TUNABLE_PRAGMAS:
+            value = db.execute(f"PRAGMA {name}").fetchone()[0]
+            wanted = expected.get(name)
+            flag = ''
+            if wanted is not None and str(value).lower() != _normalize_pragma(name, wanted):
+                flag = f"  (esperado: {wanted})"
+            print(f"{name:<14} {value}{flag}")
+
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        page_count = db.execute("PRAGMA page_count").fetchone()[0]
+        freelist = db.execute("PRAGMA freelist_count").fetchone()[0]
+        print("")
+        print(f"Tamanho: {page_size * page_count / 1024 / 1024:.1f} MB ({page_count} páginas de {page_size} bytes, {freelist} livres)")
+
     @app.cli.command('create-admin')
     def create_admin_command():
         _create_admin_logic()
@@ -154,8 +336,10 @@ def init_app(app):
     @app.cli.command('test-email')
     def test_email_command():
         import click
-        from utils.notifications import send_collection_alert
+        from flask_mail import Message
+        from utils.notifications import collection_alert_message
         from flask import current_app
+        from app import mail
         
         email = click.prompt('Digite o e-mail de teste')
         username = current_app.config.get('MAIL_USERNAME', '').strip()
@@ -175,7 +359,12 @@ def init_app(app):
         current_app.config['MAIL_USERNAME'] = username
         current_app.config['MAIL_PASSWORD'] = password
         
-        if send_collection_alert(email, "TEST-123", "ENVELOPE/TESTE"):
+        # Envio direto (sem passar pela outbox) para o erro do SMTP aparecer aqui
+        try:
+            with current_app.test_request_context():
+                subject, body = collection_alert_message("TEST-123", "ENVELOPE/TESTE")
+            mail.send(Message(subject=subject, recipients=[email], body=body))
             print("E-mail enviado com sucesso!")
-        else:
+        except Exception as e:
+            print(f"Falha no envio: {e}")
             print(f"Falha na autenticação. Verifique se a Senha de App foi gerada corretamente.")
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import signal
+import socket
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from .exports import EXPORTS, export_query, export_count, export_rows, csv_chunks, gzip_chunks, write_xlsx
+
+# Exportações em segundo plano (tabela export_jobs).
+# O request só registra o job; o processo `flask exports-worker` gera o arquivo no spool
+# e o usuário baixa quando fica pronto. Quantos jobs rodam ao mesmo tempo é limitado no banco
+# (EXPORT_MAX_RUNNING), valendo para todos os workers juntos.
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+
+# formato -> (extensão, mimetype)
+FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+FILTER_KEYS = ('q', 'start_date', 'end_date')
+PROGRESS_EVERY = 500
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+def _ts(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def get_spool_dir(app=None):
+    app = app or current_app
+    root = app.config.get('EXPORT_SPOOL_DIR', 'exports')
+    if not os.path.isabs(root):
+        root = os.path.join(app.root_path, root)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def job_path(spool_dir, job):
+    return os.path.join(spool_dir, f"export-{job['id']}{FORMATS[job['format']][0]}")
+
+def download_name(job):
+    return f"{EXPORTS[job['kind']].filename}{FORMATS[job['format']][0]}"
+
+def enqueue_export(db, kind, fmt, unit_id, user_id, args, max_active=3):
+    """Registra o job e devolve o id; ValueError se o relatório/formato não existe ou o usuário já tem jobs demais"""
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise ValueError("Relatório ou formato de exportação inválido.")
+    active = db.execute(
+        "SELECT COUNT(*) FROM export_jobs WHERE requested_by = ? AND status IN (?, ?)", (user_id, PENDING, RUNNING)
+    ).fetchone()[0]
+    if active >= max_active:
+        raise ValueError(f"Você já tem {active} exportação(ões) em andamento. Aguarde terminarem.")
+
+    filters = {key: args.get(key) for key in FILTER_KEYS if args.get(key)}
+    cur = db.execute(
+        "INSERT INTO export_jobs (kind, format, filters, unit_id, requested_by) VALUES (?, ?, ?, ?, ?)",
+        (kind, fmt, json.dumps(filters), unit_id, user_id)
+    )
+    db.commit()
+    return cur.lastrowid
+
+def get_job(db, job_id, user_id):
+    """Job do usuário (ninguém vê ou baixa a exportação de outro)"""
+    return db.execute("SELECT * FROM export_jobs WHERE id = ? AND requested_by = ?", (job_id, user_id)).fetchone()
+
+def list_jobs(db, user_id, limit=20):
+    return db.execute(
+        "SELECT * FROM export_jobs WHERE requested_by = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+    ).fetchall()
+
+def job_status(job):
+    """Resumo serializável do job (polling da tela de exportações)"""
+    total = job['total_rows']
+    if job['status'] == DONE:
+        percent = 100
+    elif total:
+        percent = min(99, int(job['rows_written'] * 100 / total))
+    else:
+        percent = 0
+    return {'id': job['id'], 'kind': job['kind'], 'format': job['format'], 'status': job['status'],
+            'rows_written': job['rows_written'], 'total_rows': total, 'percent': percent, 'error': job['error']}
+
+class ExportWorker:
+    """Processa a export_jobs um job por vez; uma instância por processo worker"""
+
+    def __init__(self, app, max_running=2, lease_seconds=300, retention_hours=24):
+        self.app = app
+        self.max_running = max(1, max_running)
+        self.lease_seconds = lease_seconds
+        self.retention_hours = retention_hours
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        self.metrics = {'done': 0, 'failed': 0, 'rows': 0, 'reclaimed': 0, 'purged': 0}
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            max_running=app.config.get('EXPORT_MAX_RUNNING', 2),
+            lease_seconds=app.config.get('EXPORT_LEASE_SECONDS', 300),
+            retention_hours=app.config.get('EXPORT_RETENTION_HOURS', 24),
+        )
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def claim(self, db):
+        """Reserva o job pendente mais antigo, se houver vaga abaixo de max_running"""
+        now = _utcnow()
+        # Job preso em RUNNING sem sinal de vida (worker morreu) volta para a fila
+        reclaimed = db.execute(
+            "UPDATE export_jobs SET status = ?, locked_by = NULL WHERE status = ? AND locked_at <= ?",
+            (PENDING, RUNNING, _ts(now - timedelta(seconds=self.lease_seconds)))
+        ).rowcount
+        self.metrics['reclaimed'] += max(reclaimed, 0)
+
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.execute(
+            "UPDATE export_jobs SET status = ?, locked_by = ?, locked_at = ?, rows_written = 0 "
+            "WHERE id = (SELECT id FROM export_jobs WHERE status = ? ORDER BY id LIMIT 1) "
+            "AND (SELECT COUNT(*) FROM export_jobs WHERE status = ?) < ?",
+            (RUNNING, token, _ts(now), PENDING, RUNNING, self.max_running)
+        )
+        db.commit()
+        return db.execute("SELECT * FROM export_jobs WHERE locked_by = ? AND status = ?", (token, RUNNING)).fetchone()
+
+    def _tracked(self, db, job_id, rows, progress):
+        # Progresso (e renovação do lease) a cada PROGRESS_EVERY linhas
+        for row in rows:
+            yield row
+            progress['rows'] += 1
+            if progress['rows'] % PROGRESS_EVERY == 0:
+                db.execute("UPDATE export_jobs SET rows_written = ?, locked_at = ? WHERE id = ?",
+                           (progress['rows'], _ts(_utcnow()), job_id))
+                db.commit()
+
+    def execute(self, db, job):
+        """Gera o arquivo do job no spool (escreve em .part e renomeia no final)"""
+        path = job_path(get_spool_dir(self.app), job)
+        tmp_path = f"{path}.part"
+        try:
+            spec, sources = export_query(job['kind'], job['unit_id'], json.loads(job['filters'] or '{}'))
+            total = export_count(db, sources)
+            db.execute("UPDATE export_jobs SET total_rows = ? WHERE id = ?", (total, job['id']))
+            db.commit()
+
+            progress = {'rows': 0}
+            rows = self._tracked(db, job['id'], export_rows(db, spec, sources), progress)
+            with open(tmp_path, 'wb') as f:
+                if job['format'] == 'xlsx':
+                    write_xlsx(f, spec.header, rows, spec.format_row)
+                else:
+                    chunks = csv_chunks(spec.header, rows, spec.format_row)
+                    if job['format'] == 'csv.gz':
+                        chunks = gzip_chunks(chunks)
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+
+            db.execute(
+                "UPDATE export_jobs SET status = ?, rows_written = ?, file_name = ?, locked_by = NULL, finished_at = ? "
+                "WHERE id = ?",
+                (DONE, progress['rows'], os.path.basename(path), _ts(_utcnow()), job['id'])
+            )
+            db.commit()
+            self.metrics['done'] += 1
+            self.metrics['rows'] += progress['rows']
+        except Exception as e:
+            logging.exception(f"Falha na exportação {job['id']}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            db.rollback()
+            db.execute(
+                "UPDATE export_jobs SET status = ?, error = ?, locked_by = NULL, finished_at = ? WHERE id = ?",
+                (FAILED, str(e)[:500], _ts(_utcnow()), job['id'])
+            )
+            db.commit()
+            self.metrics['failed'] += 1
+
+    def purge_expired(self, db):
+        """Apaga arquivos e registros de jobs terminados há mais de retention_hours"""
+        cutoff = _ts(_utcnow() - timedelta(hours=self.retention_hours))
+        expired = db.execute(
+            "SELECT id, file_name FROM export_jobs WHERE status IN (?, ?) AND finished_at <= ?", (DONE, FAILED, cutoff)
+        ).fetchall()
+        if not expired:
+            return 0
+        spool_dir = get_spool_dir(self.app)
+        for job in expired:
+            if job['file_name'] and os.path.exists(os.path.join(spool_dir, job['file_name'])):
+                os.unlink(os.path.join(spool_dir, job['file_name']))
+        db.execute(f"DELETE FROM export_jobs WHERE id IN ({', '.join('?' for _ in expired)})", [j['id'] for j in expired])
+        db.commit()
+        self.metrics['purged'] += len(expired)
+        return len(expired)
+
+    def run_once(self, db):
+        """Processa um job; devolve False se não havia nada (ou nenhuma vaga)"""
+        job = self.claim(db)
+        if job is None:
+            return False
+        self.execute(db, job)
+        return True
+
+    def run(self, db, poll_interval=2, once=False):
+        while not self._stopping:
+            if self.run_once(db):
+                continue
+            self.purge_expired(db)
+            if once:
+                break
+            time.sleep(poll_interval)
+        return self.metrics
+
+def init_app(app):
+    import click
+
+    @app.cli.command('exports-worker')
+    @click.option('--poll-interval', type=float, default=None, help='Segundos de espera com a fila vazia.')
+    @click.option('--once', is_flag=True, help='Processa os jobs pendentes e sai.')
+    def exports_worker_command(poll_interval, once):
+        """Gera os arquivos das exportações em segundo plano"""
+        from utils.db import get_db
+        worker = ExportWorker.from_config(app)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        interval = poll_interval if poll_interval is not None else app.config.get('EXPORT_POLL_INTERVAL', 2)
+
+        print(f"📊 Worker de exportações iniciado ({worker.worker_id}, até {worker.max_running} simultâneas).")
+        metrics = worker.run(get_db(), poll_interval=interval, once=once)
+        print(f"Concluídas: {metrics['done']} | Falhas: {metrics['failed']} | Linhas: {metrics['rows']} | "
+              f"Recuperadas: {metrics['reclaimed']} | Expiradas removidas: {metrics['purged']}")
@@ -0,0 +1,247 @@
+import io
+import re
+import csv
+import zlib
+import heapq
+import zipfile
+from xml.sax.saxutils import escape
+from collections import namedtuple
+from flask import Response, g, stream_with_context
+from .search import search_filter
+from .timezones import unit_timezone, parse_day, day_start, day_range
+from .archive import tier_queries
+
+# Exportações CSV em streaming: o cursor é lido em blocos (fetchmany / cursor nomeado no
+# Postgres) e cada bloco vira um pedaço da resposta, então a memória do worker não cresce
+# com o tamanho do relatório e o primeiro byte sai logo.
+EXPORT_CHUNK_ROWS = 500
+
+def history_filters(args, date_column, unit_id=None):
+    """Filtros do histórico (q, start_date, end_date) como trecho de WHERE e parâmetros"""
+    # Busca livre pelo índice de texto (prefixo por termo), não por LIKE '%termo%'
+    sql, params = search_filter(args.get('q'), unit_id)
+
+    # Datas no fuso da unidade viram faixa de timestamps: a coluna fica "nua" e o índice é usado
+    start_date, end_date = parse_day(args.get('start_date')), parse_day(args.get('end_date'))
+    if start_date or end_date:
+        from .db import get_db
+        tz = unit_timezone(get_db(), unit_id)
+        if start_date:
+            sql += f" AND {date_column} >= ?"
+            params.append(day_start(start_date, tz))
+        if end_date:
+            sql += f" AND {date_column} < ?"
+            params.append(day_range(end_date, tz)[1])
+    return sql, params
+
+def _format_datetime(value):
+    return value.strftime('%d/%m/%Y %H:%M:%S') if value else ''
+
+# Relatórios exportáveis: a mesma definição serve o download direto e os jobs em segundo plano.
+# `query` usa {items}/{proofs} e roda em cada camada (ativa e arquivo) ordenada por `order`,
+# que precisa seguir um índice: cada camada sai em streaming, sem ordenação em tabela temporária,
+# e as duas são intercaladas em Python (export_rows).
+ExportSpec = namedtuple('ExportSpec', 'filename query order descending date_column header format_row')
+
+EXPORTS = {
+    'history': ExportSpec(
+        filename='relatorio_entregas',
+        query="""
+            SELECT i.internal_id, i.tracking_code, i.type, i.sender, i.recipient_email, i.recipient_name_manual,
+                   i.location, p.received_by_name, u.full_name as deliverer_name, p.delivered_at
+            FROM {proofs} p
+            CROSS JOIN {items} i
+            LEFT JOIN users u ON p.delivered_by = u.id
+            WHERE i.id = p.item_id AND i.status = 'ENTREGUE' AND i.unit_id = ?
+        """,
+        # CROSS JOIN fixa proofs como tabela externa: a leitura segue o idx_proofs_delivered_at
+        order='p.delivered_at',
+        descending=True,
+        date_column='p.delivered_at',
+        header=['ID Interno', 'Código Rastreio', 'Tipo', 'Remetente', 'Destinatário (Email)', 'Destinatário (Manual)',
+                'Local Armazenado', 'Recebido Por', 'Entregue Por', 'Data Entrega'],
+        format_row=lambda item: [
+            item['internal_id'],
+            item['tracking_code'] or '',
+            item['type'],
+            item['sender'],
+            item['recipient_email'] or '',
+            item['recipient_name_manual'] or '',
+            item['location'] or '',
+            item['received_by_name'],
+            item['deliverer_name'],
+            _format_datetime(item['delivered_at'])
+        ]
+    ),
+    # Itens que NÃO foram entregues ainda (Etapas 1, 2 e 3)
+    'panel': ExportSpec(
+        filename='painel_facilities',
+        query="""
+            SELECT i.internal_id, i.tracking_code, i.type, i.sender, i.recipient_email, i.recipient_name_manual,
+                   i.location, i.status, i.created_at
+            FROM {items} i
+            WHERE i.status != 'ENTREGUE' AND i.unit_id = ?
+        """,
+        # idx_items_unit_created
+        order='i.created_at',
+        descending=False,
+        date_column='i.created_at',
+        header=['ID Interno', 'Código Rastreio', 'Tipo', 'Remetente', 'Destinatário', 'Local', 'Status Atual', 'Data Entrada'],
+        format_row=lambda item: [
+            item['internal_id'],
+            item['tracking_code'] or '',
+            item['type'],
+            item['sender'],
+            item['recipient_email'] or item['recipient_name_manual'] or '',
+            item['location'] or '',
+            item['status'],
+            _format_datetime(item['created_at'])
+        ]
+    ),
+}
+
+def export_query(kind, unit_id, args):
+    """(spec, [(query sem ORDER BY, parâmetros)] por camada) do relatório `kind` com os filtros de `args`"""
+    spec = EXPORTS[kind]
+    filters, params = history_filters(args, spec.date_column, unit_id)
+    return spec, [(query + filters, [unit_id] + params) for query in tier_queries(spec.query)]
+
+def export_count(db, sources):
+    return sum(db.execute(f"SELECT COUNT(*) FROM ({query}) AS export_rows", params).fetchone()[0]
+               for query, params in sources)
+
+def _order_key(column):
+    # NULL antes de qualquer valor, como no ORDER BY do SQLite
+    key = column.rsplit('.', 1)[-1]
+    return lambda row: (row[key] is not None, row[key])
+
+def export_rows(db, spec, sources, chunk_size=None):
+    """Linhas do relatório na ordem de `spec.order`: uma leitura em blocos por camada, intercaladas aqui"""
+    direction = ' DESC' if spec.descending else ' ASC'
+    streams = [
+        iter_rows(db, query + f" ORDER BY {spec.order}{direction}", params, chunk_size, name=f'aeropost_export_{n}')
+        for n, (query, params) in enumerate(sources)
+    ]
+    return heapq.merge(*streams, key=_order_key(spec.order), reverse=spec.descending)
+
+def iter_rows(db, query, params=(), chunk_size=None, name='aeropost_export'):
+    """Percorre o resultado em blocos sem carregar tudo em memória"""
+    chunk_size = chunk_size or EXPORT_CHUNK_ROWS
+    if g.get('db_type') == 'postgres':
+        # Cursor nomeado = cursor do lado do servidor; sem ele o psycopg2 traz tudo no execute.
+        # withhold: o job de exportação dá commit do progresso no meio da leitura
+        cur = db.cursor(name=name, withhold=True)
+        cur.itersize = chunk_size
+        cur.execute(query.replace('?', '%s'), params)
+    else:
+        cur = db.execute(query, params)
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+def csv_chunks(header, rows, format_row, chunk_size=None):
+    """Gera o CSV (separado por ';') em pedaços de até `chunk_size` linhas"""
+    chunk_size = chunk_size or EXPORT_CHUNK_ROWS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(format_row(row))
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+def gzip_chunks(chunks):
+    """Comprime os pedaços conforme saem (formato .gz)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# XLSX mínimo (uma planilha, células inline) escrito em streaming só com a biblioteca padrão
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Relatorio" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xlsx_row(values):
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_INVALID.sub("", str(v or "")))}</t></is></c>'
+        for v in values
+    )
+    return f'<row>{cells}</row>'
+
+def write_xlsx(fileobj, header, rows, format_row, chunk_size=None):
+    """Escreve o .xlsx linha a linha; a planilha nunca fica inteira em memória"""
+    chunk_size = chunk_size or EXPORT_CHUNK_ROWS
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            pending = [_xlsx_row(header)]
+            for row in rows:
+                pending.append(_xlsx_row(format_row(row)))
+                if len(pending) >= chunk_size:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+            sheet.write((''.join(pending) + '</sheetData></worksheet>').encode('utf-8'))
+
+def stream_export(db, kind, unit_id, args):
+    """Download direto em streaming; com ?gzip=1 o arquivo é o .csv.gz"""
+    spec, sources = export_query(kind, unit_id, args)
+    chunks = csv_chunks(spec.header, export_rows(db, spec, sources), spec.format_row)
+    filename = f"{spec.filename}.csv"
+    compress = wants_gzip(args)
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+    response = Response(stream_with_context(chunks), mimetype='application/gzip' if compress else 'text/csv')
+    response.headers['Content-Disposition'] = f"attachment; filename={filename}"
+    return response
+
+def wants_gzip(args):
+    return args.get('gzip', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,111 @@
+import sys
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+from .versions import data_versions
+
+# Cache em memória (por worker) dos corpos de tabela dos painéis. A chave leva a versão dos dados
+# da unidade e a dos dados de referência: qualquer escrita muda a chave, então não há invalidação
+# explícita. Entradas de versões antigas saem pelo LRU. Dez operadores olhando a mesma unidade
+# custam uma renderização (e uma execução das queries da lista) em vez de dez.
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Quem chega enquanto outro request renderiza a mesma chave espera por ele até este limite
+RENDER_WAIT_SECONDS = 5.0
+
+class FragmentCache:
+    """LRU limitado pelo tamanho aproximado em memória do HTML guardado"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._rendering = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'oversized': 0}
+
+    def get_or_render(self, key, render):
+        """Valor guardado em `key`; senão chama `render()` (um request por chave por vez) e guarda"""
+        with self._lock:
+            entry = self._lookup(key)
+            pending = None
+            if entry is None:
+                pending = self._rendering.get(key)
+                if pending is None:
+                    self._rendering[key] = threading.Event()
+        if entry is not None:
+            return entry
+        if pending is not None:
+            pending.wait(RENDER_WAIT_SECONDS)
+            with self._lock:
+                entry = self._lookup(key, count=False)
+            if entry is not None:
+                return entry
+            return render()
+
+        try:
+            value = render()
+            self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._rendering.pop(key).set()
+
+    def _lookup(self, key, count=True):
+        # Chamado com o lock
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+        if count:
+            self._stats['misses'] += 1
+        return None
+
+    def _store(self, key, value):
+        size = sys.getsizeof(value['html'])
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats['oversized'] += 1
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes})
+        return data
+
+def get_fragment_cache(app=None):
+    """Cache do processo atual; None se FRAGMENT_CACHE_MAX_BYTES = 0"""
+    app = app or current_app._get_current_object()
+    max_bytes = app.config.get('FRAGMENT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if not max_bytes:
+        return None
+    cache = app.extensions.get('fragment_cache')
+    if cache is None or cache.max_bytes != max_bytes:
+        cache = FragmentCache(max_bytes)
+        app.extensions['fragment_cache'] = cache
+    return cache
+
+def cached_fragment(db, unit_id, name, render, variant=None):
+    """Fragmento `name` da unidade na versão atual dos dados; `variant` separa o que muda sem escrita (ex.: o dia)"""
+    cache = get_fragment_cache()
+    if cache is None or not unit_id:
+        return render()
+    unit_version, reference_version = data_versions(db, unit_id)
+    # script_root entra na chave: as URLs das linhas dependem do prefixo do proxy
+    key = (unit_id, name, unit_version, reference_version, request.script_root, variant)
+    return cache.get_or_render(key, render)
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from flask import Response, current_app, g
+
+# Feed ao vivo dos painéis (Server-Sent Events). Cada movimentação gravada em `movements` é um
+# evento do ciclo de vida do item; um único thread por worker lê as novas pelo id (PK, sem
+# SCAN) a cada LIVE_POLL_INTERVAL segundos e distribui para as conexões abertas da unidade.
+# Como a fonte é a própria tabela, vale para escritas de qualquer worker e de qualquer processo,
+# e o navegador retoma de onde parou pelo Last-Event-ID.
+LIVE_EVENTS = (
+    ('REGISTER_PORTARIA', 'registered'),
+    ('COLLECT_FROM_PORTARIA', 'collected'),
+    ('ALLOCATED', 'allocated'),
+    ('LOCATION_CHANGED_TO', 'allocated'),
+    ('DELIVERED', 'delivered'),
+    ('RECORDED_OCCURRENCE', 'occurrence'),
+    ('RECOVERED_ITEM', 'occurrence'),
+)
+POLL_BATCH = 500
+QUEUE_SIZE = 200
+# No Postgres ids de sequence podem ser confirmados fora de ordem: relê uma janela já vista
+POSTGRES_OVERLAP = 50
+
+def event_kind(action):
+    """Tipo do evento a partir da ação gravada em movements; None se não interessa ao painel"""
+    for prefix, kind in LIVE_EVENTS:
+        if action.startswith(prefix):
+            return kind
+    return None
+
+def fetch_events(db, after_id, unit_id=None, limit=POLL_BATCH):
+    """Eventos com id > `after_id` (de uma unidade ou de todas), na ordem em que foram gravados"""
+    query = (
+        "SELECT m.id, m.item_id, m.action, m.unit_id, i.internal_id, i.status "
+        "FROM movements m LEFT JOIN items i ON i.id = m.item_id WHERE m.id > ?"
+    )
+    params = [after_id]
+    if unit_id is not None:
+        query += " AND m.unit_id = ?"
+        params.append(unit_id)
+    rows = db.execute(query + " ORDER BY m.id LIMIT ?", params + [limit]).fetchall()
+    events = []
+    for row in rows:
+        kind = event_kind(row['action'])
+        if kind:
+            events.append({'id': row['id'], 'unit_id': row['unit_id'], 'item_id': row['item_id'],
+                           'internal_id': row['internal_id'], 'status': row['status'], 'kind': kind})
+    return events, (rows[-1]['id'] if rows else after_id), len(rows) == limit
+
+def latest_event_id(db):
+    """Id da última movimentação: a página renderizada agora pede o feed a partir dele"""
+    return db.execute("SELECT COALESCE(MAX(id), 0) FROM movements").fetchone()[0]
+
+def format_event(event):
+    """Evento no formato text/event-stream"""
+    return f"id: {event['id']}\nevent: {event.get('type', 'item')}\ndata: {json.dumps(event)}\n\n"
+
+class ChangeBus:
+    """Distribui os eventos lidos do banco para as filas das conexões abertas, por unidade"""
+
+    def __init__(self, app):
+        self.app = app
+        self.last_id = None
+        self._subscribers = {}
+        self._seen = deque(maxlen=POSTGRES_OVERLAP * 4)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, db, unit_id):
+        subscriber = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            if self.last_id is None:
+                # Começa do agora: o anterior já está na página ou vem pelo Last-Event-ID
+                self.last_id = latest_event_id(db)
+            self._subscribers.setdefault(unit_id, set()).add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, unit_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(unit_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(unit_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event['unit_id'], ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Conexão parada (aba em segundo plano): em vez de crescer sem limite, pede recarga
+                _drain(subscriber)
+                subscriber.put_nowait({'id': event['id'], 'unit_id': event['unit_id'], 'type': 'reload'})
+
+    def poll_once(self, db):
+        """Lê o que foi gravado desde a última leitura e publica; devolve quantos eventos saíram"""
+        if self.last_id is None:
+            return 0
+        overlap = POSTGRES_OVERLAP if g.get('db_type') == 'postgres' else 0
+        published = 0
+        while True:
+            events, last_id, more = fetch_events(db, max(self.last_id - overlap, 0))
+            for event in events:
+                if event['id'] in self._seen:
+                    continue
+                self._seen.append(event['id'])
+                self.publish(event)
+                published += 1
+            self.last_id = max(self.last_id, last_id)
+            if not more:
+                return published
+
+    def _run(self):
+        interval = self.app.config.get('LIVE_POLL_INTERVAL', 1.0)
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Ninguém ouvindo: para de consultar; a próxima conexão recomeça do agora
+                    self._thread, self.last_id = None, None
+                    return
+            try:
+                with self.app.app_context():
+                    from .db import get_db
+                    self.poll_once(get_db())
+            except Exception as e:
+                self.app.logger.warning(f"Feed ao vivo: falha ao ler movimentações ({e})")
+            time.sleep(interval)
+
+def _drain(subscriber):
+    try:
+        while True:
+            subscriber.get_nowait()
+    except queue.Empty:
+        pass
+
+def get_bus(app=None):
+    """Barramento do processo atual (um por worker do gunicorn)"""
+    app = app or current_app._get_current_object()
+    entry = app.extensions.get('live_bus')
+    if entry is None or entry[1] != os.getpid():
+        entry = (ChangeBus(app), os.getpid())
+        app.extensions['live_bus'] = entry
+    return entry[0]
+
+def event_stream(db, unit_id, last_event_id=None):
+    """Resposta text/event-stream da unidade; retoma depois de `last_event_id` se informado"""
+    app = current_app._get_current_object()
+    bus = get_bus(app)
+    subscriber = bus.subscribe(db, unit_id)
+
+    # Reconexão: o que foi gravado enquanto a conexão estava fechada vem do banco
+    missed, sent = [], None
+    if last_event_id and str(last_event_id).isdigit():
+        sent = int(last_event_id)
+        missed, _, more = fetch_events(db, sent, unit_id)
+        if more:
+            # Ficou fora tempo demais: mais barato recarregar a página do que reaplicar tudo
+            missed = [{'id': sent, 'unit_id': unit_id, 'type': 'reload'}]
+
+    heartbeat = app.config.get('LIVE_HEARTBEAT_SECONDS', 15)
+    duration = app.config.get('LIVE_STREAM_SECONDS', 300)
+
+    def generate():
+        last_sent = sent or 0
+        # O navegador reconecta sozinho (com Last-Event-ID) quando o stream termina
+        yield "retry: 3000\n\n"
+        for event in missed:
+            last_sent = event['id']
+            yield format_event(event)
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            try:
+                event = subscriber.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if event['id'] <= last_sent and event.get('type') != 'reload':
+                continue
+            last_sent = max(last_sent, event['id'])
+            yield format_event(event)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    # Sai do barramento quando a conexão fecha (fim do stream ou cliente desconectado)
+    response.call_on_close(lambda: bus.unsubscribe(unit_id, subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx: não acumular o stream no buffer do proxy
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
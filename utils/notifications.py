@@ -1,32 +1,16 @@
-import threading
-from flask_mail import Message
-from flask import current_app, url_for
+from flask import url_for
 import logging
+from .outbox import enqueue, enqueue_many
 
-def _send_async_email(app, msg):
-    """Função executada em thread separada para enviar o e-mail sem bloquear o app"""
-    with app.app_context():
-        try:
-            from app import mail
-            mail.send(msg)
-        except Exception as e:
-            logging.error(f"Erro no envio de e-mail assíncrono: {e}")
-
-def send_collection_alert(recipient_email, item_id, item_type):
-    """Envia um e-mail para o destinatário informando que o item está disponível (Assíncrono)"""
-    from .db import get_db
-    
-    if not recipient_email or '@' not in recipient_email:
-        return False
-        
-    try:
-        # Link para cadastro (externo)
-        register_link = url_for('auth.register', _external=True)
-        
-        msg = Message(
-            subject=f"AeroPost - Encomenda {item_id} disponível para retirada",
-            recipients=[recipient_email],
-            body=f"""Olá!
+# Os e-mails não saem mais do request: vão para a notification_outbox e
+# são enviados pelo processo `flask notifications-worker` (ver utils/outbox.py).
+
+def collection_alert_message(item_id, item_type):
+    """Assunto e corpo do aviso de encomenda disponível"""
+    # Link para cadastro (externo)
+    register_link = url_for('auth.register', _external=True)
+    subject = f"AeroPost - Encomenda {item_id} disponível para retirada"
+    body = f"""Olá!
             
 Sua encomenda ({item_type}) ID {item_id} acaba de chegar e está disponível para retirada na sala de Facilities.
 
@@ -41,33 +25,123 @@ Cadastre-se agora para acompanhar suas encomendas em tempo real:
 Atenciosamente,
 Equipe AeroPost / Facilities
 """
+    return subject, body
+
+def collection_digest_message(items, location=None):
+    """Assunto e corpo do aviso de várias encomendas disponíveis (alocação em lote)"""
+    register_link = url_for('auth.register', _external=True)
+    subject = f"AeroPost - {len(items)} encomendas disponíveis para retirada"
+    lines = "\n".join(f"- {item['internal_id']} ({item['type']})" for item in items)
+    place = f" (Local: {location})" if location else ""
+    body = f"""Olá!
+
+Você tem {len(items)} encomendas disponíveis para retirada na sala de Facilities{place}:
+
+{lines}
+
+Por favor, apresente-se para retirar seus itens.
+
+--------------------------------------------------
+Ainda não tem conta no AeroPost? 
+Cadastre-se agora para acompanhar suas encomendas em tempo real:
+{register_link}
+--------------------------------------------------
+
+Atenciosamente,
+Equipe AeroPost / Facilities
+"""
+    return subject, body
+
+def _recipient_results(recipient_emails):
+    # {email: endereço válido?}, sem repetidos e na ordem recebida
+    results = {}
+    for email in recipient_emails:
+        email = (email or '').strip()
+        if email and email not in results:
+            results[email] = '@' in email
+    return results
+
+def send_collection_alerts(recipient_emails, item_id, item_type, commit=True, unit_id=None):
+    """Fan-out do aviso de item disponível: uma inserção em lote na fila, um UPDATE de
+    last_notified_at e (com commit=True) um commit, qualquer que seja o tamanho do grupo.
+
+    Devolve {email: bool} por destinatário (False para endereço inválido); repetidos saem uma vez.
+    Com commit=False a inserção fica na transação de quem chamou (ex.: a alocação do item).
+    O próximo lembrete do scheduler é agendado pela política da unidade.
+    """
+    from .db import get_db
+    from .reminders import policy_for, next_reminder_at
+
+    results = _recipient_results(recipient_emails)
+    valid = [email for email, ok in results.items() if ok]
+    if not valid:
+        return results
+
+    try:
+        subject, body = collection_alert_message(item_id, item_type)
+        db = get_db()
+        enqueue_many(db, 'collection_alert', [(email, subject, body) for email in valid], item_internal_id=item_id)
+        db.execute(
+            "UPDATE items SET last_notified_at = CURRENT_TIMESTAMP, next_reminder_at = ? WHERE internal_id = ?",
+            (next_reminder_at(policy_for(unit_id)), item_id)
         )
-        # Dispara a thread em background
-        app = current_app._get_current_object()
-        threading.Thread(target=_send_async_email, args=(app, msg)).start()
-        
-        # Atualiza o timestamp de última notificação no banco de forma síncrona (rápido)
-        try:
-            db = get_db()
-            db.execute("UPDATE items SET last_notified_at = CURRENT_TIMESTAMP WHERE internal_id = ?", (item_id,))
+        if commit:
             db.commit()
-        except Exception as e:
-            logging.error(f"Erro ao atualizar last_notified_at: {e}")
+    except Exception as e:
+        logging.error(f"Erro ao enfileirar e-mails: {e}")
+        return {email: False for email in results}
+    return results
 
-        return True
+def send_collection_digest(recipient_emails, items, location=None, unit_id=None):
+    """Fan-out da alocação em lote: cada endereço recebe um e-mail listando todos os `items`.
+
+    Um executemany na fila e um UPDATE de last_notified_at por lote de ids, sem commit
+    (vale a transação da alocação). Devolve {email: bool} como send_collection_alerts.
+    """
+    from .db import get_db
+    from .reminders import policy_for, next_reminder_at, mark_notified
+
+    if len(items) == 1:
+        return send_collection_alerts(recipient_emails, items[0]['internal_id'], items[0]['type'],
+                                      commit=False, unit_id=unit_id)
+    results = _recipient_results(recipient_emails)
+    valid = [email for email, ok in results.items() if ok]
+    if not valid or not items:
+        return results
+
+    try:
+        subject, body = collection_digest_message(items, location)
+        db = get_db()
+        enqueue_many(db, 'collection_alert', [(email, subject, body) for email in valid])
+        mark_notified(db, [item['id'] for item in items], next_reminder_at(policy_for(unit_id)))
     except Exception as e:
-        logging.error(f"Erro ao preparar envio de e-mail: {e}")
+        logging.error(f"Erro ao enfileirar e-mails: {e}")
+        return {email: False for email in results}
+    return results
+
+def send_collection_alert(recipient_email, item_id, item_type, commit=True, unit_id=None):
+    """Coloca na fila o e-mail de item disponível para um destinatário e marca last_notified_at"""
+    if not recipient_email or '@' not in recipient_email:
         return False
+    results = send_collection_alerts([recipient_email], item_id, item_type, commit, unit_id)
+    return results.get(recipient_email.strip(), False)
+
+def resolve_recipients(db, recipient):
+    """Endereços de um destinatário: membros se for nome de grupo, senão o próprio e-mail"""
+    group = db.execute("SELECT id FROM email_groups WHERE name = ?", (recipient,)).fetchone()
+    if not group:
+        return False, [recipient]
+    members = db.execute("SELECT email FROM email_group_members WHERE group_id = ?", (group['id'],)).fetchall()
+    return True, [m['email'] for m in members]
 
 def send_reset_email(recipient_email, token):
-    """Envia link de recuperação de senha (Assíncrono)"""
+    """Coloca na fila o link de recuperação de senha"""
+    from .db import get_db
     try:
         reset_link = url_for('auth.reset_password', token=token, _external=True)
         
-        msg = Message(
-            subject="AeroPost - Recuperação de Senha",
-            recipients=[recipient_email],
-            body=f"""Olá!
+        db = get_db()
+        enqueue(db, 'password_reset', recipient_email, "AeroPost - Recuperação de Senha", f"""Olá!
             
 Recebemos uma solicitação para redefinir sua senha no AeroPost.
 
@@ -78,25 +152,23 @@ Se você não solicitou isso, apenas ignore este e-mail.
 
 Atenciosamente,
 Equipe AeroPost
-"""
-        )
-        # Dispara thread
-        app = current_app._get_current_object()
-        threading.Thread(target=_send_async_email, args=(app, msg)).start()
+""")
+        db.commit()
         return True
     except Exception as e:
         logging.error(f"Erro ao preparar e-mail de reset: {e}")
         return False
 
 def send_support_ticket(user_name, user_email, description, app_version, page_url):
-    """Envia um e-mail de suporte para o desenvolvedor (Assíncrono)"""
+    """Coloca na fila um e-mail de suporte para o desenvolvedor"""
+    from .db import get_db
     # Fallback para e-mail se estiver vazio
     sender_info = user_email if user_email else "E-mail não informado"
 
     try:
-        msg = Message(
-            subject=f"🆘 Suporte AeroPost - {user_name}",
-            recipients=["kran.technology@gmail.com"],
+        db = get_db()
+        enqueue(
+            db, 'support_ticket', "kran.technology@gmail.com", f"🆘 Suporte AeroPost - {user_name}",
             reply_to=user_email if user_email else None,
             body=f"""Novo chamado de suporte recebido!
 
@@ -112,9 +184,7 @@ Descrição do Problema:
 Este e-mail foi gerado automaticamente pelo sistema AeroPost.
 """
         )
-        # Dispara thread
-        app = current_app._get_current_object()
-        threading.Thread(target=_send_async_email, args=(app, msg)).start()
+        db.commit()
         return True
     except Exception as e:
         logging.error(f"Erro ao preparar e-mail de suporte: {e}")
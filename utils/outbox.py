@@ -0,0 +1,263 @@
+import os
+import time
+import uuid
+import signal
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Fila persistente de e-mails (tabela notification_outbox).
+# O request só chama `enqueue` dentro da própria transação; quem fala com o SMTP é o
+# processo `flask notifications-worker`, com concorrência limitada, retry exponencial e dead-letter.
+PENDING = 'PENDING'
+SENDING = 'SENDING'
+SENT = 'SENT'
+DEAD = 'DEAD'
+
+def _utcnow():
+    # Mesmo formato/fuso do CURRENT_TIMESTAMP do SQLite (UTC, sem fração)
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+def _ts(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def enqueue(db, kind, recipient, subject, body, reply_to=None, item_internal_id=None):
+    """Insere um e-mail na fila sem dar commit (vale a transação de quem chamou)"""
+    db.execute(
+        "INSERT INTO notification_outbox (kind, recipient, subject, body, reply_to, item_internal_id, next_attempt_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (kind, recipient, subject, body, reply_to, item_internal_id, _ts(_utcnow()))
+    )
+
+def enqueue_many(db, kind, messages, item_internal_id=None):
+    """Versão em lote de `enqueue` para (destinatário, assunto, corpo); um único executemany"""
+    now = _ts(_utcnow())
+    db.executemany(
+        "INSERT INTO notification_outbox (kind, recipient, subject, body, item_internal_id, next_attempt_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(kind, recipient, subject, body, item_internal_id, now) for recipient, subject, body in messages]
+    )
+
+def backoff_seconds(attempts, base, maximum):
+    """Espera antes da tentativa seguinte: base, 2x base, 4x base... limitado a `maximum`"""
+    return min(base * (2 ** max(attempts - 1, 0)), maximum)
+
+def outbox_stats(db):
+    """Quantidade por status e idade (s) do pendente mais antigo"""
+    counts = {row['status']: row['total'] for row in db.execute(
+        "SELECT status, COUNT(*) AS total FROM notification_outbox GROUP BY status"
+    ).fetchall()}
+    oldest = db.execute(
+        "SELECT MIN(next_attempt_at) FROM notification_outbox WHERE status = ?", (PENDING,)
+    ).fetchone()[0]
+    if isinstance(oldest, str):
+        oldest = datetime.strptime(oldest[:19], '%Y-%m-%d %H:%M:%S')
+    lag = max(0, int((_utcnow() - oldest).total_seconds())) if oldest else 0
+    return {'counts': {s: counts.get(s, 0) for s in (PENDING, SENDING, SENT, DEAD)}, 'oldest_pending_seconds': lag}
+
+def requeue_dead(db, ids=None):
+    """Devolve mensagens DEAD para a fila (todas ou só `ids`)"""
+    query = "UPDATE notification_outbox SET status = ?, attempts = 0, next_attempt_at = ?, last_error = NULL WHERE status = ?"
+    params = [PENDING, _ts(_utcnow()), DEAD]
+    if ids:
+        query += f" AND id IN ({', '.join('?' for _ in ids)})"
+        params.extend(ids)
+    count = db.execute(query, params).rowcount
+    db.commit()
+    return count
+
+class OutboxWorker:
+    """Drena a notification_outbox em lotes; uma instância por processo worker"""
+
+    def __init__(self, app, concurrency=4, batch_size=50, max_attempts=6,
+                 backoff_base=30, backoff_max=3600, lease_seconds=300, send=None):
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # `send(row)` substitui o SMTP (testes/diagnóstico); sem ele cada pedaço usa uma conexão do Flask-Mail
+        self._send = send
+        self._stopping = False
+        self.metrics = {'batches': 0, 'sent': 0, 'retried': 0, 'dead': 0, 'reclaimed': 0,
+                        'connections': 0, 'send_seconds': 0.0}
+
+    @classmethod
+    def from_config(cls, app, **overrides):
+        options = {
+            'concurrency': app.config.get('NOTIFICATIONS_CONCURRENCY', 4),
+            'batch_size': app.config.get('NOTIFICATIONS_BATCH_SIZE', 50),
+            'max_attempts': app.config.get('NOTIFICATIONS_MAX_ATTEMPTS', 6),
+            'backoff_base': app.config.get('NOTIFICATIONS_BACKOFF_BASE', 30),
+            'backoff_max': app.config.get('NOTIFICATIONS_BACKOFF_MAX', 3600),
+            'lease_seconds': app.config.get('NOTIFICATIONS_LEASE_SECONDS', 300),
+        }
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(app, **options)
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def _send_chunk(self, rows):
+        """Envia um pedaço do lote por uma única conexão SMTP (um handshake/login por pedaço)"""
+        results = []
+        if self._send is not None:
+            for row in rows:
+                try:
+                    self._send(row)
+                    results.append((row, None))
+                except Exception as e:
+                    results.append((row, e))
+            return results
+
+        from flask_mail import Message
+        from app import mail
+        with self.app.app_context():
+            try:
+                with mail.connect() as connection:
+                    for row in rows:
+                        try:
+                            connection.send(Message(
+                                subject=row['subject'],
+                                recipients=[row['recipient']],
+                                body=row['body'],
+                                reply_to=row['reply_to']
+                            ))
+                            results.append((row, None))
+                        except Exception as e:
+                            results.append((row, e))
+            except Exception as e:
+                # Falha ao conectar/autenticar: o que não foi tentado conta como erro desta rodada
+                attempted = {row['id'] for row, _ in results}
+                results.extend((row, e) for row in rows if row['id'] not in attempted)
+        return results
+
+    def claim(self, db):
+        """Reserva um lote de mensagens vencidas para este worker (lease com locked_by/locked_at)"""
+        now = _utcnow()
+        # Mensagens presas em SENDING por um worker que morreu voltam para a fila
+        reclaimed = db.execute(
+            "UPDATE notification_outbox SET status = ?, locked_by = NULL WHERE status = ? AND locked_at <= ?",
+            (PENDING, SENDING, _ts(now - timedelta(seconds=self.lease_seconds)))
+        ).rowcount
+        self.metrics['reclaimed'] += max(reclaimed, 0)
+
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.execute(
+            "UPDATE notification_outbox SET status = ?, locked_by = ?, locked_at = ? "
+            "WHERE status = ? AND id IN ("
+            "  SELECT id FROM notification_outbox WHERE status = ? AND next_attempt_at <= ? "
+            "  ORDER BY next_attempt_at, id LIMIT ?"
+            ")",
+            (SENDING, token, _ts(now), PENDING, PENDING, _ts(now), self.batch_size)
+        )
+        db.commit()
+        return db.execute(
+            "SELECT * FROM notification_outbox WHERE locked_by = ? AND status = ? ORDER BY id", (token, SENDING)
+        ).fetchall()
+
+    def _deliver(self, executor, rows):
+        # Um pedaço (e uma conexão) por slot de concorrência, em vez de uma conexão por e-mail
+        slots = min(self.concurrency, len(rows))
+        chunks = [rows[i::slots] for i in range(slots)]
+        self.metrics['connections'] += slots
+        results = []
+        for chunk_results in executor.map(self._send_chunk, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def _record(self, db, results):
+        now = _utcnow()
+        sent, failed = [], []
+        for row, error in results:
+            if error is None:
+                sent.append((SENT, _ts(now), row['id']))
+                continue
+
+            attempts = row['attempts'] + 1
+            logging.warning(f"Falha ao enviar e-mail {row['id']} para {row['recipient']} (tentativa {attempts}): {error}")
+            if attempts >= self.max_attempts:
+                status, due = DEAD, now
+                self.metrics['dead'] += 1
+            else:
+                status = PENDING
+                due = now + timedelta(seconds=backoff_seconds(attempts, self.backoff_base, self.backoff_max))
+                self.metrics['retried'] += 1
+            failed.append((status, attempts, _ts(due), str(error)[:500], row['id']))
+
+        # Resultado do lote inteiro gravado em um commit
+        db.executemany(
+            "UPDATE notification_outbox SET status = ?, sent_at = ?, locked_by = NULL, last_error = NULL, "
+            "attempts = attempts + 1 WHERE id = ?", sent
+        )
+        db.executemany(
+            "UPDATE notification_outbox SET status = ?, attempts = ?, next_attempt_at = ?, locked_by = NULL, "
+            "last_error = ? WHERE id = ?", failed
+        )
+        db.commit()
+        self.metrics['sent'] += len(sent)
+
+    def run_once(self, db, executor):
+        """Processa um lote; devolve quantas mensagens foram tentadas"""
+        rows = self.claim(db)
+        if not rows:
+            return 0
+        start = time.monotonic()
+        results = self._deliver(executor, rows)
+        self.metrics['send_seconds'] += time.monotonic() - start
+        self._record(db, results)
+        self.metrics['batches'] += 1
+        return len(rows)
+
+    def run(self, db, poll_interval=5, once=False):
+        """Loop principal: drena a fila e dorme `poll_interval` quando não há nada vencido"""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox') as executor:
+            while not self._stopping:
+                if self.run_once(db, executor):
+                    continue
+                if once:
+                    break
+                time.sleep(poll_interval)
+        return self.metrics
+
+def init_app(app):
+    import click
+
+    @app.cli.command('notifications-worker')
+    @click.option('--concurrency', type=int, default=None, help='Envios SMTP simultâneos.')
+    @click.option('--batch-size', type=int, default=None, help='Mensagens reservadas por lote.')
+    @click.option('--poll-interval', type=float, default=None, help='Segundos de espera com a fila vazia.')
+    @click.option('--once', is_flag=True, help='Drena o que estiver vencido e sai (útil em cron).')
+    def notifications_worker_command(concurrency, batch_size, poll_interval, once):
+        """Envia os e-mails da notification_outbox"""
+        from utils.db import get_db
+        worker = OutboxWorker.from_config(app, concurrency=concurrency, batch_size=batch_size)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        interval = poll_interval if poll_interval is not None else app.config.get('NOTIFICATIONS_POLL_INTERVAL', 5)
+
+        print(f"📬 Worker de notificações iniciado ({worker.worker_id}, concorrência {worker.concurrency}).")
+        metrics = worker.run(get_db(), poll_interval=interval, once=once)
+        print(f"Enviados: {metrics['sent']} | Reagendados: {metrics['retried']} | "
+              f"Dead-letter: {metrics['dead']} | Lotes: {metrics['batches']} | Conexões SMTP: {metrics['connections']} | "
+              f"Recuperados: {metrics['reclaimed']}")
+
+    @app.cli.command('notifications-stats')
+    def notifications_stats_command():
+        """Mostra o tamanho da fila de e-mails por status"""
+        from utils.db import get_db
+        stats = outbox_stats(get_db())
+        for status, total in stats['counts'].items():
+            print(f"{status}: {total}")
+        print(f"Pendente mais antigo: {stats['oldest_pending_seconds']}s")
+
+    @app.cli.command('notifications-requeue')
+    @click.argument('ids', nargs=-1, type=int)
+    def notifications_requeue_command(ids):
+        """Devolve mensagens em dead-letter para a fila (todas ou os IDs informados)"""
+        from utils.db import get_db
+        print(f"✅ {requeue_dead(get_db(), list(ids))} mensagem(ns) devolvida(s) para a fila.")
@@ -0,0 +1,73 @@
+import json
+import base64
+import binascii
+from collections import namedtuple
+from flask import current_app
+
+# Paginação por cursor (keyset): a página seguinte começa depois da última linha vista,
+# comparando (coluna de ordenação, id) em vez de usar OFFSET. Com um índice que cubra a
+# ordenação o custo de cada página é o mesmo, não importa quantas linhas vêm antes.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+Page = namedtuple('Page', 'items next_cursor')
+
+def page_size(requested=None):
+    """Tamanho da página: PAGE_SIZE da config (ou o pedido), entre 1 e MAX_PAGE_SIZE"""
+    size = requested or current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_cursor(values):
+    """Cursor opaco para a URL a partir dos valores de ordenação da última linha"""
+    payload = json.dumps([v if v is None or isinstance(v, (int, float)) else str(v) for v in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Valores do cursor; ValueError se ele foi adulterado ou não tem `size` posições"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Cursor de paginação inválido.")
+    if not isinstance(values, list) or len(values) != size or any(v is None for v in values):
+        raise ValueError("Cursor de paginação inválido.")
+    return values
+
+def _row_key(column):
+    # 'p.delivered_at' -> 'delivered_at' (nome da coluna na linha retornada)
+    return column.rsplit('.', 1)[-1]
+
+def keyset_page(db, query, params, columns, descending=False, cursor=None, limit=None):
+    """Uma página de `query` (que termina num WHERE) ordenada por `columns`, a última sendo o desempate (id)"""
+    return keyset_merge(db, [(query, params)], columns, descending, cursor, limit)
+
+def keyset_merge(db, sources, columns, descending=False, cursor=None, limit=None):
+    """Como keyset_page, mas intercalando várias queries [(query, params)] com a mesma ordenação.
+
+    Cada fonte usa o próprio índice e devolve no máximo limit + 1 linhas; a junção é feita aqui
+    (ex.: tabelas quentes + arquivo), sem ordenar a união inteira no banco.
+    """
+    limit = page_size(limit)
+    values = decode_cursor(cursor, len(columns)) if cursor else None
+    operator = '<' if descending else '>'
+    direction = ' DESC' if descending else ' ASC'
+    keys = [_row_key(column) for column in columns]
+
+    rows = []
+    for query, params in sources:
+        params = list(params)
+        if values:
+            query += f" AND ({', '.join(columns)}) {operator} ({', '.join('?' for _ in columns)})"
+            params += values
+        query += " ORDER BY " + ', '.join(column + direction for column in columns) + " LIMIT ?"
+        rows += db.execute(query, params + [limit + 1]).fetchall()
+    if len(sources) > 1:
+        rows.sort(key=lambda row: tuple(row[key] for key in keys), reverse=descending)
+
+    if len(rows) <= limit:
+        return Page(rows, None)
+    last = rows[limit - 1]
+    return Page(rows[:limit], encode_cursor([last[key] for key in keys]))
@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+import logging
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera configurado"""
+
+
+class _PooledConnection:
+    """Conexão física + metadados de uso (quantas vezes saiu do pool, último uso)"""
+
+    __slots__ = ('conn', 'uses', 'created_at', 'last_used_at')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ConnectionPool:
+    """Pool de conexões por processo.
+
+    - `connect` é a fábrica de conexões novas; `ping` valida uma conexão antes de entregá-la.
+    - O pool guarda o PID em que foi criado: depois de um fork (gunicorn --preload) o filho
+      descarta as conexões herdadas sem fechá-las (o socket pertence ao processo pai).
+    """
+
+    def __init__(self, connect, ping=None, min_size=0, max_size=10, timeout=30.0,
+                 recycle_uses=0, idle_timeout=0.0):
+        self._connect = connect
+        self._ping = ping
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.recycle_uses = recycle_uses
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []
+        self._open = 0
+        self._pid = os.getpid()
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'expired': 0,
+            'discarded': 0,
+        }
+
+        for _ in range(self.min_size):
+            self._idle.append(self._new_connection())
+
+    # --- Ciclo de vida -------------------------------------------------
+
+    def _new_connection(self):
+        pooled = _PooledConnection(self._connect())
+        self._open += 1
+        self._stats['created'] += 1
+        return pooled
+
+    def _close_quietly(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception as e:
+            logging.warning(f"Erro ao fechar conexão do pool: {e}")
+
+    def _check_fork(self):
+        """Reinicia o estado se o processo atual não é o que criou o pool"""
+        if self._pid != os.getpid():
+            self._idle = []
+            self._open = 0
+            self._pid = os.getpid()
+            self._lock = threading.Condition(threading.Lock())
+
+    def _expired(self, pooled, now):
+        if self.recycle_uses and pooled.uses >= self.recycle_uses:
+            self._stats['recycled'] += 1
+            return True
+        if self.idle_timeout and now - pooled.last_used_at > self.idle_timeout:
+            self._stats['expired'] += 1
+            return True
+        return False
+
+    def acquire(self):
+        """Retira uma conexão do pool (bloqueia até `timeout` se o pool estiver cheio)"""
+        self._check_fork()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Pool de conexões já foi fechado.")
+
+                pooled = None
+                if self._idle:
+                    pooled = self._idle.pop()
+                    if self._expired(pooled, time.monotonic()):
+                        self._open -= 1
+                        self._close_quietly(pooled)
+                        continue
+                elif self._open < self.max_size:
+                    pooled = self._new_connection()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre após {self.timeout}s (máximo: {self.max_size})."
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+                    continue
+
+            # Health check fora do lock para não serializar o pool inteiro
+            if self._ping is not None and pooled.uses > 0 and not self._healthy(pooled):
+                with self._lock:
+                    self._open -= 1
+                    self._stats['discarded'] += 1
+                    self._lock.notify()
+                self._close_quietly(pooled)
+                continue
+
+            with self._lock:
+                pooled.uses += 1
+                pooled.last_used_at = time.monotonic()
+                self._stats['checkouts'] += 1
+            return pooled
+
+    def _healthy(self, pooled):
+        try:
+            return self._ping(pooled.conn) is not False
+        except Exception:
+            return False
+
+    def release(self, pooled, discard=False):
+        """Devolve a conexão ao pool; `discard=True` fecha em vez de reutilizar"""
+        if self._pid != os.getpid():
+            # Conexão herdada de outro processo: apenas abandona
+            return
+
+        with self._lock:
+            pooled.last_used_at = time.monotonic()
+            if discard or self._closed:
+                self._open -= 1
+                self._stats['discarded'] += 1
+                self._lock.notify()
+                to_close = pooled
+            else:
+                self._idle.append(pooled)
+                self._lock.notify()
+                to_close = None
+
+        if to_close is not None:
+            self._close_quietly(to_close)
+
+    def close(self):
+        """Fecha todas as conexões ociosas e impede novos checkouts"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._lock.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    # --- Observabilidade -----------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'pid': self._pid,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return data
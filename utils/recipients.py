@@ -0,0 +1,133 @@
+import re
+import time
+import threading
+import unicodedata
+from bisect import bisect_left
+from .reference_data import current_version
+
+# Índice de destinatários (usuários + grupos de email) por unidade, em memória do processo.
+# Reconstruído sob demanda quando a versão dos dados de referência muda (escritas em grupos
+# e usuários, de qualquer worker), após `invalidate_recipient_index()` ou quando passa do TTL.
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+_indexes = {}
+_lock = threading.Lock()
+_TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+def normalize(text):
+    """Minúsculas e sem acentos ('João' -> 'joao')"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+def _tokens(*texts):
+    tokens = set()
+    for text in texts:
+        tokens.update(t for t in _TOKEN_SPLIT.split(normalize(text)) if t)
+    return tokens
+
+class RecipientIndex:
+    """Listas ordenadas de (chave, posição) para busca por prefixo com bisect"""
+
+    def __init__(self, entries):
+        # Ordem de desempate já embutida na posição: grupos primeiro, depois por nome
+        self.entries = sorted(entries, key=lambda e: (e['kind'] != 'group', normalize(e['name'])))
+        tokens, full = [], []
+        self._entry_tokens = []
+        for pos, entry in enumerate(self.entries):
+            name, email = normalize(entry['name']), normalize(entry['email'] or '')
+            entry_tokens = _tokens(name, email)
+            self._entry_tokens.append(entry_tokens)
+            tokens.extend((token, pos) for token in entry_tokens)
+            # Nome/email inteiros: prefixo do texto digitado sobe no ranking
+            full.append((name, pos))
+            if email:
+                full.append((email, pos))
+        tokens.sort()
+        full.sort()
+        self._tokens = ([k for k, _ in tokens], [p for _, p in tokens])
+        self._full = ([k for k, _ in full], [p for _, p in full])
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _range(keys, prefix):
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + '\uffff')
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = _tokens(query)
+        if not terms:
+            return []
+
+        # Parte do termo mais seletivo. Os demais intersectam pela faixa do índice ou,
+        # quando a faixa é muito maior que os candidatos, filtram pelos tokens de cada entrada
+        keys, positions = self._tokens
+        ranges = sorted(((self._range(keys, term), term) for term in terms), key=lambda r: r[0][1] - r[0][0])
+        (lo, hi), _ = ranges[0]
+        candidates = set(positions[lo:hi])
+        for (lo, hi), term in ranges[1:]:
+            if not candidates:
+                break
+            if hi - lo <= 32 * len(candidates):
+                candidates &= set(positions[lo:hi])
+            else:
+                candidates = {
+                    pos for pos in candidates
+                    if any(token.startswith(term) for token in self._entry_tokens[pos])
+                }
+        if not candidates:
+            return []
+
+        # Ranking: igual ao texto digitado > começa com ele > só casa por token
+        needle = normalize(query).strip()
+        keys, positions = self._full
+        lo, hi = self._range(keys, needle)
+        prefixed = set(positions[lo:hi]) & candidates
+        exact = {positions[i] for i in range(lo, hi) if keys[i] == needle} & candidates
+
+        ranked = sorted(exact) + sorted(prefixed - exact)
+        if len(ranked) < limit:
+            ranked += sorted(candidates - prefixed)[:limit - len(ranked)]
+        return [self.entries[pos] for pos in ranked[:limit]]
+
+def _load_entries(db, unit_id):
+    entries = []
+    for g in db.execute("SELECT name FROM email_groups WHERE unit_id = ? ORDER BY name ASC", (unit_id,)).fetchall():
+        entries.append({'kind': 'group', 'value': g['name'], 'name': g['name'], 'email': None,
+                        'label': f"📧 Grupo: {g['name']}"})
+    users = db.execute(
+        "SELECT email, full_name FROM users "
+        "WHERE is_active = 1 AND role != 'ADMIN' AND email IS NOT NULL AND default_unit_id = ? "
+        "ORDER BY full_name ASC", (unit_id,)
+    ).fetchall()
+    for u in users:
+        name = u['full_name'] or u['email']
+        entries.append({'kind': 'user', 'value': u['email'], 'name': name,
+                        'email': u['email'], 'label': f"{name} ({u['email']})"})
+    return entries
+
+def get_recipient_index(db, unit_id, ttl=60):
+    """Índice da unidade, reconstruído se a versão mudou, se invalidado ou mais velho que `ttl` segundos"""
+    now = time.monotonic()
+    version = current_version(db)
+    cached = _indexes.get(unit_id)
+    if cached and cached[1] == version and now - cached[0] < ttl:
+        return cached[2]
+
+    index = RecipientIndex(_load_entries(db, unit_id))
+    with _lock:
+        _indexes[unit_id] = (now, version, index)
+    return index
+
+def invalidate_recipient_index(unit_id=None):
+    """Descarta o índice de uma unidade (ou de todas) neste processo"""
+    with _lock:
+        if unit_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(unit_id, None)
+
+def search_recipients(db, unit_id, query, limit=DEFAULT_LIMIT, ttl=60):
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    return get_recipient_index(db, unit_id, ttl).search(query, limit)
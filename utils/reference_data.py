@@ -0,0 +1,84 @@
+import threading
+from flask import g
+
+# Dados de referência (unidades, locais, tipos de item, domínios e grupos) em memória do processo.
+# Mudam raramente mas eram lidos em quase todo request. Toda escrita neles chama
+# `bump_version(db)` antes do commit; cada request lê o contador em `cache_versions`
+# uma vez (uma linha pela PK) e, se mudou, descarta o cache deste worker. Assim uma alteração
+# feita em um worker do gunicorn vale nos outros já no request seguinte.
+REFERENCE_VERSION = 'reference_data'
+
+_lock = threading.Lock()
+_state = {'version': None, 'values': {}}
+
+def current_version(db):
+    """Versão atual dos dados de referência (lida uma vez por request)"""
+    if 'reference_version' not in g:
+        row = db.execute("SELECT version FROM cache_versions WHERE name = ?", (REFERENCE_VERSION,)).fetchone()
+        g.reference_version = row[0] if row else 0
+    return g.reference_version
+
+def bump_version(db):
+    """Invalida o cache em todos os workers; entra na transação de quem chamou (sem commit)"""
+    db.execute(
+        "INSERT INTO cache_versions (name, version) VALUES (?, 1) "
+        "ON CONFLICT (name) DO UPDATE SET version = version + 1", (REFERENCE_VERSION,)
+    )
+    g.pop('reference_version', None)
+
+def invalidate_reference_data():
+    """Descarta o cache deste processo (testes, restauração de banco)"""
+    with _lock:
+        _state['version'], _state['values'] = None, {}
+
+def _cached(db, key, loader):
+    version = current_version(db)
+    with _lock:
+        if _state['version'] == version and key in _state['values']:
+            return _state['values'][key]
+    value = loader()
+    with _lock:
+        if _state['version'] != version:
+            _state['version'], _state['values'] = version, {}
+        _state['values'][key] = value
+    return value
+
+def _rows(db, query, params=()):
+    return [dict(row) for row in db.execute(query, params).fetchall()]
+
+def companies(db):
+    """Todas as unidades (ativas ou não), por nome"""
+    return _cached(db, 'companies', lambda: _rows(db, "SELECT * FROM settings_companies ORDER BY name ASC"))
+
+def active_companies(db):
+    return [c for c in companies(db) if c['is_active']]
+
+def company(db, unit_id):
+    """Unidade pelo id; None se não existe"""
+    return next((c for c in companies(db) if c['id'] == unit_id), None)
+
+def item_types(db):
+    return _cached(db, 'item_types', lambda: _rows(
+        db, "SELECT * FROM settings_item_types WHERE is_active = 1 ORDER BY name ASC"
+    ))
+
+def locations(db, unit_id):
+    return _cached(db, ('locations', unit_id), lambda: _rows(
+        db, "SELECT * FROM settings_locations WHERE is_active = 1 AND unit_id = ? ORDER BY name ASC", (unit_id,)
+    ))
+
+def allowed_domains(db):
+    return _cached(db, 'allowed_domains', lambda: _rows(
+        db, "SELECT * FROM settings_allowed_domains WHERE is_active = 1 ORDER BY domain ASC"
+    ))
+
+def email_groups(db, unit_id):
+    """Grupos da unidade com os membros concatenados (modais de Configurações)"""
+    return _cached(db, ('email_groups', unit_id), lambda: _rows(db, """
+        SELECT g.id, g.name, GROUP_CONCAT(m.email, ', ') as members
+        FROM email_groups g
+        LEFT JOIN email_group_members m ON g.id = m.group_id
+        WHERE g.unit_id = ?
+        GROUP BY g.id
+        ORDER BY g.name ASC
+    """, (unit_id,)))
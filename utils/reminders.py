@@ -0,0 +1,216 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from .outbox import enqueue_many
+
+# Lembrete de itens parados em DISPONIVEL_PARA_RETIRADA, consolidado por destinatário:
+# quem tem 8 itens esperando recebe 1 e-mail, não 8. Tudo em poucas queries set-based.
+UPDATE_CHUNK = 500
+DEFAULT_INTERVAL_HOURS = 72
+
+# Política de lembrete por unidade: intervalo, ligado/desligado e digest ou um e-mail por item
+ReminderPolicy = namedtuple('ReminderPolicy', 'interval_hours enabled digest')
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+def _ts(moment):
+    # Mesmo formato do CURRENT_TIMESTAMP gravado no banco (comparação sargable)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _cutoff(interval_days, now=None):
+    return _ts((now or _utcnow()) - timedelta(days=interval_days))
+
+def parse_policies(text, default_hours=DEFAULT_INTERVAL_HOURS):
+    """Lê REMINDER_POLICIES ("1=48,2=off,3=24:single") em {unit_id: ReminderPolicy}"""
+    policies = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        unit, _, spec = part.partition('=')
+        hours, _, mode = spec.strip().lower().partition(':')
+        try:
+            unit_id = int(unit)
+            if hours == 'off':
+                policies[unit_id] = ReminderPolicy(default_hours, False, True)
+                continue
+            if mode not in ('', 'digest', 'single') or float(hours) <= 0:
+                raise ValueError
+            policies[unit_id] = ReminderPolicy(float(hours), True, mode != 'single')
+        except ValueError:
+            raise ValueError(f"Política inválida em REMINDER_POLICIES: '{part.strip()}'")
+    return policies
+
+def policy_for(unit_id, config=None):
+    """Política da unidade segundo a config do app (padrão: REMINDER_INTERVAL_HOURS, digest)"""
+    if config is None:
+        from flask import current_app
+        config = current_app.config
+    default_hours = config.get('REMINDER_INTERVAL_HOURS', DEFAULT_INTERVAL_HOURS)
+    policies = parse_policies(config.get('REMINDER_POLICIES', ''), default_hours)
+    return policies.get(unit_id, ReminderPolicy(default_hours, True, True))
+
+def next_reminder_at(policy, now=None):
+    return _ts((now or _utcnow()) + timedelta(hours=policy.interval_hours))
+
+def _format_date(value):
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y')
+    return str(value or '')[:10]
+
+def load_pending_items(db, interval_days=3, now=None):
+    """Itens disponíveis que nunca foram lembrados ou cujo último aviso é mais velho que o intervalo"""
+    return db.execute(
+        "SELECT id, internal_id, type, location, created_at, recipient_email, recipient_name_manual FROM items "
+        "WHERE status = 'DISPONIVEL_PARA_RETIRADA' AND (last_notified_at IS NULL OR last_notified_at <= ?) "
+        "ORDER BY created_at ASC",
+        (_cutoff(interval_days, now),)
+    ).fetchall()
+
+def load_group_members(db):
+    """Dict nome do grupo -> e-mails dos membros (uma query para todos os grupos)"""
+    groups = {}
+    rows = db.execute(
+        "SELECT g.name, m.email FROM email_groups g JOIN email_group_members m ON m.group_id = g.id"
+    ).fetchall()
+    for row in rows:
+        groups.setdefault(row['name'], []).append(row['email'])
+    return groups
+
+def group_by_recipient(items, groups):
+    """Dict endereço -> itens, expandindo grupos; devolve também os itens sem e-mail"""
+    digests, without_email = {}, []
+    for item in items:
+        recipient = item['recipient_email']
+        # Se não tem e-mail corporativo, tenta o manual se for um e-mail
+        if not recipient and item['recipient_name_manual'] and '@' in item['recipient_name_manual']:
+            recipient = item['recipient_name_manual']
+        if not recipient:
+            without_email.append(item)
+            continue
+
+        for address in groups.get(recipient, [recipient]):
+            address = (address or '').strip()
+            if '@' in address:
+                digests.setdefault(address.lower(), []).append(item)
+    return digests, without_email
+
+def digest_message(items):
+    """Assunto e corpo do lembrete consolidado"""
+    if len(items) == 1:
+        subject = f"AeroPost - Lembrete: encomenda {items[0]['internal_id']} aguardando retirada"
+    else:
+        subject = f"AeroPost - Lembrete: {len(items)} encomendas aguardando retirada"
+    lines = "\n".join(
+        f"- {item['internal_id']} ({item['type']}) - Local: {item['location'] or '-'} - desde {_format_date(item['created_at'])}"
+        for item in items
+    )
+    body = f"""Olá!
+
+Você tem {len(items)} encomenda(s) aguardando retirada na sala de Facilities:
+
+{lines}
+
+Por favor, apresente-se para retirar seus itens.
+
+Atenciosamente,
+Equipe AeroPost / Facilities
+"""
+    return subject, body
+
+def mark_notified(db, item_ids, next_at=None):
+    """UPDATE de last_notified_at (e do próximo lembrete) em lotes de IDs (sem commit)"""
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), UPDATE_CHUNK):
+        chunk = item_ids[start:start + UPDATE_CHUNK]
+        db.execute(
+            "UPDATE items SET last_notified_at = CURRENT_TIMESTAMP, next_reminder_at = ? "
+            f"WHERE id IN ({', '.join('?' for _ in chunk)})",
+            [next_at] + chunk
+        )
+
+def reschedule(db, item_ids, next_at):
+    """Só move o próximo lembrete (unidade desligada ou item sem e-mail); sem commit"""
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), UPDATE_CHUNK):
+        chunk = item_ids[start:start + UPDATE_CHUNK]
+        db.execute(
+            f"UPDATE items SET next_reminder_at = ? WHERE id IN ({', '.join('?' for _ in chunk)})",
+            [next_at] + chunk
+        )
+
+def send_reminder_digests(db, interval_days=3, now=None):
+    """Enfileira um lembrete por destinatário e marca os itens; um commit no final"""
+    items = load_pending_items(db, interval_days, now)
+    if not items:
+        return {'items': 0, 'recipients': 0, 'without_email': 0}
+
+    digests, without_email = group_by_recipient(items, load_group_members(db))
+    messages = [(address, *digest_message(address_items)) for address, address_items in digests.items()]
+    enqueue_many(db, 'reminder_digest', messages)
+
+    notified = {item['id'] for address_items in digests.values() for item in address_items}
+    mark_notified(db, notified, next_reminder_at(ReminderPolicy(interval_days * 24, True, True), now))
+    db.commit()
+    return {'items': len(notified), 'recipients': len(messages), 'without_email': len(without_email)}
+
+def load_due_items(db, now=None):
+    """Itens cujo próximo lembrete venceu (índice items(status, next_reminder_at))"""
+    return db.execute(
+        "SELECT id, internal_id, type, location, created_at, recipient_email, recipient_name_manual, unit_id FROM items "
+        "WHERE status = 'DISPONIVEL_PARA_RETIRADA' AND next_reminder_at <= ? ORDER BY next_reminder_at ASC",
+        (_ts(now or _utcnow()),)
+    ).fetchall()
+
+def next_due_at(db):
+    """Quando vence o próximo lembrete (datetime UTC) ou None"""
+    value = db.execute(
+        "SELECT MIN(next_reminder_at) FROM items WHERE status = 'DISPONIVEL_PARA_RETIRADA'"
+    ).fetchone()[0]
+    if isinstance(value, str):
+        value = datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+    return value
+
+def send_due_reminders(db, get_policy, now=None):
+    """Envia os lembretes vencidos segundo a política de cada unidade; um commit no final"""
+    now = now or _utcnow()
+    items = load_due_items(db, now)
+    stats = {'items': 0, 'recipients': 0, 'skipped': 0, 'without_email': 0}
+    if not items:
+        return stats
+
+    groups = load_group_members(db)
+    messages = []
+    by_unit = {}
+    for item in items:
+        by_unit.setdefault(item['unit_id'], []).append(item)
+
+    for unit_id, unit_items in by_unit.items():
+        policy = get_policy(unit_id)
+        next_at = next_reminder_at(policy, now)
+        if not policy.enabled:
+            reschedule(db, [item['id'] for item in unit_items], next_at)
+            stats['skipped'] += len(unit_items)
+            continue
+
+        batches = [unit_items] if policy.digest else [[item] for item in unit_items]
+        notified, without_email = set(), []
+        for batch in batches:
+            digests, missing = group_by_recipient(batch, groups)
+            without_email.extend(missing)
+            messages.extend((address, *digest_message(address_items)) for address, address_items in digests.items())
+            notified.update(item['id'] for address_items in digests.values() for item in address_items)
+
+        mark_notified(db, notified, next_at)
+        # Sem endereço: não adianta tentar de novo a cada tick
+        missing = {item['id'] for item in without_email}
+        reschedule(db, missing, None)
+        # Grupo sem membros (ou endereço inválido): tenta de novo no próximo intervalo
+        handled = notified | missing
+        reschedule(db, [item['id'] for item in unit_items if item['id'] not in handled], next_at)
+        stats['items'] += len(notified)
+        stats['without_email'] += len(without_email)
+
+    enqueue_many(db, 'reminder_digest', messages)
+    db.commit()
+    stats['recipients'] = len(messages)
+    return stats
@@ -0,0 +1,118 @@
+import os
+import socket
+import signal
+import logging
+import threading
+from datetime import timedelta
+from .reminders import _utcnow, _ts, parse_policies, policy_for, next_due_at, send_due_reminders
+
+# Processo de longa duração (`flask scheduler run`) que substitui o cron de lembretes:
+# o app é criado uma vez, o processo dorme até o próximo `next_reminder_at` e só um
+# scheduler age por vez graças ao lease na tabela scheduler_leases.
+LEASE_NAME = 'reminders'
+MIN_SLEEP = 1
+
+def acquire_lease(db, name, owner, seconds, now=None):
+    """Pega ou renova o lease; True se `owner` é o dono até `seconds` a partir de agora"""
+    now = now or _utcnow()
+    db.execute(
+        "INSERT INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+        "WHERE scheduler_leases.owner = excluded.owner OR scheduler_leases.expires_at <= ?",
+        (name, owner, _ts(now + timedelta(seconds=seconds)), _ts(now))
+    )
+    db.commit()
+    row = db.execute("SELECT owner FROM scheduler_leases WHERE name = ?", (name,)).fetchone()
+    return row is not None and row['owner'] == owner
+
+def release_lease(db, name, owner):
+    db.execute("DELETE FROM scheduler_leases WHERE name = ? AND owner = ?", (name, owner))
+    db.commit()
+
+class ReminderScheduler:
+    """Envia os lembretes vencidos e dorme até o próximo; uma instância por processo"""
+
+    def __init__(self, app, lease_seconds=120, max_sleep=300):
+        self.app = app
+        self.lease_seconds = lease_seconds
+        self.max_sleep = max_sleep
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self.metrics = {'ticks': 0, 'items': 0, 'recipients': 0, 'skipped': 0, 'lease_denied': 0}
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(app, app.config.get('SCHEDULER_LEASE_SECONDS', 120), app.config.get('SCHEDULER_MAX_SLEEP', 300))
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def tick(self, db, now=None):
+        """Uma rodada: renova o lease e envia o que venceu. Devolve os segundos até a próxima"""
+        now = now or _utcnow()
+        # Renovar a cada metade do lease mantém a posse enquanto o processo estiver vivo
+        ceiling = min(self.max_sleep, self.lease_seconds / 2)
+        if not acquire_lease(db, LEASE_NAME, self.owner, self.lease_seconds, now):
+            self.metrics['lease_denied'] += 1
+            return ceiling
+
+        stats = send_due_reminders(db, lambda unit_id: policy_for(unit_id, self.app.config), now)
+        self.metrics['ticks'] += 1
+        for key in ('items', 'recipients', 'skipped'):
+            self.metrics[key] += stats[key]
+        if stats['items']:
+            logging.info(f"Scheduler: {stats['items']} item(ns) lembrado(s) em {stats['recipients']} e-mail(s)")
+
+        due = next_due_at(db)
+        if due is None:
+            return ceiling
+        return max(MIN_SLEEP, min(ceiling, (due - now).total_seconds()))
+
+    def run(self, db, once=False):
+        try:
+            while not self._stop.is_set():
+                delay = self.tick(db)
+                if once:
+                    break
+                self._stop.wait(delay)
+        finally:
+            release_lease(db, LEASE_NAME, self.owner)
+        return self.metrics
+
+def init_app(app):
+    import click
+
+    @app.cli.group('scheduler')
+    def scheduler_group():
+        """Lembretes de retirada agendados por unidade"""
+
+    @scheduler_group.command('run')
+    @click.option('--once', is_flag=True, help='Executa uma rodada e sai.')
+    def scheduler_run_command(once):
+        """Mantém o scheduler de lembretes rodando"""
+        from utils.db import get_db
+        # Política inválida derruba o processo na subida, não no meio da madrugada
+        try:
+            parse_policies(app.config.get('REMINDER_POLICIES', ''))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        scheduler = ReminderScheduler.from_config(app)
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+        print(f"⏰ Scheduler de lembretes iniciado ({scheduler.owner}).")
+        metrics = scheduler.run(get_db(), once=once)
+        if metrics['lease_denied'] and not metrics['ticks']:
+            print("⚠️ Outro scheduler detém o lease; nada foi enviado.")
+        print(f"Itens lembrados: {metrics['items']} | E-mails: {metrics['recipients']} | "
+              f"Ignorados (unidade desligada): {metrics['skipped']} | Rodadas: {metrics['ticks']}")
+
+    @scheduler_group.command('status')
+    def scheduler_status_command():
+        """Mostra o dono do lease e o próximo lembrete"""
+        from utils.db import get_db
+        db = get_db()
+        lease = db.execute("SELECT owner, expires_at FROM scheduler_leases WHERE name = ?", (LEASE_NAME,)).fetchone()
+        print(f"Lease: {lease['owner']} até {lease['expires_at']}" if lease else "Lease: livre")
+        due = next_due_at(db)
+        print(f"Próximo lembrete: {due or '-'}")
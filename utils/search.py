@@ -0,0 +1,156 @@
+import re
+from flask import g
+from .archive import tier_queries
+
+# Busca textual de encomendas.
+# SQLite: tabela FTS5 `items_fts` (rowid = items.id) mantida por triggers em items e proofs.
+# Postgres: coluna `items.search_vector` (tsvector + índice GIN) mantida por triggers; ver POSTGRES_DDL.
+# Cada termo vira prefixo ("BR1234" acha "BR123456789BR") e todos precisam casar.
+SEARCH_LIMIT = 100
+MAX_TERMS = 8
+TEXT_COLUMNS = 'internal_id tracking_code sender recipient received_by_name'
+
+_TERM_SPLIT = re.compile(r'\W+', re.UNICODE)
+
+POSTGRES_DDL = [
+    "ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION items_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple', concat_ws(' ',
+            NEW.internal_id, NEW.tracking_code, NEW.sender, NEW.recipient_email, NEW.recipient_name_manual,
+            (SELECT received_by_name FROM proofs WHERE item_id = NEW.id)));
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_items_search ON items",
+    """
+    CREATE TRIGGER trg_items_search BEFORE INSERT OR UPDATE OF
+        internal_id, tracking_code, sender, recipient_email, recipient_name_manual
+    ON items FOR EACH ROW EXECUTE FUNCTION items_search_vector()
+    """,
+    # Mudou o comprovante: "toca" o item para o trigger acima recalcular o vetor
+    """
+    CREATE OR REPLACE FUNCTION proofs_search_touch() RETURNS trigger AS $$
+    BEGIN
+        UPDATE items SET internal_id = internal_id WHERE id = COALESCE(NEW.item_id, OLD.item_id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_proofs_search ON proofs",
+    """
+    CREATE TRIGGER trg_proofs_search AFTER INSERT OR DELETE OR UPDATE OF received_by_name
+    ON proofs FOR EACH ROW EXECUTE FUNCTION proofs_search_touch()
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_items_search_vector ON items USING GIN (search_vector)",
+]
+
+def search_terms(text):
+    """Termos normalizados da busca (só letras/dígitos; o resto separa termos)"""
+    return [t for t in _TERM_SPLIT.split((text or '').lower()) if t and t != '_'][:MAX_TERMS]
+
+def _is_postgres():
+    return g.get('db_type') == 'postgres'
+
+def fts_match(terms, unit_id=None):
+    """Expressão MATCH do FTS5: unidade + todos os termos como prefixo nas colunas de texto"""
+    expression = '{' + TEXT_COLUMNS + '} : (' + ' AND '.join(f'"{t}"*' for t in terms) + ')'
+    if unit_id is not None:
+        expression = f'unit_key : "u{int(unit_id)}" AND ' + expression
+    return expression
+
+def ts_query(terms):
+    return ' & '.join(f"{t}:*" for t in terms)
+
+def search_filter(text, unit_id=None, alias='i'):
+    """Trecho `AND <alias>.id IN (...)` e parâmetros; ('', []) se não há termos"""
+    terms = search_terms(text)
+    if not terms:
+        return '', []
+    if _is_postgres():
+        return f" AND {alias}.search_vector @@ to_tsquery('simple', ?)", [ts_query(terms)]
+    return f" AND {alias}.id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)", [fts_match(terms, unit_id)]
+
+def search_items(db, unit_id, text, status=None, since=None, limit=SEARCH_LIMIT):
+    """Encomendas da unidade que casam com `text`, das mais relevantes para as menos"""
+    terms = search_terms(text)
+    if not terms:
+        return []
+
+    if _is_postgres():
+        # O search_vector só existe na tabela ativa
+        query = """
+            SELECT i.*, p.received_by_name, p.delivered_at
+            FROM items i LEFT JOIN proofs p ON p.item_id = i.id
+            WHERE i.search_vector @@ to_tsquery('simple', %s) AND i.unit_id = %s
+        """
+        params = [ts_query(terms), unit_id]
+        if status:
+            query += " AND i.status = %s"
+            params.append(status)
+        if since:
+            query += " AND i.updated_at >= %s"
+            params.append(since)
+        query += " ORDER BY ts_rank(i.search_vector, to_tsquery('simple', %s)) DESC, i.updated_at DESC LIMIT %s"
+        cur = db.cursor()
+        cur.execute(query, params + [ts_query(terms), limit])
+        return cur.fetchall()
+
+    # O items_fts cobre as duas camadas (ativa e arquivo): cada uma devolve as suas `limit` melhores
+    # e a junção é feita aqui pelo bm25, que vem do mesmo índice e é comparável entre elas.
+    # internal_id/tracking_code pesam mais que remetente/destinatário no bm25
+    template = """
+        SELECT i.*, p.received_by_name, p.delivered_at,
+               bm25(items_fts, 10.0, 10.0, 2.0, 2.0, 2.0, 0.0) AS search_rank
+        FROM items_fts f
+        JOIN {items} i ON i.id = f.rowid
+        LEFT JOIN {proofs} p ON p.item_id = i.id
+        WHERE items_fts MATCH ? AND i.unit_id = ?
+    """
+    params = [fts_match(terms, unit_id), unit_id]
+    if status:
+        template += " AND i.status = ?"
+        params.append(status)
+    if since:
+        template += " AND i.updated_at >= ?"
+        params.append(since)
+    template += " ORDER BY search_rank, i.updated_at DESC LIMIT ?"
+
+    rows = []
+    for query in tier_queries(template):
+        rows += db.execute(query, params + [limit]).fetchall()
+    # Cada camada já vem em (relevância, mais recente); a ordenação estável preserva o desempate
+    rows.sort(key=lambda row: row['search_rank'])
+    return rows[:limit]
+
+def rebuild_search_index(db):
+    """Recria o índice a partir de items/proofs e do arquivo (após importação ou restauração)"""
+    if _is_postgres():
+        cur = db.cursor()
+        for ddl in POSTGRES_DDL:
+            cur.execute(ddl)
+        cur.execute("UPDATE items SET internal_id = internal_id")
+        db.commit()
+        return cur.rowcount
+
+    db.execute("DELETE FROM items_fts")
+    # Itens arquivados também entram: o histórico pesquisa as duas camadas
+    count = 0
+    for items, proofs in (('items', 'proofs'), ('items_archive', 'proofs_archive')):
+        count += db.execute(
+            "INSERT INTO items_fts (rowid, internal_id, tracking_code, sender, recipient, received_by_name, unit_key) "
+            "SELECT i.id, i.internal_id, i.tracking_code, i.sender, "
+            "       COALESCE(i.recipient_email, '') || ' ' || COALESCE(i.recipient_name_manual, ''), "
+            "       p.received_by_name, 'u' || COALESCE(i.unit_id, 0) "
+            f"FROM {items} i LEFT JOIN {proofs} p ON p.item_id = i.id"
+        ).rowcount
+    db.execute("INSERT INTO items_fts (items_fts) VALUES ('optimize')")
+    db.commit()
+    return count
+
+def init_app(app):
+    @app.cli.command('search-rebuild')
+    def search_rebuild_command():
+        """Recria o índice de busca textual das encomendas"""
+        from utils.db import get_db
+        print(f"✅ {rebuild_search_index(get_db())} encomenda(s) indexada(s).")
@@ -0,0 +1,130 @@
+import os
+import base64
+import binascii
+import hashlib
+import tempfile
+from flask import current_app
+from .archive import TIERS
+
+# Referência gravada em proofs.signature_data quando a imagem está no disco
+BLOB_PREFIX = 'BLOB:'
+PNG_DATA_URL_PREFIX = 'data:image/png;base64,'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+def decode_png_data_url(data_url):
+    """Converte o `toDataURL()` do canvas em bytes PNG; None se não for um PNG válido"""
+    if not data_url or not data_url.startswith(PNG_DATA_URL_PREFIX):
+        return None
+    try:
+        data = base64.b64decode(data_url[len(PNG_DATA_URL_PREFIX):], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return data if data.startswith(PNG_MAGIC) else None
+
+def is_blob_ref(signature_data):
+    return bool(signature_data) and signature_data.startswith(BLOB_PREFIX)
+
+class SignatureStore:
+    """Armazena assinaturas PNG em disco, endereçadas pelo SHA-256 do conteúdo.
+
+    Layout: <root>/ab/cd/abcd...ef.png (dois níveis de shard para não lotar um diretório).
+    Arquivos nunca são reescritos: o mesmo conteúdo gera o mesmo nome.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            raise ValueError(f"Hash de assinatura inválido: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.png")
+
+    def put(self, data):
+        """Grava os bytes (se ainda não existirem) e devolve a referência para o banco"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escrita atômica: um leitor nunca vê um arquivo pela metade
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return f"{BLOB_PREFIX}{digest}"
+
+    def resolve(self, signature_data):
+        """Caminho do arquivo para uma referência `BLOB:<sha256>`"""
+        return self.path(signature_data[len(BLOB_PREFIX):])
+
+def get_signature_store(app=None):
+    app = app or current_app
+    root = app.config.get('SIGNATURE_STORE_DIR', 'signatures')
+    if not os.path.isabs(root):
+        root = os.path.join(app.root_path, root)
+    return SignatureStore(root)
+
+def store_signature(signature_data):
+    """Move um data URL PNG para o store; outros formatos (placeholders, etc.) voltam inalterados"""
+    data = decode_png_data_url(signature_data)
+    if data is None:
+        return signature_data
+    return get_signature_store().put(data)
+
+def migrate_inline_signatures(db, store, chunk_size=500, log=print):
+    """Move as assinaturas base64 de proofs e proofs_archive para o store, em lotes com commit por lote.
+
+    Percorre cada tabela pela chave primária (keyset), então pode ser interrompido e retomado.
+    """
+    moved = skipped = 0
+    # O arquivamento copia signature_data como está: comprovantes antigos também podem ser inline
+    for table in (tier['proofs'] for tier in TIERS):
+        last_id = 0
+        while True:
+            rows = db.execute(
+                f"SELECT item_id, signature_data FROM {table} "
+                "WHERE item_id > ? AND signature_data LIKE 'data:image/png;base64,%' "
+                "ORDER BY item_id LIMIT ?",
+                (last_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                data = decode_png_data_url(row['signature_data'])
+                if data is None:
+                    skipped += 1
+                    continue
+                db.execute(f"UPDATE {table} SET signature_data = ? WHERE item_id = ?", (store.put(data), row['item_id']))
+                moved += 1
+
+            db.commit()
+            last_id = rows[-1]['item_id']
+            log(f"- {table}: {moved} assinaturas movidas (até item_id {last_id}), {skipped} ignoradas")
+
+    return moved, skipped
+
+def init_app(app):
+    import click
+
+    @app.cli.command('signatures-migrate')
+    @click.option('--chunk-size', default=500, show_default=True, help='Linhas de proofs (e proofs_archive) por lote/commit.')
+    @click.option('--vacuum', is_flag=True, help='Executa VACUUM ao final para devolver o espaço ao disco.')
+    def signatures_migrate_command(chunk_size, vacuum):
+        """Move assinaturas base64 do banco para o store em disco"""
+        from utils.db import get_db
+
+        store = get_signature_store()
+        db = get_db()
+
+        print(f"Movendo assinaturas para {store.root} ...")
+        moved, skipped = migrate_inline_signatures(db, store, chunk_size)
+        print(f"✅ {moved} assinaturas movidas, {skipped} inválidas mantidas no banco.")
+
+        if vacuum:
+            db.execute("VACUUM")
+            print("✅ VACUUM concluído.")
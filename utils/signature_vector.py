@@ -0,0 +1,145 @@
+import base64
+import binascii
+from functools import lru_cache
+
+# Assinatura vetorial: traços do signature_pad em binário delta-encoded.
+# Guardada inline em proofs.signature_data como 'VEC1:<base64>' (poucas centenas de bytes).
+VECTOR_PREFIX = 'VEC1:'
+FORMAT_MAGIC = 0x53  # 'S'
+FORMAT_VERSION = 1
+
+MAX_ENCODED_LENGTH = 65536
+MAX_DIMENSION = 4096
+MAX_STROKES = 200
+MAX_POINTS = 10000
+
+class InvalidSignature(ValueError):
+    """Payload vetorial malformado ou fora dos limites"""
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+def _write_varint(out, n):
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise InvalidSignature("Assinatura truncada.")
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        result = shift = 0
+        while True:
+            byte = self.byte()
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+            if shift > 35:
+                raise InvalidSignature("Inteiro grande demais na assinatura.")
+
+def encode(width, height, strokes):
+    """Serializa [(x, y), ...] por traço. Formato:
+
+    magic, versão, largura, altura, nº de traços; por traço: nº de pontos, primeiro ponto
+    absoluto e os demais como deltas (inteiros zigzag em varint).
+    """
+    out = bytearray([FORMAT_MAGIC, FORMAT_VERSION])
+    _write_varint(out, width)
+    _write_varint(out, height)
+    _write_varint(out, len(strokes))
+    for points in strokes:
+        _write_varint(out, len(points))
+        prev_x = prev_y = 0
+        for x, y in points:
+            _write_varint(out, _zigzag(x - prev_x))
+            _write_varint(out, _zigzag(y - prev_y))
+            prev_x, prev_y = x, y
+    return bytes(out)
+
+def decode(data):
+    """Inverso de `encode`, validando limites; devolve (largura, altura, traços)"""
+    reader = _Reader(data)
+    if reader.byte() != FORMAT_MAGIC or reader.byte() != FORMAT_VERSION:
+        raise InvalidSignature("Formato de assinatura desconhecido.")
+
+    width, height = reader.varint(), reader.varint()
+    if not (0 < width <= MAX_DIMENSION and 0 < height <= MAX_DIMENSION):
+        raise InvalidSignature("Dimensões da assinatura inválidas.")
+
+    stroke_count = reader.varint()
+    if not 0 < stroke_count <= MAX_STROKES:
+        raise InvalidSignature("Quantidade de traços inválida.")
+
+    strokes, total = [], 0
+    for _ in range(stroke_count):
+        count = reader.varint()
+        total += count
+        if count == 0 or total > MAX_POINTS:
+            raise InvalidSignature("Quantidade de pontos inválida.")
+        points, x, y = [], 0, 0
+        for _ in range(count):
+            x += _unzigzag(reader.varint())
+            y += _unzigzag(reader.varint())
+            if not (-width <= x <= 2 * width and -height <= y <= 2 * height):
+                raise InvalidSignature("Ponto fora da área da assinatura.")
+            points.append((x, y))
+        strokes.append(points)
+
+    if reader.pos != len(data):
+        raise InvalidSignature("Dados extras após a assinatura.")
+    return width, height, strokes
+
+def normalize_payload(encoded):
+    """Valida o base64 enviado pelo navegador e devolve o valor para gravar em proofs"""
+    if not encoded or len(encoded) > MAX_ENCODED_LENGTH:
+        raise InvalidSignature("Assinatura vazia ou grande demais.")
+    try:
+        data = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidSignature("Assinatura não está em base64.")
+    # Reencoda para gravar sempre a forma canônica
+    return VECTOR_PREFIX + base64.b64encode(encode(*decode(data))).decode('ascii')
+
+def is_vector(signature_data):
+    return bool(signature_data) and signature_data.startswith(VECTOR_PREFIX)
+
+@lru_cache(maxsize=256)
+def render_svg(signature_data):
+    """Desenha a assinatura gravada como SVG (cacheado por conteúdo)"""
+    data = base64.b64decode(signature_data[len(VECTOR_PREFIX):])
+    width, height, strokes = decode(data)
+
+    shapes = []
+    for points in strokes:
+        if len(points) == 1:
+            x, y = points[0]
+            shapes.append(f'<circle cx="{x}" cy="{y}" r="1.5" fill="black" stroke="none"/>')
+        else:
+            path = ' '.join(f"{'M' if i == 0 else 'L'}{x} {y}" for i, (x, y) in enumerate(points))
+            shapes.append(f'<path d="{path}"/>')
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}">'
+        f'<rect width="100%" height="100%" fill="white"/>'
+        f'<g fill="none" stroke="black" stroke-width="2.5" stroke-linecap="round" stroke-linejoin="round">'
+        f'{"".join(shapes)}</g></svg>'
+    )
@@ -0,0 +1,56 @@
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from flask import current_app, g
+from .reference_data import company
+
+# Filtros "por dia" sem função sobre a coluna: o dia local da unidade vira a faixa
+# [início do dia, início do dia seguinte) em UTC, que é como os timestamps são gravados
+# (CURRENT_TIMESTAMP). Assim `created_at >= ? AND created_at < ?` usa o índice, o que
+# `date(created_at) = ?` não consegue.
+DEFAULT_TIMEZONE = 'UTC'
+
+def get_zone(name):
+    """ZoneInfo de `name`; ValueError se o fuso não existe"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Fuso horário inválido: {name}")
+
+def default_zone():
+    name = current_app.config.get('DEFAULT_TIMEZONE') or DEFAULT_TIMEZONE
+    try:
+        return get_zone(name)
+    except ValueError:
+        current_app.logger.warning(f"DEFAULT_TIMEZONE inválido ({name}); usando UTC.")
+        return timezone.utc
+
+def unit_timezone(db, unit_id):
+    """Fuso da unidade (settings_companies.timezone) ou DEFAULT_TIMEZONE; lido uma vez por request"""
+    cache = g.setdefault('unit_timezones', {})
+    if unit_id not in cache:
+        row = company(db, unit_id) if unit_id else None
+        try:
+            cache[unit_id] = get_zone(row['timezone']) if row and row['timezone'] else default_zone()
+        except ValueError:
+            cache[unit_id] = default_zone()
+    return cache[unit_id]
+
+def local_today(tz, now=None):
+    """Data de hoje no fuso `tz`"""
+    return (now or datetime.now(timezone.utc)).astimezone(tz).date()
+
+def parse_day(value):
+    """'AAAA-MM-DD' -> date; None se vazio ou inválido"""
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def day_start(day, tz):
+    """Início do dia local `day` como timestamp UTC no formato gravado no banco"""
+    start = datetime.combine(day, time.min, tzinfo=tz).astimezone(timezone.utc)
+    return start.strftime('%Y-%m-%d %H:%M:%S')
+
+def day_range(day, tz):
+    """(início, fim) semiaberto do dia local `day`: coluna >= início AND coluna < fim"""
+    return day_start(day, tz), day_start(day + timedelta(days=1), tz)
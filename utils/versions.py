@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+from flask import g, request, session, make_response
+from .db import get_db
+from .reference_data import REFERENCE_VERSION
+from .timezones import unit_timezone, local_today
+
+# Versão dos dados de cada unidade (unit_versions), incrementada pelos triggers trg_*_version_*
+# do schema.sql a cada escrita em items, movements, proofs e nas configurações da unidade.
+# Páginas marcadas com @conditional_page respondem 304 a um If-None-Match igual sem rodar
+# as queries da view: o custo de um polling sem mudança é uma leitura pela PK.
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+def data_versions(db, unit_id):
+    """(versão da unidade, versão dos dados de referência) numa única leitura, uma vez por request"""
+    cache = g.setdefault('data_versions', {})
+    if unit_id not in cache:
+        row = db.execute(
+            "SELECT (SELECT version FROM unit_versions WHERE unit_id = ?), "
+            "(SELECT version FROM cache_versions WHERE name = ?)", (unit_id or 0, REFERENCE_VERSION)
+        ).fetchone()
+        # Já vale como a leitura do request para o cache de referência
+        g.reference_version = row[1] or 0
+        cache[unit_id] = (row[0] or 0, g.reference_version)
+    return cache[unit_id]
+
+def page_etag(db, unit_id):
+    """ETag da página atual: versões da unidade, usuário, unidade, data local e parâmetros da URL"""
+    unit_version, reference_version = data_versions(db, unit_id)
+    key = '|'.join(str(part) for part in (
+        request.endpoint, request.query_string.decode('latin-1'),
+        session.get('user_id'), session.get('role'), unit_id,
+        unit_version, reference_version,
+        # "Hoje" muda à meia-noite da unidade sem nenhuma escrita
+        local_today(unit_timezone(db, unit_id)),
+    ))
+    return 'page-' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional_page(view):
+    """Responde 304 quando nada da unidade mudou desde a cópia que o navegador já tem"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        unit_id = session.get('unit_id')
+        # Mensagens flash pendentes só aparecem numa renderização nova
+        if not unit_id or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag = page_etag(get_db(), unit_id)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+        return response
+    return wrapped